@@ -0,0 +1,186 @@
+# interview_app/admission.py
+# Keeping one client or one room from starving the rest of the worker:
+#  - RateLimiter: token buckets per client, one per message type plus one for
+#    all of the client's messages (SIGNALING_RATE_LIMITS);
+#  - sfu_slot(): caps on concurrent SFU calls per room and per process
+#    (SFU_CONCURRENCY); a call waits for a slot up to queue_timeout, then
+#    fails with SfuOverloaded instead of piling onto a struggling SFU. Calls
+#    that release SFU resources (/disconnected, /close) are not capped: turning
+#    them away would leak the client's transports on the SFU;
+#  - admit(): at connect, new joins are turned away with a retry hint while
+#    the process is saturated (SIGNALING_ADMISSION): too many sockets, too
+#    many SFU calls queued, or event loop lag (loop_watchdog.py) too high.
+import asyncio
+import contextlib
+import random
+import time
+
+from django.conf import settings
+
+from .loop_watchdog import watchdog
+from .metrics import SOCKETS, Counter, Gauge
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token; returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """One client's buckets. ``check(message_type)`` returns 0 or the seconds to wait."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            limit = settings.SIGNALING_RATE_LIMITS.get(key)
+            if limit is None:
+                return None
+            bucket = self.buckets[key] = TokenBucket(*limit)
+        return bucket
+
+    def check(self, message_type):
+        for key in ('*', message_type):
+            bucket = self._bucket(key)
+            wait = bucket.take() if bucket is not None else 0
+            if wait:
+                RATE_LIMITED.inc(key)
+                return wait
+        return 0
+
+
+class SfuOverloaded(Exception):
+    """No SFU call slot freed up within SFU_CONCURRENCY['queue_timeout']."""
+
+
+class InFlightLimit:
+    # A semaphore that hands slots to waiters in order and is not tied to one event loop.
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self, timeout):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                self.release() # Handed a slot just as we gave up: pass it on
+            raise
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None) # The slot moves to the waiter; active is unchanged
+                return
+        self.active -= 1
+
+
+_process_limit = None
+_room_limits = {}  # room_name -> InFlightLimit, dropped when idle
+
+
+def _room_of(endpoint):
+    # '/rooms/<room>/...' -> '<room>'
+    parts = endpoint.split('/', 3)
+    return parts[2] if len(parts) > 2 and parts[1] == 'rooms' else None
+
+
+def _releases_resources(endpoint):
+    return endpoint.endswith('/disconnected') or endpoint.endswith('/close')
+
+
+def process_limit():
+    global _process_limit
+    if _process_limit is None or _process_limit.limit != settings.SFU_CONCURRENCY['process']:
+        _process_limit = InFlightLimit(settings.SFU_CONCURRENCY['process'])
+    return _process_limit
+
+
+@contextlib.asynccontextmanager
+async def sfu_slot(endpoint):
+    """Hold a per-room and a per-process SFU call slot for the duration of the block."""
+    if _releases_resources(endpoint):
+        yield
+        return
+    config = settings.SFU_CONCURRENCY
+    room = _room_of(endpoint)
+    room_limit = None
+    if room is not None:
+        room_limit = _room_limits.get(room)
+        if room_limit is None:
+            room_limit = _room_limits[room] = InFlightLimit(config['room'])
+    limits = [limit for limit in (room_limit, process_limit()) if limit is not None]
+    acquired = []
+    try:
+        deadline = time.monotonic() + config['queue_timeout']
+        for scope, limit in zip(('room', 'process') if room_limit else ('process',), limits):
+            try:
+                await limit.acquire(max(0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                SLOT_TIMEOUTS.inc(scope)
+                raise SfuOverloaded(f"No {scope} SFU call slot for {endpoint} within {config['queue_timeout']}s") from None
+            acquired.append(limit)
+        yield
+    finally:
+        for limit in acquired:
+            limit.release()
+        if room_limit is not None and room_limit.active == 0 and not room_limit.waiting:
+            _room_limits.pop(room, None)
+
+
+def admit(resuming=False):
+    """None if a new connection may join, else a retry hint in seconds.
+
+    Resumptions of a detached session are let through: it is already held and costs no SFU calls.
+    """
+    if resuming:
+        return None
+    config = settings.SIGNALING_ADMISSION
+    reason = None
+    if SOCKETS.value() > config['max_sockets']:
+        reason = 'sockets'
+    elif _process_limit is not None and _process_limit.waiting > config['max_sfu_waiting']:
+        reason = 'sfu_backlog'
+    elif watchdog.recent_lag() > config['max_loop_lag']:
+        reason = 'loop_lag'
+    if reason is None:
+        return None
+    ADMISSION_REJECTED.inc(reason)
+    return round(config['retry_after'] * random.uniform(1, 2), 1) # Spread the retries out
+
+
+RATE_LIMITED = Counter('interview_rate_limited_total', 'Client messages dropped by rate limiting, by message type (* for the per-client limit).', ['type'])
+SLOT_TIMEOUTS = Counter('interview_sfu_slot_timeouts_total', 'SFU calls that gave up waiting for a concurrency slot.', ['scope'])
+ADMISSION_REJECTED = Counter('interview_admission_rejected_total', 'Connections turned away at connect because the process was saturated.', ['reason'])
+Gauge('interview_sfu_in_flight', 'SFU calls holding a process concurrency slot.',
+      collect=lambda: _process_limit.active if _process_limit is not None else 0)
+Gauge('interview_sfu_waiting', 'SFU calls waiting for a process concurrency slot.',
+      collect=lambda: _process_limit.waiting if _process_limit is not None else 0)
@@ -0,0 +1,24 @@
+# interview_app/capabilities.py
+# Router RTP capabilities are content-addressed. Every router is created from the
+# same mediaCodecs (mediasoup_server_nodejs/config.js), so rooms share a single
+# RtpCapabilities row keyed by the hash of the capabilities, and clients that
+# already hold them (?capsHash=<hash> on connect) get only the hash back.
+import hashlib
+import json
+
+from .models import RtpCapabilities
+
+_stored = set()  # hashes known to have a row; rows are immutable, so this never goes stale
+
+
+def capabilities_hash(capabilities):
+    # Canonical JSON (sorted keys): the same capabilities hash the same whatever the key order the SFU used.
+    canonical = json.dumps(capabilities, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+def ensure_stored(caps_hash, capabilities):
+    """Make sure the row for ``caps_hash`` exists (called from *_db_ops); one query per hash per process at most."""
+    if caps_hash not in _stored:
+        RtpCapabilities.objects.get_or_create(hash=caps_hash, defaults={'capabilities': capabilities})
+        _stored.add(caps_hash)
@@ -0,0 +1,429 @@
+# interview_app/channel_layer.py
+# Channel layer for running several Daphne/Uvicorn worker processes on one box
+# without Redis. Each worker keeps the queues of its own (process-specific)
+# channels in memory; a small hub reachable over a Unix domain socket tracks
+# group membership and forwards messages between workers. A group_send crosses
+# the socket at most once per worker that has members, whatever the number of
+# members in that worker.
+#
+# With autostart enabled the first worker to take the hub lock (flock on
+# "<path>.lock") runs the hub in a background thread; if that worker dies the
+# lock is released and the next worker to reconnect takes over. The hub can
+# also be run standalone with `manage.py run_channel_hub`.
+#
+# Only process-specific channel names (the "specific.<worker>!<id>" names
+# returned by new_channel, which is what consumers use) are routed across
+# processes; other channel names are delivered within the sending process.
+import asyncio
+import base64
+import fcntl
+import json
+import os
+import random
+import string
+import struct
+import logging
+import threading
+import time
+from copy import deepcopy
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# A worker that stops reading gets its deliveries dropped rather than buffered without bound.
+MAX_WRITE_BUFFER = 64 * 1024 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable by the channel layer")
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def encode_frame(payload):
+    body = json.dumps(payload, default=_json_default, separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Channel layer frame of {length} bytes exceeds limit")
+    return json.loads(await reader.readexactly(length), object_hook=_json_object_hook)
+
+
+def _write(writer, payload):
+    if writer.transport.get_write_buffer_size() < MAX_WRITE_BUFFER:
+        writer.write(encode_frame(payload))
+
+
+def _worker_of(channel):
+    # "specific.<worker>!<id>" -> "<worker>"; None for channels that are not process-specific.
+    if '!' not in channel:
+        return None
+    return channel[:channel.index('!')].rsplit('.', 1)[-1]
+
+
+class ChannelHub:
+    """Group membership and cross-worker routing. Runs on its own event loop."""
+
+    def __init__(self, path, group_expiry=86400):
+        self.path = path
+        self.group_expiry = group_expiry
+        self.workers = {}  # worker_id -> StreamWriter
+        self.groups = {}   # group -> {worker_id: {channel: joined_at}}
+        self.server = None
+        self.loop = None
+        self.thread = None  # Set when run in a worker by _start_hub_thread
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path) # Left behind by a hub that died; we hold the lock now
+        self.server = await asyncio.start_unix_server(self._handle_worker, path=self.path)
+        os.chmod(self.path, 0o600)
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _handle_worker(self, reader, writer):
+        worker_id = None
+        try:
+            while True:
+                frame = await read_frame(reader)
+                op = frame['op']
+                if op == 'hello':
+                    worker_id = frame['worker']
+                    self.workers[worker_id] = writer
+                elif op == 'group_add':
+                    self.groups.setdefault(frame['group'], {}).setdefault(worker_id, {})[frame['channel']] = time.time()
+                elif op == 'group_discard':
+                    self._discard(frame['group'], worker_id, frame['channel'])
+                elif op == 'send':
+                    target = self.workers.get(_worker_of(frame['channel']))
+                    if target is not None:
+                        _write(target, {'op': 'deliver', 'channels': [frame['channel']], 'message': frame['message']})
+                elif op == 'group_send':
+                    self._group_send(frame['group'], frame['message'], origin=worker_id)
+                elif op == 'ping':
+                    _write(writer, {'op': 'pong', 'id': frame['id']})
+                elif op == 'flush':
+                    self.groups.clear()
+                    for other in self.workers.values():
+                        _write(other, {'op': 'flush'})
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass # CancelledError: the hub is shutting down
+        except Exception:
+            logger.exception("Channel hub: worker %s connection failed", worker_id)
+        finally:
+            if worker_id is not None and self.workers.get(worker_id) is writer:
+                del self.workers[worker_id]
+                for group in list(self.groups):
+                    self.groups[group].pop(worker_id, None)
+                    if not self.groups[group]:
+                        del self.groups[group]
+            writer.close()
+
+    def _discard(self, group, worker_id, channel):
+        members = self.groups.get(group, {})
+        channels = members.get(worker_id)
+        if channels is not None:
+            channels.pop(channel, None)
+            if not channels:
+                del members[worker_id]
+        if not members:
+            self.groups.pop(group, None)
+
+    def _group_send(self, group, message, origin):
+        cutoff = time.time() - self.group_expiry
+        for worker_id, channels in list(self.groups.get(group, {}).items()):
+            for channel in [c for c, joined_at in channels.items() if joined_at < cutoff]:
+                self._discard(group, worker_id, channel)
+            # The origin worker has already delivered to its own members.
+            writer = self.workers.get(worker_id)
+            if worker_id == origin or writer is None or not channels:
+                continue
+            _write(writer, {'op': 'deliver', 'group': group, 'channels': list(channels), 'message': message})
+
+    def serving(self):
+        """Whether the hub thread is alive and accepting on its socket (false if the socket file was removed)."""
+        return (self.thread is not None and self.thread.is_alive() and self.server is not None
+                and self.server.is_serving() and os.path.exists(self.path))
+
+    def stop_thread(self, timeout=1.0):
+        if self.thread is not None and self.thread.is_alive() and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.thread.join(timeout)
+
+
+def acquire_hub_lock(path):
+    """Take the hub election lock for ``path``; returns the locked file, or None if another hub holds it."""
+    lock_file = open(str(path) + '.lock', 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _start_hub_thread(path, group_expiry):
+    hub = ChannelHub(path, group_expiry=group_expiry)
+    started = threading.Event()
+
+    def run():
+        hub.loop = loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(hub.start())
+            started.set()
+            loop.run_until_complete(hub.server.serve_forever())
+        except asyncio.CancelledError:
+            pass # Closed by stop_thread()
+        except Exception:
+            logger.exception("Channel hub at %s failed", path)
+        finally:
+            started.set()
+            pending = asyncio.all_tasks(loop) # Worker connections still being served
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+    hub.thread = threading.Thread(target=run, name='channel-hub', daemon=True)
+    hub.thread.start()
+    started.wait(timeout=5)
+    return hub
+
+
+class LocalHubChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path='/tmp/interview_channel_hub.sock', expiry=60, group_expiry=86400,
+                 capacity=100, channel_capacity=None, autostart=True, connect_timeout=5.0, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.autostart = autostart
+        self.connect_timeout = connect_timeout
+        self.worker_id = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        self.channels = {}  # channel -> asyncio.Queue of (expires_at, message)
+        self.groups = {}    # group -> {channel: joined_at}, this process's members only
+        self._lock_file = None
+        self._hub = None
+        self._writer = None
+        self._reader_task = None
+        self._loop = None
+        self._connect_lock = None
+        self._pings = {}
+        self._closing = False
+        self._reconnect_task = None
+
+    # --- Hub connection ---
+    def _try_become_hub(self):
+        """Serve the hub from this process if it holds (or can take) the lock; True if our hub is serving."""
+        if self._hub is not None and self._hub.serving():
+            return True
+        if self._lock_file is None:
+            self._lock_file = acquire_hub_lock(self.path)
+            if self._lock_file is None:
+                return False
+        if self._hub is not None:
+            logger.warning("Channel hub at %s stopped serving; restarting it", self.path)
+            self._hub.stop_thread()
+        self._hub = _start_hub_thread(self.path, self.group_expiry)
+        return self._hub.serving()
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        if self._writer is not None and self._loop is loop and not self._writer.is_closing():
+            return self._writer
+        if self._connect_lock is None or self._loop is not loop:
+            self._connect_lock = asyncio.Lock()
+            self._loop = loop
+            self._writer = None
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            deadline = time.monotonic() + self.connect_timeout
+            backoff = 0.01
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if self.autostart:
+                        self._try_become_hub()
+                    if time.monotonic() > deadline:
+                        raise ConnectionError(f"Channel hub at {self.path} is not reachable")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 0.5)
+            writer.write(encode_frame({'op': 'hello', 'worker': self.worker_id}))
+            # Re-announce memberships so a restarted hub learns about this worker's channels.
+            for group, channels in self.groups.items():
+                for channel in channels:
+                    writer.write(encode_frame({'op': 'group_add', 'group': group, 'channel': channel}))
+            self._writer = writer
+            self._reader_task = loop.create_task(self._read_from_hub(reader, writer))
+            return writer
+
+    async def _read_from_hub(self, reader, writer):
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame['op'] == 'deliver':
+                    # Skip channels that left the group while the message was in flight.
+                    members = self.groups.get(frame['group'], {}) if 'group' in frame else None
+                    for channel in frame['channels']:
+                        if members is None or channel in members:
+                            self._deliver_local(channel, frame['message'])
+                elif frame['op'] == 'pong':
+                    future = self._pings.pop(frame['id'], None)
+                    if future is not None and not future.done():
+                        future.set_result(None)
+                elif frame['op'] == 'flush':
+                    self.channels = {}
+                    self.groups = {}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # Hub went away
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+                if not self._closing:
+                    # Reconnect (or take over the hub) now rather than at this worker's next send: until
+                    # its memberships are re-announced, its channels miss other workers' group messages.
+                    self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._closing:
+            try:
+                await self._connection()
+                return
+            except ConnectionError as e:
+                logger.warning("Channel layer: %s; still retrying", e)
+
+    async def _to_hub(self, payload):
+        writer = await self._connection()
+        writer.write(encode_frame(payload))
+        await writer.drain()
+
+    # --- Local queues ---
+    def _queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _deliver_local(self, channel, message, raise_full=False):
+        try:
+            self._queue(channel).put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            if raise_full:
+                raise ChannelFull(channel)
+
+    def _clean_expired(self):
+        now = time.time()
+        for channel, queue in list(self.channels.items()):
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+                # Like the in-memory layer: a channel that lets messages expire leaves its groups.
+                for group, members in list(self.groups.items()):
+                    if members.pop(channel, None) is not None:
+                        self._schedule_discard(group, channel)
+        cutoff = now - self.group_expiry
+        for group, members in list(self.groups.items()):
+            for channel, joined_at in list(members.items()):
+                if joined_at < cutoff:
+                    del members[channel]
+                    self._schedule_discard(group, channel)
+            if not members:
+                del self.groups[group]
+
+    def _schedule_discard(self, group, channel):
+        if self._writer is not None and not self._writer.is_closing():
+            _write(self._writer, {'op': 'group_discard', 'group': group, 'channel': channel})
+
+    # --- Channel layer API ---
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        worker = _worker_of(channel)
+        if worker is None or worker == self.worker_id:
+            self._deliver_local(channel, deepcopy(message), raise_full=True)
+        else:
+            await self._to_hub({'op': 'send', 'channel': channel, 'message': message})
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        self._clean_expired()
+        queue = self._queue(channel)
+        try:
+            while True:
+                expires_at, message = await queue.get()
+                if expires_at >= time.time():
+                    return message
+        finally:
+            if queue.empty() and self.channels.get(channel) is queue:
+                del self.channels[channel]
+
+    async def new_channel(self, prefix='specific.'):
+        await self._connection()
+        return '%s.%s!%s' % (prefix, self.worker_id, ''.join(random.choice(string.ascii_letters) for _ in range(12)))
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.groups.setdefault(group, {})[channel] = time.time()
+        await self._to_hub({'op': 'group_add', 'group': group, 'channel': channel})
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        members = self.groups.get(group)
+        if members:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        await self._to_hub({'op': 'group_discard', 'group': group, 'channel': channel})
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        self._clean_expired()
+        # Local members share one copy of the message; consumers treat events as read-only.
+        local_message = deepcopy(message)
+        for channel in list(self.groups.get(group, ())):
+            self._deliver_local(channel, local_message)
+        await self._to_hub({'op': 'group_send', 'group': group, 'message': message})
+
+    async def sync(self):
+        """Wait until the hub has processed every frame this worker sent before the call."""
+        ping_id = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        future = self._pings[ping_id] = asyncio.get_running_loop().create_future()
+        await self._to_hub({'op': 'ping', 'id': ping_id})
+        await future
+
+    async def flush(self):
+        self.channels = {}
+        self.groups = {}
+        await self._to_hub({'op': 'flush'})
+
+    async def close(self):
+        self._closing = True
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -0,0 +1,126 @@
+# interview_app/codec.py
+# JSON codec used for every signaling frame. SIGNALING_JSON_CODEC picks the
+# implementation: "orjson" or "ujson" when installed, "json" for the stdlib, or
+# "auto" (default) for the fastest one available.
+#
+# Clients may instead negotiate the binary subprotocol (BINARY_SUBPROTOCOL):
+# MessagePack frames [type code, data, {other top-level keys}] in both
+# directions. It needs the optional 'msgpack' package; without it, or with
+# SIGNALING_BINARY=0, such clients get JSON_SUBPROTOCOL (or plain JSON).
+import functools
+import importlib
+import json
+
+from django.conf import settings
+
+_PREFERENCE = ('orjson', 'ujson', 'json')
+
+
+def _orjson_codec(orjson):
+    return (lambda obj: orjson.dumps(obj).decode('utf-8')), orjson.loads
+
+
+def _ujson_codec(ujson):
+    return (lambda obj: ujson.dumps(obj, ensure_ascii=False)), ujson.loads
+
+
+def _json_codec(_):
+    return (lambda obj: json.dumps(obj, separators=(',', ':'))), json.loads
+
+
+_FACTORIES = {'orjson': _orjson_codec, 'ujson': _ujson_codec, 'json': _json_codec}
+
+
+def load_codec(name):
+    """Return (name, dumps, loads) for ``name``; "auto" picks the first importable codec."""
+    candidates = _PREFERENCE if name == 'auto' else (name,)
+    for candidate in candidates:
+        try:
+            module = importlib.import_module(candidate)
+        except ImportError:
+            continue
+        dumps, loads = _FACTORIES[candidate](module)
+        return candidate, dumps, loads
+    raise ImportError(f"JSON codec '{name}' is not installed")
+
+
+CODEC_NAME, dumps, loads = load_codec(getattr(settings, 'SIGNALING_JSON_CODEC', 'auto'))
+
+# Every codec's decode errors subclass ValueError (json.JSONDecodeError included).
+DecodeError = ValueError
+
+
+def encode_group_event(message, sender_channel_name=None):
+    """Build a 'broadcast_message' group event carrying ``message`` already encoded.
+
+    The frame is serialized once here instead of once per recipient in
+    InterviewConsumer.broadcast_message; the message type travels alongside it
+    for the sender-exclusion check.
+    """
+    event = {'type': 'broadcast_message', 'message_type': message.get('type'), 'text': dumps(message)}
+    if sender_channel_name is not None:
+        event['sender_channel_name'] = sender_channel_name
+    return event
+
+
+# --- Binary subprotocol ---
+BINARY_SUBPROTOCOL = 'interview.msgpack.v1'
+JSON_SUBPROTOCOL = 'interview.json'
+
+try:
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+
+# Wire code of each message type is its index. Append only: clients decode with the same table,
+# and types missing here travel as strings.
+MESSAGE_TYPE_CODES = (
+    # client -> server
+    'updateDisplayName', 'requestParticipantList', 'createWebRtcTransport', 'connectTransport', 'produce',
+    'closeProducer', 'consume', 'resumeConsumer', 'consumeAll', 'resumeConsumers', 'endRoom',
+    # server -> client
+    'joinState', 'roleAssignment', 'routerRtpCapabilities', 'participantList', 'participantListDelta',
+    'hostInformation', 'newProducer', 'producerClosed', 'hostLeft', 'peerClosed', 'displayNameUpdated',
+    'transportCreated', 'transportConnected', 'produced', 'consumed', 'consumerResumed', 'consumedAll',
+    'consumersResumed', 'consumerClosed', 'transportClosed', 'sessionResumed', 'resumeFailed', 'roomEnded', 'error',
+    # appended later; codes are positional, so new types only ever go at the end
+    'requestParticipantPage', 'participantCount', 'participantPage',
+)
+_CODE_OF = {message_type: code for code, message_type in enumerate(MESSAGE_TYPE_CODES)}
+
+
+def binary_enabled():
+    return _msgpack is not None and getattr(settings, 'SIGNALING_BINARY', True)
+
+
+def encode_binary(message):
+    message_type = message.get('type')
+    frame = [_CODE_OF.get(message_type, message_type), message.get('data')]
+    extra = {key: value for key, value in message.items() if key != 'type' and key != 'data'}
+    if extra:
+        frame.append(extra)
+    return _msgpack.packb(frame)
+
+
+def decode_binary(payload):
+    frame = _msgpack.unpackb(payload)
+    if not isinstance(frame, list) or not 2 <= len(frame) <= 3 or (len(frame) == 3 and not isinstance(frame[2], dict)):
+        raise DecodeError("Malformed binary signaling frame")
+    message_type, data = frame[0], frame[1]
+    if isinstance(message_type, int):
+        if not 0 <= message_type < len(MESSAGE_TYPE_CODES):
+            raise DecodeError(f"Unknown message type code {message_type}")
+        message_type = MESSAGE_TYPE_CODES[message_type]
+    elif not isinstance(message_type, str):
+        raise DecodeError(f"Message type must be a code or a string, got {type(message_type).__name__}")
+    message = dict(frame[2]) if len(frame) == 3 else {}
+    message['type'] = message_type
+    if data is not None:
+        message['data'] = data
+    return message
+
+
+@functools.lru_cache(maxsize=256)
+def binary_frame(text):
+    """The binary frame for a pre-encoded group event; converted once per event, not per binary recipient."""
+    return encode_binary(loads(text))
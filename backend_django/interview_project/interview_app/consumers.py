@@ -1,433 +1,564 @@
 # backend_django/interview_app/consumers.py
+import asyncio
 import json
+import logging
+import time
+from urllib.parse import parse_qs, quote
 import httpx
 from channels.generic.websocket import AsyncWebsocketConsumer
+from . import codec, lifespan, sfu_resilience, tracing
+from .admission import RateLimiter, admit, sfu_slot
+from .codec import encode_group_event
+from .log import bind, fields, lazy, redacted
+from .metrics import ERRORS, RECEIVE_SECONDS, SFU_REQUEST_SECONDS, SOCKETS, sfu_endpoint_label
+from .models import Participant
 from django.conf import settings
-from asgiref.sync import sync_to_async
-from .models import Room, Participant
-import traceback # For detailed error logging
-
-# --- Database Interaction Helpers (Correctly Defined) ---
-@sync_to_async
-def get_room_and_participant_for_connect_db(room_name, client_id):
-    print(f"DB_HELPER: get_room_and_participant_for_connect_db - room_name='{room_name}', client_id='{client_id}'")
-    room, created = Room.objects.get_or_create(name=room_name)
-    is_host_flag = False
-    default_display_name = f"User-{client_id[:5]}"
-    current_display_name = default_display_name
-
-    if created:
-        print(f"DB_HELPER: Room '{room_name}' created.")
-        room.host_client_id = client_id
-        room.save() 
-        is_host_flag = True
-        current_display_name = "Host"
-    elif not room.host_client_id:
-        print(f"DB_HELPER: Room '{room_name}' existed but had no host. Assigning host.")
-        room.host_client_id = client_id
-        room.save()
-        is_host_flag = True
-        current_display_name = "Host"
-    elif room.host_client_id == client_id:
-        print(f"DB_HELPER: Client '{client_id}' is rejoining as HOST for room '{room_name}'.")
-        is_host_flag = True
-        try:
-            existing_participant = Participant.objects.get(client_id=client_id, room=room)
-            current_display_name = existing_participant.display_name
-            print(f"DB_HELPER: Rejoining host found existing name: '{current_display_name}'")
-        except Participant.DoesNotExist:
-            current_display_name = "Host" 
-            print(f"DB_HELPER: Rejoining host, no previous participant record for name, defaulting to 'Host'")
-    else: # Attendee
-        print(f"DB_HELPER: Client '{client_id}' is joining as ATTENDEE for room '{room_name}'.")
-        try:
-            existing_participant = Participant.objects.get(client_id=client_id, room=room)
-            current_display_name = existing_participant.display_name
-            print(f"DB_HELPER: Rejoining attendee found existing name: '{current_display_name}'")
-        except Participant.DoesNotExist:
-            print(f"DB_HELPER: New attendee, using default name: '{current_display_name}'")
-            pass 
+from .placement import get_placement
+from .room_state import get_room_state, room_group_name
+from .sfu_events import get_event_stream
+from .sfu_resilience import SfuUnavailable
+from .sfu_client import get_sfu_client
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+sfu_reads = SingleFlight()
+
+# Message types receive() handles; anything else is recorded as 'unknown' so clients cannot mint metric labels.
+MESSAGE_TYPES = frozenset({
+    'updateDisplayName', 'requestParticipantList', 'createWebRtcTransport', 'connectTransport',
+    'produce', 'closeProducer', 'consume', 'resumeConsumer', 'consumeAll', 'resumeConsumers', 'endRoom',
+    'requestParticipantPage',
+})
+
+# Close codes after which a session is torn down at once instead of kept for resumption:
+# the client closed or navigated away on purpose, we closed it over an error, or the room ended.
+NON_RESUMABLE_CLOSE_CODES = frozenset({1000, 1001, 4001, 4002, 4003})
+
+async def mediasoup_request(method, endpoint, data=None, node=None):
+    # node: base URL of the SFU hosting the room (placement.py); None is MEDIASOUP_NODE_URL.
+    started = time.perf_counter()
+    label = sfu_endpoint_label(endpoint)
+    try:
+        with tracing.async_span(f'{method} {label}', 'sfu', endpoint=endpoint, node=node):
+            try:
+                sfu_resilience.get_breaker(node).check() # An open breaker fails the call without waiting for a slot
+            except SfuUnavailable as e: ERRORS.inc('sfu', 'breaker_open'); logger.warning("Not calling Mediasoup Node.js for %s: %s", endpoint, e); raise
+            async with sfu_slot(endpoint): # Per-room and per-process in-flight caps, see admission.py
+                return await _mediasoup_request(method, endpoint, data, node, started, label)
+    finally:
+        SFU_REQUEST_SECONDS.observe(time.perf_counter() - started, method, label)
+
+async def _mediasoup_request(method, endpoint, data, node, started, label):
+    # Payload redaction and response snippets are only rendered if the record is emitted.
+    logger.debug("Mediasoup request %s %s data=%s", method, endpoint, redacted(data), extra=fields(event='sfu.request'))
     
-    participant, p_created = Participant.objects.update_or_create(
-        client_id=client_id,
-        defaults={'room': room, 'display_name': current_display_name, 'is_host': is_host_flag}
-    )
-    if p_created:
-        print(f"DB_HELPER: Participant record CREATED for '{client_id}'. is_host: {is_host_flag}, name: '{current_display_name}'")
-    else:
-        print(f"DB_HELPER: Participant record UPDATED for '{client_id}'. is_host: {is_host_flag}, name: '{current_display_name}'")
-    return room, participant, is_host_flag, current_display_name
-
-@sync_to_async
-def save_room_rtp_capabilities_db(room_instance, rtp_caps):
-    print(f"DB_HELPER: save_room_rtp_capabilities_db for room '{room_instance.name if room_instance else 'None'}'")
-    if rtp_caps and room_instance:
-        room_instance.router_rtp_capabilities = rtp_caps
-        room_instance.save()
-        print(f"DB_HELPER: RTP capabilities saved for room '{room_instance.name}'.")
-        return True
-    print(f"DB_HELPER: Failed to save RTP capabilities (no rtp_caps or room_instance).")
-    return False
-
-@sync_to_async
-def get_host_participant_info_db(room_instance):
-    print(f"DB_HELPER: get_host_participant_info_db for room '{room_instance.name if room_instance else 'None'}' with host_client_id '{room_instance.host_client_id if room_instance else 'N/A'}'")
-    if room_instance and room_instance.host_client_id:
-        host = Participant.objects.filter(room=room_instance, client_id=room_instance.host_client_id, is_host=True).first()
-        print(f"DB_HELPER: Host participant found: {host.display_name if host else 'None'}")
-        return host
-    return None
-
-@sync_to_async
-def handle_participant_disconnect_db_ops(client_id_to_remove):
-    print(f"DB_HELPER: handle_participant_disconnect_db_ops for client_id='{client_id_to_remove}'")
-    participant_to_remove = Participant.objects.select_related('room').filter(client_id=client_id_to_remove).first()
-    room_obj = None
-    host_left_room = False
-
-    if participant_to_remove:
-        room_obj = participant_to_remove.room 
-        is_actually_host = participant_to_remove.is_host
+    client = get_sfu_client(node) # Shared keep-alive pool, see sfu_client.py
+    try:
+        if method == 'GET': send = lambda: client.request('GET', endpoint)
+        elif method == 'POST': send = lambda: client.request('POST', endpoint, json=data) # httpx handles json for 'json='
+        elif method == 'DELETE': send = lambda: client.request('DELETE', endpoint)
+        else: raise ValueError(f"Unsupported HTTP method: {method}")
+        # Deadline, retries, hedging and the node's circuit breaker, see sfu_resilience.py
+        response = await sfu_resilience.call(send, client.base_url, method, label)
         
-        print(f"DB_HELPER: Attempting to delete participant {client_id_to_remove} (was_host={is_actually_host}) from room {room_obj.name if room_obj else 'Unknown'}")
-        participant_to_remove.delete()
-        print(f"DB_HELPER: Participant {client_id_to_remove} removed.")
-
-        if is_actually_host and room_obj:
-            # Re-fetch to ensure no stale data if concurrent ops were possible, though less likely here.
-            # room_obj_fresh = Room.objects.get(pk=room_obj.pk)
-            if room_obj.host_client_id == client_id_to_remove: # Check if this was indeed the current host
-                room_obj.host_client_id = None 
-                room_obj.save()
-                host_left_room = True
-                print(f"DB_HELPER: Host {client_id_to_remove} left room {room_obj.name}, host_client_id cleared.")
-    else:
-        print(f"DB_HELPER: Participant {client_id_to_remove} not found for deletion.")
+        logger.debug("Mediasoup response %s %s status=%s body=%s", method, endpoint, response.status_code, lazy(lambda: response.text[:200] or "None"),
+                     extra=fields(event='sfu.response', duration_ms=round((time.perf_counter() - started) * 1000, 2)))
+        response.raise_for_status() 
         
-    return room_obj, host_left_room
-
-@sync_to_async
-def update_participant_display_name_db_ops(client_id_val, new_name_val):
-    print(f"DB_HELPER: update_participant_display_name_db_ops for client_id='{client_id_val}', new_name='{new_name_val}'")
-    participant = Participant.objects.select_related('room').get(client_id=client_id_val)
-    participant.display_name = new_name_val
-    participant.save()
-    print(f"DB_HELPER: Display name updated for '{client_id_val}'.")
-    return participant
-
-@sync_to_async
-def get_participant_is_host_db_ops(client_id_val):
-    print(f"DB_HELPER: get_participant_is_host_db_ops for client_id='{client_id_val}'")
-    try: 
-        is_host = Participant.objects.get(client_id=client_id_val).is_host
-        print(f"DB_HELPER: Client '{client_id_val}' is_host: {is_host}")
-        return is_host
-    except Participant.DoesNotExist: 
-        print(f"DB_HELPER: Client '{client_id_val}' not found, returning is_host=False.")
-        return False
-
-@sync_to_async
-def get_participant_room_from_instance_db_ops(participant_instance):
-    print(f"DB_HELPER: get_participant_room_from_instance_db_ops for participant '{participant_instance.client_id if participant_instance else 'None'}'")
-    if participant_instance:
-        room = participant_instance.room # Accessing the related field
-        print(f"DB_HELPER: Room found: '{room.name if room else 'None'}'")
-        return room
-    return None
-
-
-@sync_to_async
-def get_participant_list_for_room_db_ops(room_obj):
-    print(f"DB_HELPER: get_participant_list_for_room_db_ops for room '{room_obj.name if room_obj else 'None'}'")
-    if not room_obj: return []
-    participants = list(Participant.objects.filter(room=room_obj).values('client_id', 'display_name', 'is_host').order_by('-is_host', 'display_name'))
-    print(f"DB_HELPER: Participant list: {participants}")
-    return participants
-# --- End Database Interaction Helpers ---
-
-
-async def mediasoup_request(method, endpoint, data=None):
-    url = f"{settings.MEDIASOUP_NODE_URL}{endpoint}"
-    log_data = data 
-    if data:
-        log_data_copy = dict(data) # Create a copy to modify for logging
-        if 'dtlsParameters' in log_data_copy and isinstance(log_data_copy['dtlsParameters'], dict):
-            log_data_copy['dtlsParameters'] = {**log_data_copy['dtlsParameters'], 'fingerprints': '[REDACTED]'}
-        if 'rtpParameters' in log_data_copy: log_data_copy['rtpParameters'] = '[REDACTED_DICT]'
-        if 'rtpCapabilities' in log_data_copy: log_data_copy['rtpCapabilities'] = '[REDACTED_DICT]'
-        log_data_str = str(log_data_copy)[:300] # Log a snippet
-    else:
-        log_data_str = "None"
-
-    print(f"Consumer: Mediasoup request. Method: {method}, URL: {url}, Data: {log_data_str}...")
-    
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            if method == 'GET': response = await client.get(url)
-            elif method == 'POST': response = await client.post(url, json=data) # httpx handles json for 'json='
-            else: raise ValueError(f"Unsupported HTTP method: {method}")
-            
-            response_text_snippet = response.text[:200] if response.text else "None"
-            print(f"Consumer: Mediasoup response status: {response.status_code}, Content snippet: {response_text_snippet}...")
-            response.raise_for_status() 
-            
-            if response.status_code == 204:
-                print(f"Consumer: Mediasoup request to {endpoint} returned 204 No Content.")
-                return {'success': True, 'message': 'Operation successful with 204 No Content.'} 
-            
-            content_type = response.headers.get('content-type','').lower()
-            is_json_response = 'application/json' in content_type
-
-            if not response.content or not response.text.strip():
-                print(f"Consumer: Mediasoup request to {endpoint} returned {response.status_code} with empty body.")
-                if 200 <= response.status_code < 300:
-                    return {'success': True, 'message': f'Request to {endpoint} successful (status {response.status_code}) with empty body.'}
-                return None # Should have been caught by raise_for_status if not 2xx
-
-            if 200 <= response.status_code < 300 and not is_json_response:
-                 print(f"Consumer: Mediasoup request to {endpoint} returned {response.status_code} with non-JSON body: '{response.text.strip()}'")
-                 return {'success': True, 'message': f'Request to {endpoint} successful (status {response.status_code}) with non-JSON body.'}
-
-            if is_json_response:
-                return response.json()
-            else: # Fallback if content exists but isn't JSON and wasn't caught above
-                print(f"Consumer: Mediasoup request to {endpoint} has content but not JSON. Status: {response.status_code}. Treating as simple success if 2xx.")
-                if 200 <= response.status_code < 300:
-                    return {'success': True, 'message': 'Operation successful, non-JSON content.'}
-                # This path should ideally not be hit if raise_for_status works for non-2xx.
-                raise Exception(f"Unexpected non-JSON response with status {response.status_code} for {endpoint}")
-
-        except httpx.HTTPStatusError as e:
-            print(f"Consumer: HTTP error from Mediasoup Node.js for {endpoint}: Status {e.response.status_code} - Response: {e.response.text[:500]}")
-            try: error_json = json.loads(e.response.text); raise Exception(error_json.get("error", e.response.text))
-            except json.JSONDecodeError: raise 
-        except httpx.RequestError as e: print(f"Consumer: Network/Request error calling Mediasoup Node.js for {endpoint}: {e}"); raise
-        except json.JSONDecodeError as e: 
-            print(f"Consumer: JSONDecodeError parsing Mediasoup Node.js response for {endpoint}. Status: {response.status_code}, Content: {response.text[:500]}. Error: {e}")
-            if 200 <= response.status_code < 300: return {'success': True, 'message': 'Response not JSON but status OK (JSON parse failed).'} # Should be caught by earlier checks ideally
-            raise 
+        if response.status_code == 204:
+            return {'success': True, 'message': 'Operation successful with 204 No Content.'} 
+        
+        content_type = response.headers.get('content-type','').lower()
+        is_json_response = 'application/json' in content_type
+
+        if not response.content or not response.text.strip():
+            if 200 <= response.status_code < 300:
+                return {'success': True, 'message': f'Request to {endpoint} successful (status {response.status_code}) with empty body.'}
+            return None # Should have been caught by raise_for_status if not 2xx
+
+        if 200 <= response.status_code < 300 and not is_json_response:
+             return {'success': True, 'message': f'Request to {endpoint} successful (status {response.status_code}) with non-JSON body.'}
+
+        if is_json_response:
+            return response.json()
+        else: # Fallback if content exists but isn't JSON and wasn't caught above
+            if 200 <= response.status_code < 300:
+                return {'success': True, 'message': 'Operation successful, non-JSON content.'}
+            # This path should ideally not be hit if raise_for_status works for non-2xx.
+            raise Exception(f"Unexpected non-JSON response with status {response.status_code} for {endpoint}")
+
+    except httpx.HTTPStatusError as e:
+        ERRORS.inc('sfu', f'http_{e.response.status_code}')
+        logger.warning("HTTP error from Mediasoup Node.js for %s: status %s, response %s", endpoint, e.response.status_code, lazy(lambda response=e.response: response.text[:500])) # Bound now: 'e' is unset once the except block ends
+        try: error_json = json.loads(e.response.text); raise Exception(error_json.get("error", e.response.text))
+        except json.JSONDecodeError: raise 
+    except SfuUnavailable as e: ERRORS.inc('sfu', 'breaker_open'); logger.warning("Not calling Mediasoup Node.js for %s: %s", endpoint, e); raise
+    except httpx.RequestError as e: ERRORS.inc('sfu', type(e).__name__); logger.warning("Network/request error calling Mediasoup Node.js for %s: %r", endpoint, e); raise
+    except json.JSONDecodeError as e: 
+        ERRORS.inc('sfu', 'JSONDecodeError')
+        logger.warning("JSONDecodeError parsing Mediasoup Node.js response for %s: status %s, content %s, error %s", endpoint, response.status_code, lazy(lambda: response.text[:500]), e)
+        if 200 <= response.status_code < 300: return {'success': True, 'message': 'Response not JSON but status OK (JSON parse failed).'} # Should be caught by earlier checks ideally
+        raise 
+
+async def mediasoup_get(endpoint, ttl=None, node=None):
+    # Concurrent GETs of the same endpoint share one SFU round trip (see singleflight.py).
+    # Endpoints name the room and a room lives on one node, so the endpoint alone is the key.
+    return await sfu_reads.do(endpoint, lambda: mediasoup_request('GET', endpoint, node=node), ttl=ttl)
+
+def sfu_id(value):
+    # Ids from client messages go into SFU paths quoted, so a '/' or '?' in one cannot reach another endpoint.
+    return quote(str(value), safe='')
+
+def producers_endpoint(room_name, client_id):
+    return f'/rooms/{room_name}/clients/{client_id}/producers'
 
 class InterviewConsumer(AsyncWebsocketConsumer):
+    trace = None
+
+    async def dispatch(self, message):
+        # Every handler runs with the session's Trace (if the session is traced) as the current one, see tracing.py.
+        message_type = message['type']
+        if message_type == 'websocket.connect':
+            kwargs = self.scope['url_route']['kwargs']
+            self.trace = tracing.start_trace(kwargs['room_name'], kwargs['client_id'], forced=self.query_param('trace') in ('1', 'true'))
+        started = time.perf_counter()
+        with tracing.activate(self.trace):
+            try:
+                await super().dispatch(message)
+            finally: # websocket_disconnect ends by raising StopConsumer
+                if message_type in ('websocket.connect', 'websocket.disconnect'):
+                    tracing.record(message_type[len('websocket.'):], 'handler', started)
+                if message_type == 'websocket.disconnect' and self.trace is not None:
+                    await self.write_trace()
+
+    async def write_trace(self):
+        trace, self.trace = self.trace, None
+        try:
+            path = await asyncio.get_running_loop().run_in_executor(None, tracing.write_trace, trace)
+            self.log.info("Trace written to %s", path, extra=fields(event='consumer.trace', trace_events=len(trace.events)))
+        except OSError as e:
+            self.log.warning("Writing trace failed: %s", e)
+
     async def connect(self):
+        started = time.perf_counter()
+        SOCKETS.inc() # Channels calls disconnect() for every connect(), even a failed one
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.client_id = self.scope['url_route']['kwargs']['client_id'] 
-        self.room_group_name = f'interview_{self.room_name}'
+        self.room_group_name = room_group_name(self.room_name)
         self.is_host = False 
         self.display_name = ""
-        self.participant_instance = None 
-        self.room_instance = None
+        self.resume_token = None
+        self.room_state = get_room_state(self.room_name)
+        self.log = bind(logger, room=self.room_name, client=self.client_id)
+        try:
+            await lifespan.ensure_started() # Daphne sends no lifespan.startup; the first socket starts the background tasks
+        except Exception:
+            self.log.exception("Connect: background services failed to start; serving without them")
+        self.sfu_node = None # Set once the room is placed, below
+        self.sfu_events = None
+        self.admitted = False
+        self.rate_limiter = RateLimiter()
+        # Clients that understand the single 'joinState' message opt in with ?joinState=1;
+        # older clients keep the roleAssignment/routerRtpCapabilities/... sequence.
+        self.wants_join_state = self.query_param('joinState') in ('1', 'true')
+        # Hash of router capabilities the client already holds (from an earlier join); if they match, only the hash is sent.
+        self.known_caps_hash = self.query_param('capsHash')
+
+        # Clients offering the binary subprotocol get MessagePack frames both ways (see codec.py).
+        offered = self.scope.get('subprotocols') or ()
+        self.binary = codec.BINARY_SUBPROTOCOL in offered and codec.binary_enabled()
+        subprotocol = codec.BINARY_SUBPROTOCOL if self.binary else (codec.JSON_SUBPROTOCOL if codec.JSON_SUBPROTOCOL in offered else None)
+
+        resume_token = self.query_param('resume')
+        retry_after = admit(resuming=bool(resume_token) and self.client_id in self.room_state.detached)
+        if retry_after is not None:
+            # Saturated: turn the join away before it costs any SFU or DB work; 1013 is "try again later".
+            self.log.warning("Connect: rejected, process saturated; retry in %ss", retry_after)
+            await self.accept(subprotocol=subprotocol)
+            await self.send_json({'type': 'serverBusy', 'data': {'retryAfter': retry_after}})
+            await self.close(code=1013)
+            return
+        self.admitted = True
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
-        print(f"Consumer CONNECT: Client {self.client_id} attempting to connect to room {self.room_name}")
+        await self.accept(subprotocol=subprotocol)
+        self.log.debug("Connect: client attempting to join")
 
         try:
-            self.room_instance, self.participant_instance, self.is_host, self.display_name = \
-                await get_room_and_participant_for_connect_db(self.room_name, self.client_id)
-            
-            print(f"Consumer CONNECT: Client {self.client_id} is {'HOST' if self.is_host else 'ATTENDEE'}. Name: '{self.display_name}'")
-
-            await self.send_json({'type': 'roleAssignment', 'data': {'isHost': self.is_host, 'clientId': self.client_id, 'displayName': self.display_name}})
-
-            if not self.room_instance.router_rtp_capabilities:
-                print(f"Consumer CONNECT: Fetching routerRtpCapabilities for room {self.room_name}")
-                rtp_caps = await mediasoup_request('GET', f'/rooms/{self.room_name}/router-rtp-capabilities')
-                if not await save_room_rtp_capabilities_db(self.room_instance, rtp_caps):
-                    print(f"Consumer CONNECT: ERROR - Failed to fetch or save routerRtpCapabilities for room {self.room_name}")
-                    raise Exception("Failed to initialize room capabilities.")
-            
-            await self.send_json({'type': 'routerRtpCapabilities', 'data': self.room_instance.router_rtp_capabilities})
-            await self.broadcast_participant_list(self.room_instance)
-            
-            if not self.is_host and self.room_instance.host_client_id:
-                host_participant_db = await get_host_participant_info_db(self.room_instance)
-                if host_participant_db:
-                    print(f"Consumer CONNECT: Attendee {self.client_id} - Sending hostInformation for host {host_participant_db.client_id}")
-                    await self.send_json({
-                        'type': 'hostInformation',
-                        'data': {'hostClientId': host_participant_db.client_id, 'hostDisplayName': host_participant_db.display_name}
-                    })
-                    try:
-                        print(f"Consumer CONNECT: Attendee {self.client_id} - Fetching existing producers for host {self.room_instance.host_client_id}.")
-                        host_producers = await mediasoup_request('GET', f'/rooms/{self.room_name}/clients/{self.room_instance.host_client_id}/producers')
-                        if host_producers and isinstance(host_producers, list):
-                            print(f"Consumer CONNECT: Attendee {self.client_id} - Host has {len(host_producers)} active producers.")
-                            for producer_info in host_producers:
-                                if producer_info.get('appData', {}).get('isHostProducer'):
-                                    print(f"Consumer CONNECT: Sending existing host producer {producer_info.get('producerId')} (kind: {producer_info.get('kind')}) to attendee {self.client_id}")
-                                    await self.send_json({'type': 'newProducer', 'data': { 'clientId': self.room_instance.host_client_id, 'producerId': producer_info.get('producerId'), 'kind': producer_info.get('kind'), 'appData': producer_info.get('appData', {})}})
-                                else:
-                                    print(f"Consumer CONNECT: Attendee {self.client_id} - Skipping producer, not marked as host producer: {producer_info.get('producerId')}")
-                        elif not host_producers:
-                            print(f"Consumer CONNECT: Attendee {self.client_id} - Host {self.room_instance.host_client_id} has no active producers.")
-                        else:
-                            print(f"Consumer CONNECT: Attendee {self.client_id} - Warning: Received unexpected format for host producers: {host_producers}")
-                    except Exception as e_prod:
-                        print(f"Consumer CONNECT: Attendee {self.client_id} - Error fetching host producers: {e_prod}")
-            
-            print(f"Consumer CONNECT: Client {self.client_id} successfully connected and configured.")
+            self.sfu_node = await get_placement().node_for(self.room_state)
+            self.sfu_events = get_event_stream(self.sfu_node)
+            # A client back from a dropped socket presents ?resume=<token> to reattach to its detached session.
+            resumed = await self.room_state.resume(self.client_id, resume_token, self.channel_name) if resume_token else None
+            if resumed:
+                await self.send_resumed_session(resumed)
+            else:
+                if resume_token:
+                    await self.send_json({'type': 'resumeFailed', 'data': {'clientId': self.client_id}})
+                state = await self.load_join_state()
+                if self.wants_join_state:
+                    await self.send_json({'type': 'joinState', 'data': state})
+                else:
+                    await self.send_legacy_join_sequence(state)
+            self.log.info("Connect: handshake sent", extra=fields(event='consumer.join', duration_ms=round((time.perf_counter() - started) * 1000, 2),
+                                                                  join_state=self.wants_join_state, resumed=bool(resumed)))
 
         except Exception as e:
-            print(f"Consumer CONNECT: FATAL Error for {self.client_id} in room {self.room_name}: {e}")
-            traceback.print_exc()
+            ERRORS.inc('connect', type(e).__name__)
+            self.log.exception("Connect: fatal error during setup: %s", e)
             try: # Try to send error before closing
                 await self.send_json({'type': 'error', 'message': f"Server connection setup error: {str(e)}"})
             except Exception as send_e:
-                print(f"Consumer CONNECT: Error sending final error message: {send_e}")
+                self.log.warning("Connect: error sending final error message: %s", send_e)
             await self.close(code=4001)
 
-    async def disconnect(self, close_code):
-        print(f"Consumer DISCONNECT: Client {self.client_id} from room {self.room_name}. Code: {close_code}")
-        try:
-            room_after_disconnect, host_left_flag = await handle_participant_disconnect_db_ops(self.client_id)
+    def query_param(self, name):
+        values = parse_qs(self.scope.get('query_string', b'').decode('latin-1')).get(name)
+        return values[0] if values else None
 
-            if host_left_flag:
-                 print(f"Consumer DISCONNECT: Host {self.client_id} left, broadcasting hostLeft.")
-                 await self.channel_layer.group_send( self.room_group_name, {'type': 'broadcast_message', 'message': {'type': 'hostLeft', 'data': {'clientId': self.client_id}}})
+    async def load_join_state(self):
+        """Join the room and gather everything the client needs, running independent steps concurrently."""
+        capabilities_task = asyncio.ensure_future(self.ensure_router_rtp_capabilities())
+        try:
+            joined = await self.room_state.join(self.client_id, self.channel_name)
+            if joined['stale_session']:
+                # Rejoined without resuming: close the transports the detached session left on the SFU.
+                self.log.info("Connect: replacing detached session")
+                await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/disconnected', node=self.sfu_node)
+                sfu_reads.invalidate(producers_endpoint(self.room_name, self.client_id))
+        except BaseException:
+            capabilities_task.cancel()
+            raise
+        self.is_host, self.display_name, self.resume_token = joined['is_host'], joined['display_name'], joined['resume_token']
+        self.log.info("Connect: client joined as %s with name %r", 'HOST' if self.is_host else 'ATTENDEE', self.display_name)
+
+        host_participant = None if self.is_host else self.room_state.host_info()
+        host_client_id = host_participant['client_id'] if host_participant else None
+        producers_task = asyncio.ensure_future(self.fetch_host_producers(host_client_id)) if host_client_id else None
+        try:
+            rtp_caps = await capabilities_task
+        except BaseException:
+            if producers_task:
+                producers_task.cancel()
+            raise
+        producers = await producers_task if producers_task else []
+        caps_hash = self.room_state.router_rtp_capabilities_hash
+
+        return {
+            'isHost': self.is_host,
+            'clientId': self.client_id,
+            'displayName': self.display_name,
+            'resumeToken': self.resume_token,
+            'routerRtpCapabilities': None if self.known_caps_hash and self.known_caps_hash == caps_hash else rtp_caps,
+            'routerRtpCapabilitiesHash': caps_hash,
+            'host': {'hostClientId': host_client_id, 'hostDisplayName': host_participant['display_name']} if host_participant else None,
+            'producers': producers,
+            **self.roster_state(host_participant),
+        }
+
+    def roster_state(self, host_participant):
+        """Roster fields of joinState/sessionResumed. In large rooms attendees get the count and the host only."""
+        broadcaster = self.room_state.roster_broadcaster
+        full = broadcaster.receives_full_roster(self.client_id)
+        return {
+            'participants': broadcaster.ordered() if full else [host_participant] if host_participant else [],
+            'participantsSeq': broadcaster.seq,
+            'participantCount': len(self.room_state.participants),
+            'rosterMode': 'full' if full else 'count',
+        }
+
+    async def send_resumed_session(self, resumed):
+        """Reattach to a detached session: its transports and consumers are still on the SFU and the roster never
+        changed, so the client only gets what may have happened while it was away."""
+        self.is_host, self.display_name, self.resume_token = resumed['is_host'], resumed['display_name'], resumed['resume_token']
+        self.log.info("Connect: session resumed as %s", 'HOST' if self.is_host else 'ATTENDEE')
+        host_participant = None if self.is_host else self.room_state.host_info()
+        await self.send_json({'type': 'sessionResumed', 'data': {
+            'isHost': self.is_host,
+            'clientId': self.client_id,
+            'displayName': self.display_name,
+            'resumeToken': self.resume_token,
+            'host': {'hostClientId': host_participant['client_id'], 'hostDisplayName': host_participant['display_name']} if host_participant else None,
+            'producers': [p for p in self.room_state.producers.values() if p['clientId'] != self.client_id],
+            **self.roster_state(host_participant),
+        }})
+
+    async def ensure_router_rtp_capabilities(self):
+        if not self.room_state.router_rtp_capabilities:
+            self.log.debug("Connect: fetching routerRtpCapabilities")
+            rtp_caps = await mediasoup_get(f'/rooms/{self.room_name}/router-rtp-capabilities', node=self.sfu_node)
+            if not rtp_caps:
+                self.log.error("Connect: failed to fetch routerRtpCapabilities")
+                raise Exception("Failed to initialize room capabilities.")
+            await self.room_state.set_rtp_capabilities(rtp_caps)
+        return self.room_state.router_rtp_capabilities
+
+    async def fetch_host_producers(self, host_client_id):
+        """Host producers as newProducer payloads; a failed lookup is logged and yields none."""
+        if self.sfu_events.live:
+            # Mirrored from the SFU's event stream, no round trip needed.
+            host_producers = self.sfu_events.registry.producers_of(self.room_name, host_client_id)
+        else:
+            try:
+                self.log.debug("Connect: fetching existing producers for host %s", host_client_id)
+                host_producers = await mediasoup_get(producers_endpoint(self.room_name, host_client_id), ttl=settings.MEDIASOUP_PRODUCERS_CACHE_TTL, node=self.sfu_node)
+            except Exception as e_prod:
+                self.log.warning("Connect: error fetching host producers: %s", e_prod)
+                return []
+        if not host_producers:
+            self.log.debug("Connect: host %s has no active producers", host_client_id)
+            return []
+        if not isinstance(host_producers, list):
+            self.log.warning("Connect: unexpected format for host producers: %.200r", host_producers)
+            return []
+        producers = []
+        for producer_info in host_producers:
+            if producer_info.get('appData', {}).get('isHostProducer'):
+                producers.append({'clientId': host_client_id, 'producerId': producer_info.get('producerId'), 'kind': producer_info.get('kind'), 'appData': producer_info.get('appData', {})})
+            else:
+                self.log.debug("Connect: skipping producer %s, not marked as host producer", producer_info.get('producerId'))
+        return producers
+
+    async def send_legacy_join_sequence(self, state):
+        await self.send_json({'type': 'roleAssignment', 'data': {'isHost': state['isHost'], 'clientId': state['clientId'], 'displayName': state['displayName'], 'resumeToken': state['resumeToken']}})
+        await self.send_json({'type': 'routerRtpCapabilities', 'hash': state['routerRtpCapabilitiesHash'], 'data': state['routerRtpCapabilities']})
+        # Full roster for the joiner only; everyone else gets the coalesced join delta.
+        if state['rosterMode'] == 'full':
+            await self.send_json({'type': 'participantList', 'seq': state['participantsSeq'], 'data': state['participants']})
+        else:
+            await self.send_json(self.room_state.roster_broadcaster.count_message())
+        if state['host']:
+            await self.send_json({'type': 'hostInformation', 'data': state['host']})
+            for producer in state['producers']:
+                await self.send_json({'type': 'newProducer', 'data': producer})
 
-            print(f"Consumer DISCONNECT: Notifying Mediasoup for client {self.client_id}.")
-            await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/disconnected') 
-            
-            if room_after_disconnect: 
-                print(f"Consumer DISCONNECT: Broadcasting updated participant list for room {room_after_disconnect.name}.")
-                await self.broadcast_participant_list(room_after_disconnect)
-            else: 
-                print(f"Consumer DISCONNECT: No room context after DB ops, broadcasting generic peerClosed for {self.client_id}.")
-                await self.channel_layer.group_send( self.room_group_name, {'type': 'broadcast_message', 'message': {'type': 'peerClosed', 'data': {'clientId': self.client_id}}})
+    async def disconnect(self, close_code):
+        self.log.info("Disconnect: code %s", close_code)
+        try:
+            if not self.admitted:
+                return
+            grace = settings.SESSION_RESUME_GRACE_SECONDS
+            if grace > 0 and self.resume_token and close_code not in NON_RESUMABLE_CLOSE_CODES:
+                # Keep participant, host role and SFU transports; the client may come back with its resume token.
+                if await self.room_state.detach(self.client_id, self.channel_name, grace, self.expire_session):
+                    self.log.info("Disconnect: session kept %ss for resumption", grace)
+                    return
+            await self.leave_room(self.channel_name)
         except Exception as e:
-            print(f"Consumer DISCONNECT: Error for {self.client_id}: {e}"); traceback.print_exc()
+            ERRORS.inc('disconnect', type(e).__name__)
+            self.log.exception("Disconnect: error: %s", e)
         finally:
+            SOCKETS.dec()
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-            print(f"Consumer DISCONNECT: Client {self.client_id} removed from group {self.room_group_name}.")
 
+    async def expire_session(self):
+        try:
+            await self.leave_room(expired=True)
+        except Exception as e:
+            ERRORS.inc('disconnect', type(e).__name__)
+            self.log.exception("Disconnect: error ending detached session: %s", e)
+
+    async def leave_room(self, channel_name=None, expired=False):
+        """Full teardown: roster, host role, SFU transports."""
+        left = await self.room_state.leave(self.client_id, channel_name, expired)
+        if left is None:
+            self.log.debug("Disconnect: session was taken over by another socket, nothing to tear down")
+            return
+        if expired:
+            self.log.info("Disconnect: resumption grace period over, leaving")
+
+        if left['host_left']:
+            self.log.info("Disconnect: host left, broadcasting hostLeft")
+            await self.channel_layer.group_send(self.room_group_name, encode_group_event({'type': 'hostLeft', 'data': {'clientId': self.client_id}}))
 
-    async def receive(self, text_data):
-        message = json.loads(text_data)
+        await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/disconnected', node=self.sfu_node)
+        sfu_reads.invalidate(producers_endpoint(self.room_name, self.client_id))
+
+        if not left['removed']:
+            self.log.debug("Disconnect: client was not in the roster, broadcasting generic peerClosed")
+            await self.channel_layer.group_send(self.room_group_name, encode_group_event({'type': 'peerClosed', 'data': {'clientId': self.client_id}}))
+
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = codec.decode_binary(bytes_data) if bytes_data is not None else codec.loads(text_data)
+            if not isinstance(message, dict):
+                raise codec.DecodeError(f"Expected a message object, got {type(message).__name__}")
+            if not isinstance(message.get('type'), str):
+                # Checked before the type is used as a rate limit key or metric label: a list or dict type is unhashable.
+                raise codec.DecodeError(f"Message type must be a string, got {type(message.get('type')).__name__}")
+        except codec.DecodeError as e:
+            ERRORS.inc('receive.unknown', 'DecodeError')
+            self.log.warning("Receive: malformed %s frame: %s", 'binary' if bytes_data is not None else 'text', e)
+            await self.send_json({'type': 'error', 'message': 'Malformed message.'})
+            return
         payload_type = message.get('type')
         payload_data = message.get('data', {})
-        print(f"Consumer RECEIVE: From {self.client_id} ({'Host' if self.is_host else 'Attendee'}): {payload_type}")
+        retry_after = self.rate_limiter.check(payload_type)
+        if retry_after:
+            await self.send_json({'type': 'error', 'message': 'Rate limit exceeded.', 'requestType': payload_type, 'retryAfter': round(retry_after, 2)})
+            return
+        self.log.debug("Receive: %s from %s", payload_type, 'host' if self.is_host else 'attendee', extra=fields(event='consumer.receive', msg_type=payload_type))
+        metric_type = payload_type if payload_type in MESSAGE_TYPES else 'unknown'
+        started = time.perf_counter()
 
         try:
             if payload_type == 'updateDisplayName':
                 new_name = payload_data.get('displayName', '').strip()
-                print(f"Consumer RECEIVE updateDisplayName: New name '{new_name}' for {self.client_id}")
                 if 3 <= len(new_name) <= 25: 
-                    updated_participant = await update_participant_display_name_db_ops(self.client_id, new_name)
-                    self.display_name = updated_participant.display_name 
-                    self.participant_instance = updated_participant 
+                    updated_participant = await self.room_state.rename(self.client_id, new_name)
+                    self.display_name = updated_participant['display_name']
                     await self.send_json({'type': 'displayNameUpdated', 'data': {'clientId': self.client_id, 'displayName': self.display_name}})
-                    participant_room = await get_participant_room_from_instance_db_ops(updated_participant)
-                    await self.broadcast_participant_list(participant_room)
                 else:
                     await self.send_json({'type': 'error', 'message': 'Invalid display name length (3-25 chars).', 'requestType': payload_type})
 
+            elif payload_type == 'requestParticipantList':
+                # Sent by clients that missed a participantListDelta sequence number.
+                broadcaster = self.room_state.roster_broadcaster
+                await self.send_json(broadcaster.snapshot() if broadcaster.receives_full_roster(self.client_id) else broadcaster.count_message())
+
+            elif payload_type == 'requestParticipantPage':
+                # The roster of a large room, a page at a time (roster.py).
+                try:
+                    offset = max(0, int(payload_data.get('offset', 0)))
+                    limit = min(max(1, int(payload_data.get('limit', settings.ROSTER_LARGE_ROOM['page_size']))), settings.ROSTER_LARGE_ROOM['page_size'])
+                except (TypeError, ValueError):
+                    await self.send_json({'type': 'error', 'message': 'Invalid page request.', 'requestType': payload_type})
+                else:
+                    await self.send_json(self.room_state.roster_broadcaster.page(offset, limit))
+
             elif payload_type == 'createWebRtcTransport':
-                print(f"Consumer RECEIVE createWebRtcTransport: Purpose: {payload_data.get('purpose')}")
-                transport_options = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports')
+                self.log.debug("Receive createWebRtcTransport: purpose %s", payload_data.get('purpose'))
+                transport_options = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports', node=self.sfu_node)
                 await self.send_json({'type': 'transportCreated', 'data': transport_options})
 
             elif payload_type == 'connectTransport':
                 transport_id = payload_data.get('transportId'); dtls_parameters = payload_data.get('dtlsParameters')
-                print(f"Consumer RECEIVE connectTransport: For transport_id {transport_id}")
-                connect_result = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{transport_id}/connect', data={'dtlsParameters': dtls_parameters})
+                connect_result = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{sfu_id(transport_id)}/connect', data={'dtlsParameters': dtls_parameters}, node=self.sfu_node)
                 if connect_result and connect_result.get('success'): 
                     await self.send_json({'type': 'transportConnected', 'data': {'transportId': transport_id}})
-                    print(f"Consumer RECEIVE connectTransport: Relayed successfully for {transport_id}.")
                 else: 
-                    print(f"Consumer RECEIVE connectTransport: Node.js call failed/unexpected for {transport_id}: {connect_result}")
+                    self.log.warning("Receive connectTransport: Node.js call failed/unexpected for %s: %.200r", transport_id, connect_result)
                     await self.send_json({'type': 'error', 'message': 'Transport connection failure (server).', 'requestType': payload_type, 'data': {'transportId': transport_id}})
 
 
             elif payload_type == 'produce':
-                is_currently_host = await get_participant_is_host_db_ops(self.client_id)
+                is_currently_host = self.room_state.is_host(self.client_id)
                 self.is_host = is_currently_host 
-                print(f"Consumer RECEIVE produce: Client {self.client_id} is_host check: {is_currently_host}")
                 if not is_currently_host:
-                    print(f"Consumer RECEIVE produce: Denied for attendee {self.client_id}."); await self.send_json({'type': 'error', 'message': 'Only host can share media.', 'requestType': payload_type}); return
+                    self.log.info("Receive produce: denied for attendee"); await self.send_json({'type': 'error', 'message': 'Only host can share media.', 'requestType': payload_type}); return
                 
                 transport_id = payload_data.get('transportId'); kind = payload_data.get('kind'); rtp_parameters = payload_data.get('rtpParameters'); app_data = payload_data.get('appData', {}); app_data['isHostProducer'] = True 
-                producer_info = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{transport_id}/produce', data={'kind': kind, 'rtpParameters': rtp_parameters, 'appData': app_data})
+                producer_info = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{sfu_id(transport_id)}/produce', data={'kind': kind, 'rtpParameters': rtp_parameters, 'appData': app_data}, node=self.sfu_node)
+                sfu_reads.invalidate(producers_endpoint(self.room_name, self.client_id))
                 if producer_info and producer_info.get('id'): 
-                    print(f"Consumer RECEIVE produce: Producer created on Node.js: {producer_info.get('id')}")
+                    self.log.info("Receive produce: producer %s (%s) created on Node.js", producer_info.get('id'), kind)
+                    added = await self.room_state.add_producer(self.client_id, producer_info['id'], kind, app_data)
                     await self.send_json({'type': 'produced', 'data': {'producerId': producer_info['id'], 'kind': kind, 'clientId': self.client_id}})
-                    await self.channel_layer.group_send(self.room_group_name, {'type': 'broadcast_message', 'message': {'type': 'newProducer', 'data': {'clientId': self.client_id, 'producerId': producer_info['id'], 'kind': kind, 'appData': app_data}}})
+                    if added: # Otherwise the SFU event stream got there first and already announced it
+                        await self.channel_layer.group_send(self.room_group_name, encode_group_event({'type': 'newProducer', 'data': {'clientId': self.client_id, 'producerId': producer_info['id'], 'kind': kind, 'appData': app_data}}))
                 else: 
-                    print(f"Consumer RECEIVE produce: Failed to get producerId from Node.js."); await self.send_json({'type': 'error', 'message': 'Failed to create producer on server.', 'requestType': payload_type})
+                    self.log.warning("Receive produce: failed to get producerId from Node.js"); await self.send_json({'type': 'error', 'message': 'Failed to create producer on server.', 'requestType': payload_type})
             
             elif payload_type == 'closeProducer': 
-                is_currently_host = await get_participant_is_host_db_ops(self.client_id)
+                is_currently_host = self.room_state.is_host(self.client_id)
                 self.is_host = is_currently_host
                 if not is_currently_host: await self.send_json({'type': 'error', 'message': 'Only host can manage producers.', 'requestType': payload_type}); return
-                producer_id_to_close = payload_data.get('producerId'); print(f"Consumer RECEIVE closeProducer: Host {self.client_id} for producer {producer_id_to_close}.")
-                await self.channel_layer.group_send(self.room_group_name, {'type': 'broadcast_message', 'message': {'type': 'producerClosed', 'data': { 'clientId': self.client_id, 'producerId': producer_id_to_close }}})
+                producer_id_to_close = payload_data.get('producerId'); self.log.info("Receive closeProducer: producer %s", producer_id_to_close)
+                await self.room_state.remove_producer(producer_id_to_close)
+                sfu_reads.invalidate(producers_endpoint(self.room_name, self.client_id))
+                await self.channel_layer.group_send(self.room_group_name, encode_group_event({'type': 'producerClosed', 'data': { 'clientId': self.client_id, 'producerId': producer_id_to_close }}))
 
             elif payload_type == 'consume':
                 transport_id = payload_data.get('transportId'); producer_id_to_consume = payload_data.get('producerId'); rtp_capabilities = payload_data.get('rtpCapabilities'); app_data = payload_data.get('appData', {})
-                print(f"Consumer RECEIVE consume: Client {self.client_id} for producer {producer_id_to_consume}")
-                consumer_params = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{transport_id}/consume', data={'producerId': producer_id_to_consume, 'rtpCapabilities': rtp_capabilities, 'appData': app_data})
+                consumer_params = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{sfu_id(transport_id)}/consume', data={'producerId': producer_id_to_consume, 'rtpCapabilities': rtp_capabilities, 'appData': app_data}, node=self.sfu_node)
                 if consumer_params and consumer_params.get('id'): # Check for consumer ID specifically
                     await self.send_json({'type': 'consumed', 'data': consumer_params})
                 else: 
-                    print(f"Consumer RECEIVE consume: Failed to get consumer params for {producer_id_to_consume}. Result: {consumer_params}"); 
+                    self.log.warning("Receive consume: failed to get consumer params for %s: %.200r", producer_id_to_consume, consumer_params)
                     await self.send_json({'type': 'error', 'message': 'Failed to create consumer on server.', 'requestType': payload_type, 'data': {'producerId': producer_id_to_consume}})
 
 
             elif payload_type == 'resumeConsumer':
                 consumer_id = payload_data.get('consumerId')
-                print(f"Consumer RECEIVE resumeConsumer: For consumer_id {consumer_id}")
-                resume_result = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/consumers/{consumer_id}/resume')
+                resume_result = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/consumers/{sfu_id(consumer_id)}/resume', node=self.sfu_node)
                 if resume_result and resume_result.get('success'): 
                     await self.send_json({'type': 'consumerResumed', 'data': {'consumerId': consumer_id}})
-                    print(f"Consumer RECEIVE resumeConsumer: Relayed successfully for {consumer_id}.")
                 else: 
-                    print(f"Consumer RECEIVE resumeConsumer: Node.js call failed/unexpected for {consumer_id}: {resume_result}")
+                    self.log.warning("Receive resumeConsumer: Node.js call failed/unexpected for %s: %.200r", consumer_id, resume_result)
                     await self.send_json({'type': 'error', 'message': 'Consumer resume failure (server).', 'requestType': payload_type, 'data': {'consumerId': consumer_id}})
             
+            elif payload_type == 'consumeAll':
+                # One SFU round trip for several producers; defaults to every producer in the room but the client's own.
+                transport_id = payload_data.get('transportId'); rtp_capabilities = payload_data.get('rtpCapabilities'); app_data = payload_data.get('appData', {})
+                producer_ids = payload_data.get('producerIds')
+                if producer_ids is None:
+                    producer_ids = [p['producerId'] for p in self.room_state.producers.values() if p['clientId'] != self.client_id]
+                result = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/transports/{sfu_id(transport_id)}/consume-batch', data={'producerIds': producer_ids, 'rtpCapabilities': rtp_capabilities, 'appData': app_data}, node=self.sfu_node)
+                if result and isinstance(result.get('consumers'), list):
+                    if result.get('errors'):
+                        self.log.warning("Receive consumeAll: %d of %d producers failed: %.200r", len(result['errors']), len(producer_ids), result['errors'])
+                    await self.send_json({'type': 'consumedAll', 'data': {'consumers': result['consumers'], 'errors': result.get('errors', [])}})
+                else:
+                    self.log.warning("Receive consumeAll: unexpected response: %.200r", result)
+                    await self.send_json({'type': 'error', 'message': 'Failed to create consumers on server.', 'requestType': payload_type, 'data': {'producerIds': producer_ids}})
+
+            elif payload_type == 'resumeConsumers':
+                consumer_ids = payload_data.get('consumerIds') or []
+                result = await mediasoup_request('POST', f'/rooms/{self.room_name}/clients/{self.client_id}/consumers/resume-batch', data={'consumerIds': consumer_ids}, node=self.sfu_node)
+                if result and isinstance(result.get('resumed'), list):
+                    await self.send_json({'type': 'consumersResumed', 'data': {'consumerIds': result['resumed'], 'errors': result.get('errors', [])}})
+                else:
+                    self.log.warning("Receive resumeConsumers: unexpected response: %.200r", result)
+                    await self.send_json({'type': 'error', 'message': 'Consumer resume failure (server).', 'requestType': payload_type, 'data': {'consumerIds': consumer_ids}})
+
+            elif payload_type == 'endRoom':
+                if not self.room_state.is_host(self.client_id):
+                    await self.send_json({'type': 'error', 'message': 'Only host can end the room.', 'requestType': payload_type}); return
+                self.log.info("Receive endRoom: host is ending the room")
+                from .teardown import end_room # teardown.py imports this module
+                await end_room(self.room_name, ended_by=self.client_id)
+
             else:
-                print(f"Consumer RECEIVE: Unknown message type from {self.client_id}: {payload_type}")
+                self.log.warning("Receive: unknown message type %r", payload_type)
 
         except Participant.DoesNotExist:
-            print(f"Consumer RECEIVE: Participant {self.client_id} not found. Critical error or disconnected."); traceback.print_exc()
+            ERRORS.inc(f'receive.{metric_type}', 'ParticipantDoesNotExist')
+            self.log.exception("Receive: participant not found, critical error or disconnected")
             await self.send_json({'type': 'error', 'message': 'Session error or participant not found. Please rejoin.', 'requestType': payload_type})
             await self.close(code=4002) 
         except Exception as e: 
+            ERRORS.inc(f'receive.{metric_type}', type(e).__name__)
             err_msg = f"Error processing message type {payload_type} for {self.client_id}: {str(e)}"
-            traceback.print_exc()
-            print(f"Consumer RECEIVE: {err_msg}")
+            self.log.exception("Receive: %s", err_msg, extra=fields(msg_type=payload_type))
             await self.send_json({'type': 'error', 'message': err_msg, 'requestType': payload_type})
+        finally:
+            RECEIVE_SECONDS.observe(time.perf_counter() - started, metric_type)
+            tracing.record(metric_type, 'handler', started)
 
     async def broadcast_message(self, event):
-        message = event['message']
+        # Events built by encode_group_event carry the frame pre-encoded; plain 'message' events are still accepted.
+        text = event.get('text')
+        message_type = event['message_type'] if text is not None else event['message'].get('type')
         sender_channel_name = event.get('sender_channel_name')
-        # print(f"Consumer BROADCAST_MESSAGE: Type '{message.get('type')}' to group {self.room_group_name}. Sender: {sender_channel_name}, Self: {self.channel_name}")
-        if (sender_channel_name != self.channel_name) or (message.get("type") == "participantList"):
-            await self.send(text_data=json.dumps(message))
-
-    async def broadcast_participant_list(self, room_obj_param):
-        room_to_query = None
-        if isinstance(room_obj_param, Room): room_to_query = room_obj_param
-        elif isinstance(room_obj_param, str): 
-            try: room_to_query = await sync_to_async(Room.objects.get)(name=room_obj_param)
-            except Room.DoesNotExist: print(f"Consumer BROADCAST_PARTICIPANT_LIST: Room {room_obj_param} not found."); return
-        
-        if not room_to_query: print("Consumer BROADCAST_PARTICIPANT_LIST: Room object is None/invalid."); return
-        
-        try:
-            participants_list_data = await get_participant_list_for_room_db_ops(room_to_query)
-            # print(f"Consumer BROADCAST_PARTICIPANT_LIST: For room {room_to_query.name}: {participants_list_data}")
-            await self.channel_layer.group_send(
-                self.room_group_name, 
-                {'type': 'broadcast_message', 'message': {'type': 'participantList', 'data': participants_list_data}}
-            )
-        except Exception as e:
-            print(f"Consumer BROADCAST_PARTICIPANT_LIST: Error for room {room_to_query.name if room_to_query else 'Unknown'}: {e}"); traceback.print_exc()
+        target_client_id = event.get('target_client_id') # Set for SFU events that concern one client only
+        if target_client_id is not None and target_client_id != self.client_id:
+            return
+        if (sender_channel_name != self.channel_name) or (message_type in ("participantList", "participantListDelta")):
+            if self.binary:
+                await self.send(bytes_data=codec.binary_frame(text) if text is not None else codec.encode_binary(event['message']))
+            else:
+                await self.send(text_data=text if text is not None else codec.dumps(event['message']))
+        if message_type == 'roomEnded':
+            await self.close(code=4003) # The room state already let go of us; disconnect() has nothing to tear down
 
     async def send_json(self, data):
         if self.channel_layer is None or self.channel_name is None: 
-            print(f"Consumer SEND_JSON: Channel layer/name is None for {self.client_id}. Cannot send: {data.get('type')}")
+            logger.warning("Send: channel layer/name is None for %s, cannot send %s", getattr(self, 'client_id', None), data.get('type'))
             return
         try:
-            # print(f"Consumer SEND_JSON: To {self.client_id}: {data.get('type')}") # Reduce verbosity if too much
-            await self.send(text_data=json.dumps(data))
+            if self.binary:
+                await self.send(bytes_data=codec.encode_binary(data))
+            else:
+                await self.send(text_data=codec.dumps(data))
         except Exception as e: # Catch potential errors during send if channel closes abruptly
-            print(f"Consumer SEND_JSON: Error for {self.client_id} sending {data.get('type')}: {e}")
\ No newline at end of file
+            self.log.warning("Send: error sending %s: %s", data.get('type'), e)
\ No newline at end of file
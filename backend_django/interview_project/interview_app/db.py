@@ -0,0 +1,60 @@
+# interview_app/db.py
+# How the async signaling code runs its *_db_ops helpers (DB_EXECUTOR).
+#
+# asgiref's default is thread-sensitive: every sync_to_async call in the process
+# runs on one shared thread, so one room's slow write holds up every other
+# room's reads. The *_db_ops helpers only touch the ORM and their own
+# arguments, so in "pool" mode they run on a bounded pool of threads instead,
+# each keeping its own persistent connection (CONN_MAX_AGE). Ordering within a
+# room is unaffected: a room's persist task awaits one operation before the
+# next. "thread_sensitive" mode restores the single-thread behaviour.
+import asyncio
+import concurrent.futures
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import lifespan, tracing
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR['threads'], thread_name_prefix='db-ops')
+    return _executor
+
+
+def _with_fresh_connection(fn):
+    def run(*args, **kwargs):
+        # Pool threads see no request_started/finished signals: recycle connections past CONN_MAX_AGE (or broken) here.
+        close_old_connections()
+        return fn(*args, **kwargs)
+    return run
+
+
+async def run_db(fn, *args):
+    """``await fn(*args)`` for a *_db_ops helper, on the executor configured by DB_EXECUTOR."""
+    with tracing.async_span(fn.__name__, 'db'):
+        if settings.DB_EXECUTOR['mode'] == 'thread_sensitive':
+            return await sync_to_async(fn)(*args)
+        return await sync_to_async(_with_fresh_connection(fn), thread_sensitive=False, executor=_get_executor())(*args)
+
+
+def _close_connections():
+    connections.close_all()
+
+
+async def shutdown_db_executor():
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        # Connections are per thread, so they are closed from the pool's threads; any thread that
+        # misses out closes its connection when it exits.
+        await asyncio.gather(*[asyncio.wrap_future(executor.submit(_close_connections)) for _ in range(settings.DB_EXECUTOR['threads'])])
+        executor.shutdown(wait=False)
+
+
+lifespan.on_shutdown(shutdown_db_executor)
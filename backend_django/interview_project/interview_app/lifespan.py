@@ -0,0 +1,76 @@
+# interview_app/lifespan.py
+# ASGI lifespan handling. Modules that own process-wide resources register
+# startup/shutdown hooks here; asgi.py routes the "lifespan" scope to LifespanApp.
+#
+# Daphne sends no lifespan events, so the consumer also calls ensure_started()
+# on connect: the startup hooks run once per event loop, on whichever comes
+# first. Shutdown hooks only run under servers that send lifespan.shutdown
+# (uvicorn, hypercorn); under Daphne the process exit closes what they would.
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_startup_hooks = []
+_shutdown_hooks = []
+_startup = None  # Task running the startup hooks on the current loop
+
+
+def on_startup(hook):
+    """Register an async callable to run when the ASGI server starts."""
+    if hook not in _startup_hooks:
+        _startup_hooks.append(hook)
+    return hook
+
+
+def on_shutdown(hook):
+    """Register an async callable to run when the ASGI server shuts down."""
+    if hook not in _shutdown_hooks:
+        _shutdown_hooks.append(hook)
+    return hook
+
+
+async def run_startup():
+    for hook in _startup_hooks:
+        await hook()
+
+
+async def ensure_started():
+    """Run the startup hooks unless they already ran (or are running) on this event loop."""
+    global _startup
+    loop = asyncio.get_running_loop()
+    if _startup is None or _startup.get_loop() is not loop:
+        _startup = loop.create_task(run_startup())
+    task = _startup
+    try:
+        await asyncio.shield(task)
+    except Exception:
+        if _startup is task and task.done():
+            _startup = None # A failed startup is retried by the next caller instead of replayed to all of them
+        raise
+
+
+async def run_shutdown():
+    # Shut down in reverse registration order and keep going if one hook fails.
+    for hook in reversed(_shutdown_hooks):
+        try:
+            await hook()
+        except Exception:
+            logger.exception("Lifespan shutdown hook %r failed", hook)
+
+
+class LifespanApp:
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await ensure_started()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await run_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,163 @@
+# interview_app/log.py
+# Logging helpers for the signaling path.
+#
+# - bind(logger, **fields) returns an adapter that attaches structured fields
+#   (room, client, msg_type, duration_ms, ...) to every record it emits; pass
+#   per-call fields with extra=fields(...).
+# - Messages use %-style arguments so nothing is formatted for records that are
+#   filtered out; lazy() and redacted() defer expensive or sensitive rendering
+#   to the moment a record is actually written.
+# - QueueingHandler hands records to a background thread, so a slow stdout or
+#   log pipe never blocks the event loop; records are dropped (and counted)
+#   rather than queued without bound.
+# - SamplingFilter keeps 1 in N records of high-frequency events, configured by
+#   LOG_SAMPLE_RATES (event name -> N), with the event name given as fields(event=...).
+import atexit
+import copy
+import itertools
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+STRUCTURED_FIELDS = 'fields'
+
+
+def fields(**kwargs):
+    """extra= argument carrying structured fields for a single log call."""
+    return {STRUCTURED_FIELDS: kwargs}
+
+
+class FieldsAdapter(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        extra = kwargs.get('extra') or {}
+        merged = dict(self.extra)
+        merged.update(extra.get(STRUCTURED_FIELDS, {}))
+        kwargs['extra'] = {**extra, STRUCTURED_FIELDS: merged}
+        return msg, kwargs
+
+
+def bind(logger, **context):
+    return FieldsAdapter(logger, context)
+
+
+class lazy:
+    """Log argument rendered by calling ``fn`` only when the record is formatted."""
+
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+    __repr__ = __str__
+
+
+_REDACTED_KEYS = {'rtpParameters': '[REDACTED_DICT]', 'rtpCapabilities': '[REDACTED_DICT]'}
+
+
+def _redact(data, limit):
+    if not data:
+        return 'None'
+    redacted = dict(data)
+    if isinstance(redacted.get('dtlsParameters'), dict):
+        redacted['dtlsParameters'] = {**redacted['dtlsParameters'], 'fingerprints': '[REDACTED]'}
+    for key, placeholder in _REDACTED_KEYS.items():
+        if key in redacted:
+            redacted[key] = placeholder
+    return str(redacted)[:limit]
+
+
+def redacted(data, limit=300):
+    """SFU request payload with DTLS fingerprints and RTP blobs masked, rendered on emit only."""
+    return lazy(_redact, data, limit)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Appends the record's structured fields as key=value pairs."""
+
+    def format(self, record):
+        text = super().format(record)
+        record_fields = getattr(record, STRUCTURED_FIELDS, None)
+        if record_fields:
+            text += ' ' + ' '.join(f'{key}={value}' for key, value in record_fields.items() if value is not None)
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates=None):
+        super().__init__()
+        self._rates = rates
+        self._counters = {}
+
+    @property
+    def rates(self):
+        if self._rates is None:
+            from django.conf import settings
+            self._rates = getattr(settings, 'LOG_SAMPLE_RATES', {})
+        return self._rates
+
+    def filter(self, record):
+        record_fields = getattr(record, STRUCTURED_FIELDS, None)
+        event = record_fields.get('event') if record_fields else None
+        every = self.rates.get(event) if event else None
+        if not every or every <= 1 or record.levelno >= logging.WARNING:
+            return True
+        counter = self._counters.get(event)
+        if counter is None:
+            counter = self._counters[event] = itertools.count()
+        return next(counter) % every == 0
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """Queue-backed handler: the caller only enqueues; a listener thread formats and writes."""
+
+    def __init__(self, stream=None, maxsize=10000, sample=True):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        if sample:
+            self.addFilter(SamplingFilter())
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Unlike the stdlib QueueHandler, leave formatting (and lazy/redacted
+        # arguments) to the listener thread.
+        return copy.copy(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._listener is None:
+            self._start_listener()
+        super().emit(record)
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=False)
+                self._listener.start()
+                atexit.register(self.flush_and_stop)
+
+    def flush_and_stop(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop() # Drains the queue before returning
+
+    def close(self):
+        self.flush_and_stop()
+        self.target.close()
+        super().close()
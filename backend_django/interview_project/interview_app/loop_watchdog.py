@@ -0,0 +1,130 @@
+# interview_app/loop_watchdog.py
+# Event-loop lag monitor and blocking-call detector (LOOP_WATCHDOG), started
+# from the ASGI lifespan.
+#
+# A ticker coroutine sleeps for `interval` and measures how late it wakes up:
+# that lateness is the loop's lag, the time any ready callback (a message to a
+# socket, an SFU response) waits before it runs. Lags go to a histogram and to
+# a window of recent samples exported as quantile gauges.
+#
+# A watchdog thread checks the ticker's heartbeat. When the loop has not come
+# back for `block_threshold` seconds something is running on it without
+# yielding; the thread grabs the loop thread's stack at that moment
+# (sys._current_frames) and logs it, once per stall, so the culprit is named
+# while it is still blocking. The ticker logs the stall's full length once the
+# loop is back. Overhead is one timer per interval on the loop and one thread
+# waking at the same rate.
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from django.conf import settings
+
+from . import lifespan
+from .metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LoopWatchdog:
+    def __init__(self):
+        self.samples = collections.deque(maxlen=settings.LOOP_WATCHDOG['window'])
+        self.heartbeat = time.monotonic()
+        self.loop = None
+        self.loop_thread_id = None
+        self.stalls = 0
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self.loop, self.loop_thread_id = loop, threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._task = loop.create_task(self._tick())
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        task, self._task = self._task, None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _tick(self):
+        config = settings.LOOP_WATCHDOG
+        interval = config['interval']
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.heartbeat = now
+            self.samples.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= config['block_threshold']:
+                logger.warning("Event loop was blocked for %.3fs", lag)
+
+    def _watch(self):
+        config = settings.LOOP_WATCHDOG
+        reported = None  # Heartbeat of the stall already reported
+        while not self._stop.wait(config['interval']):
+            task = self._task
+            if task is None or task.done() or self.loop.is_closed():
+                continue # Not watching a running loop
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat - config['interval']
+            if stalled < config['block_threshold'] or reported == heartbeat:
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            self.loop.call_soon_threadsafe(LOOP_STALLS.inc) # Metrics are only written on the loop
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame, limit=config['stack_depth'])) if frame is not None else '(no frame)'
+            logger.warning("Event loop blocked for %.3fs so far; it is running:\n%s", stalled, stack)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+    def recent_lag(self, quantile=0.9):
+        """Lag at ``quantile`` over the recent window (seconds); 0 before any sample."""
+        return self.quantiles()[quantile] if self.samples else 0.0
+
+
+watchdog = LoopWatchdog()
+
+
+async def start_watchdog():
+    if settings.LOOP_WATCHDOG['enabled']:
+        watchdog.start()
+
+
+async def stop_watchdog():
+    await watchdog.stop()
+
+
+LOOP_LAG_SECONDS = Histogram('interview_event_loop_lag_seconds', 'How late the event loop ran a timer due now.', buckets=LAG_BUCKETS)
+LOOP_STALLS = Counter('interview_event_loop_stalls_total', 'Times the loop stayed blocked past LOOP_WATCHDOG block_threshold.')
+Gauge('interview_event_loop_lag_recent_seconds', 'Event loop lag quantiles over the recent window of samples.', ['quantile'],
+      collect=lambda: [((str(q),), lag) for q, lag in watchdog.quantiles().items()])
+
+lifespan.on_startup(start_watchdog)
+lifespan.on_shutdown(stop_watchdog)
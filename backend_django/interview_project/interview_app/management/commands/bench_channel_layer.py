@@ -0,0 +1,98 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from interview_app.channel_layer import LocalHubChannelLayer, _start_hub_thread
+
+GROUP = 'bench'
+
+
+async def _drain(layer, channels, count):
+    await asyncio.gather(*[_receive_n(layer, channel, count) for channel in channels])
+
+
+async def _receive_n(layer, channel, count):
+    for _ in range(count):
+        await layer.receive(channel)
+
+
+def _hub_worker(path, members, count, capacity, ready, done):
+    async def run():
+        layer = LocalHubChannelLayer(path=path, autostart=False, capacity=capacity)
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        await layer.sync() # Memberships are registered with the hub before the sender starts
+        ready.put(os.getpid())
+        await _drain(layer, channels, count)
+        done.put(time.perf_counter())
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = "Compare group_send throughput of InMemoryChannelLayer and the multi-process LocalHubChannelLayer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help="group_send calls per run")
+        parser.add_argument('--group-size', type=int, default=50, help="members in the group")
+        parser.add_argument('--processes', type=int, default=4, help="receiving worker processes for the hub layer")
+
+    def handle(self, *args, **options):
+        messages, group_size, processes = options['messages'], options['group_size'], options['processes']
+        capacity = messages + 1 # Measure throughput, not drop behaviour
+        payload = {'type': 'broadcast_message', 'message': {'type': 'newProducer', 'data': {'clientId': 'x' * 16, 'producerId': 'y' * 36, 'kind': 'video'}}}
+
+        elapsed = asyncio.run(self._bench_in_memory(messages, group_size, capacity, payload))
+        self._report('InMemoryChannelLayer (1 process)', messages, group_size, elapsed)
+
+        elapsed = self._bench_local_hub(messages, group_size, processes, capacity, payload)
+        self._report(f'LocalHubChannelLayer ({processes} processes)', messages, group_size, elapsed)
+
+    async def _bench_in_memory(self, messages, group_size, capacity, payload):
+        layer = InMemoryChannelLayer(capacity=capacity)
+        channels = [await layer.new_channel() for _ in range(group_size)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        receivers = asyncio.ensure_future(_drain(layer, channels, messages))
+        start = time.perf_counter()
+        for _ in range(messages):
+            await layer.group_send(GROUP, payload)
+        await receivers
+        return time.perf_counter() - start
+
+    def _bench_local_hub(self, messages, group_size, processes, capacity, payload):
+        path = os.path.join(tempfile.mkdtemp(), 'bench_hub.sock')
+        ctx = multiprocessing.get_context('fork')
+        ready, done = ctx.Queue(), ctx.Queue()
+        per_process = [group_size // processes + (1 if i < group_size % processes else 0) for i in range(processes)]
+        workers = [ctx.Process(target=_hub_worker, args=(path, n, messages, capacity, ready, done)) for n in per_process if n]
+        for worker in workers:
+            worker.start()
+        _start_hub_thread(path, group_expiry=86400)
+        for _ in workers:
+            ready.get(timeout=30)
+
+        async def send_all():
+            layer = LocalHubChannelLayer(path=path, autostart=False, capacity=capacity)
+            start = time.perf_counter()
+            for _ in range(messages):
+                await layer.group_send(GROUP, payload)
+            return start
+
+        start = asyncio.run(send_all())
+        finished = max(done.get(timeout=300) for _ in workers)
+        for worker in workers:
+            worker.join()
+        return finished - start
+
+    def _report(self, label, messages, group_size, elapsed):
+        deliveries = messages * group_size
+        self.stdout.write(
+            f"{label}: {messages} group_sends x {group_size} members in {elapsed:.3f}s "
+            f"-> {messages / elapsed:,.0f} group_send/s, {deliveries / elapsed:,.0f} deliveries/s"
+        )
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from interview_app.codec import _PREFERENCE, load_codec
+
+GROUP = 'bench'
+
+
+def _sample_message(members):
+    return {'type': 'participantList', 'data': [
+        {'client_id': f'client-{i:04d}-{"x" * 24}', 'display_name': f'Attendee {i}', 'is_host': i == 0}
+        for i in range(members)
+    ]}
+
+
+class Command(BaseCommand):
+    help = "Measure the per-message cost of fanning one broadcast out to a group, per-recipient vs encode-once, per JSON codec."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group-size', type=int, default=300)
+        parser.add_argument('--messages', type=int, default=50)
+        parser.add_argument('--roster-size', type=int, default=50, help="entries in the sample participantList payload")
+
+    def handle(self, *args, **options):
+        group_size, messages = options['group_size'], options['messages']
+        message = _sample_message(options['roster_size'])
+        for name in _PREFERENCE:
+            try:
+                name, dumps, _ = load_codec(name)
+            except ImportError:
+                self.stdout.write(f"{name}: not installed, skipped")
+                continue
+            for mode in ('per-recipient', 'encode-once'):
+                elapsed = asyncio.run(self._run(mode, dumps, message, group_size, messages))
+                self.stdout.write(
+                    f"{name:7} {mode:14} {elapsed / messages * 1e3:8.2f} ms/message "
+                    f"{elapsed / (messages * group_size) * 1e6:8.2f} us/delivery"
+                )
+
+    async def _run(self, mode, dumps, message, group_size, messages):
+        layer = InMemoryChannelLayer(capacity=messages + 1)
+        channels = [await layer.new_channel() for _ in range(group_size)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        start = time.perf_counter()
+        for _ in range(messages):
+            if mode == 'per-recipient':
+                event = {'type': 'broadcast_message', 'message': message}
+            else:
+                event = {'type': 'broadcast_message', 'message_type': message['type'], 'text': dumps(message)}
+            await layer.group_send(GROUP, event)
+            for channel in channels:
+                received = await layer.receive(channel)
+                if 'text' not in received: # What InterviewConsumer.broadcast_message does before writing the frame
+                    dumps(received['message'])
+        return time.perf_counter() - start
@@ -0,0 +1,95 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from interview_app import codec
+from interview_app.codec import _PREFERENCE, load_codec
+from interview_app.sfu_standin import ROUTER_RTP_CAPABILITIES, _transport_params
+
+
+def _consumed_payload():
+    # Shaped like mediasoup's consumer parameters for a simulcast VP8 producer.
+    return {
+        'id': str(uuid.uuid4()), 'producerId': str(uuid.uuid4()), 'kind': 'video', 'type': 'simulcast', 'paused': True,
+        'rtpParameters': {
+            'codecs': [
+                {'mimeType': 'video/VP8', 'payloadType': 101, 'clockRate': 90000, 'parameters': {},
+                 'rtcpFeedback': [{'type': 'nack', 'parameter': ''}, {'type': 'nack', 'parameter': 'pli'},
+                                  {'type': 'ccm', 'parameter': 'fir'}, {'type': 'transport-cc', 'parameter': ''}]},
+                {'mimeType': 'video/rtx', 'payloadType': 102, 'clockRate': 90000, 'parameters': {'apt': 101}, 'rtcpFeedback': []},
+            ],
+            'headerExtensions': [
+                {'uri': 'urn:ietf:params:rtp-hdrext:sdes:mid', 'id': 1, 'encrypt': False, 'parameters': {}},
+                {'uri': 'http://www.webrtc.org/experiments/rtp-hdrext/abs-send-time', 'id': 4, 'encrypt': False, 'parameters': {}},
+                {'uri': 'http://www.ietf.org/id/draft-holmer-rmcat-transport-wide-cc-extensions-01', 'id': 5, 'encrypt': False, 'parameters': {}},
+            ],
+            'encodings': [{'ssrc': 123456789, 'rtx': {'ssrc': 987654321}, 'scalabilityMode': 'L3T3', 'maxBitrate': 1500000}],
+            'rtcp': {'cname': uuid.uuid4().hex[:16], 'reducedSize': True, 'mux': True},
+            'mid': '1',
+        },
+        'appData': {'source': 'camera', 'isHostProducer': True},
+    }
+
+
+def _roster(size):
+    return [{'client_id': f'attendee-{uuid.uuid4().hex[:10]}', 'display_name': f'Attendee {i}', 'is_host': i == 0} for i in range(size)]
+
+
+def sample_messages(roster_size):
+    producers = [{'clientId': 'host', 'producerId': str(uuid.uuid4()), 'kind': kind, 'appData': {'source': source, 'isHostProducer': True}}
+                 for kind, source in (('audio', 'mic'), ('video', 'camera'), ('video', 'screen'))]
+    return {
+        'routerRtpCapabilities': {'type': 'routerRtpCapabilities', 'data': ROUTER_RTP_CAPABILITIES},
+        'transportCreated': {'type': 'transportCreated', 'data': _transport_params(str(uuid.uuid4()))},
+        'consumed': {'type': 'consumed', 'data': _consumed_payload()},
+        'joinState': {'type': 'joinState', 'data': {
+            'isHost': False, 'clientId': 'attendee-1', 'displayName': 'Attendee 1', 'resumeToken': uuid.uuid4().hex,
+            'routerRtpCapabilities': ROUTER_RTP_CAPABILITIES, 'host': {'hostClientId': 'host', 'hostDisplayName': 'Host'},
+            'producers': producers, 'participants': _roster(roster_size), 'participantsSeq': 12,
+        }},
+        'participantListDelta': {'type': 'participantListDelta', 'data': {'seq': 13, 'changes': [
+            {'op': 'join', 'participant': participant} for participant in _roster(3)
+        ]}},
+        'newProducer': {'type': 'newProducer', 'data': producers[1]},
+        'consume (client)': {'type': 'consume', 'data': {'transportId': str(uuid.uuid4()), 'producerId': producers[1]['producerId'],
+                                                         'rtpCapabilities': ROUTER_RTP_CAPABILITIES}},
+    }
+
+
+def _per_call(fn, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations
+
+
+class Command(BaseCommand):
+    help = ("Compare bytes on the wire and encode/decode CPU of the JSON signaling frames "
+            "with the MessagePack subprotocol, for representative messages.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--roster-size', type=int, default=20, help="participants in the sample joinState")
+
+    def handle(self, *args, **options):
+        if codec._msgpack is None:
+            raise CommandError("The binary subprotocol needs the 'msgpack' package.")
+        iterations = options['iterations']
+        codecs = []
+        for name in _PREFERENCE:
+            try:
+                codecs.append(load_codec(name))
+            except ImportError:
+                self.stdout.write(f"{name}: not installed, skipped")
+        self.stdout.write(f"{'message':22} {'format':8} {'bytes':>7} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+        for label, message in sample_messages(options['roster_size']).items():
+            json_size = len(codecs[0][1](message).encode('utf-8'))
+            rows = [(name, len(dumps(message).encode('utf-8')), dumps, loads) for name, dumps, loads in codecs]
+            rows.append(('msgpack', len(codec.encode_binary(message)), codec.encode_binary, codec.decode_binary))
+            for name, size, encode, decode in rows:
+                frame = encode(message)
+                self.stdout.write(
+                    f"{label:22} {name:8} {size:7d} {size / json_size:6.2f} "
+                    f"{_per_call(encode, message, iterations) * 1e6:10.2f} {_per_call(decode, frame, iterations) * 1e6:10.2f}"
+                )
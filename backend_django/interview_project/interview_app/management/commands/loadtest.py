@@ -0,0 +1,272 @@
+import asyncio
+import os
+import time
+import tracemalloc
+import uuid
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from interview_app import routing
+from interview_app.codec import BINARY_SUBPROTOCOL, decode_binary, dumps, encode_binary, loads
+from interview_app.models import Room
+from interview_app.room_state import _rooms
+from interview_app.sfu_client import close_sfu_clients
+from interview_app.placement import stop_health_checks
+from interview_app.sfu_events import stop_event_streams
+from interview_app.sfu_standin import SfuStandIn
+
+REPLY_TYPES = {
+    'createWebRtcTransport': 'transportCreated',
+    'connectTransport': 'transportConnected',
+    'produce': 'produced',
+    'consume': 'consumed',
+    'resumeConsumer': 'consumerResumed',
+    'consumeAll': 'consumedAll',
+    'resumeConsumers': 'consumersResumed',
+}
+
+# What the host publishes, in order: microphone, camera, screen share.
+PRODUCER_KINDS = (('audio', 'mic'), ('video', 'camera'), ('video', 'screen'))
+
+
+def rss_bytes():
+    # Current resident set size; Linux only (None elsewhere).
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoadClient:
+    """One simulated participant driven through InterviewConsumer by a WebsocketCommunicator."""
+
+    def __init__(self, application, room, client_id, join_state, timeout, stats, binary=False):
+        query = '?joinState=1' if join_state else ''
+        self.communicator = WebsocketCommunicator(application, f'/ws/interview/{room}/{client_id}/{query}',
+                                                  subprotocols=[BINARY_SUBPROTOCOL] if binary else None)
+        self.binary = binary
+        self.join_state = join_state
+        self.timeout = timeout
+        self.stats = stats
+        self.connected = False
+
+    async def receive(self):
+        frame = await self.communicator.receive_from(timeout=self.timeout)
+        if isinstance(frame, bytes):
+            self.stats.bytes_received += len(frame)
+            return decode_binary(frame)
+        self.stats.bytes_received += len(frame.encode('utf-8'))
+        return loads(frame)
+
+    async def wait_for(self, message_type):
+        # Broadcasts (participantListDelta, newProducer, ...) interleave with replies; skip them.
+        while True:
+            message = await self.receive()
+            if message.get('type') == message_type:
+                return message
+            if message.get('type') == 'error':
+                raise RuntimeError(f"{message.get('requestType')}: {message.get('message')}")
+
+    async def request(self, message_type, data=None):
+        started = time.perf_counter()
+        message = {'type': message_type, 'data': data or {}}
+        if self.binary:
+            await self.communicator.send_to(bytes_data=encode_binary(message))
+        else:
+            await self.communicator.send_to(text_data=dumps(message))
+        try:
+            reply = await self.wait_for(REPLY_TYPES[message_type])
+        except Exception:
+            self.stats.errors[message_type] = self.stats.errors.get(message_type, 0) + 1
+            raise
+        self.stats.latencies.setdefault(message_type, []).append(time.perf_counter() - started)
+        return reply['data']
+
+    async def join(self):
+        started = time.perf_counter()
+        connected, _ = await self.communicator.connect(timeout=self.timeout)
+        if not connected:
+            raise RuntimeError("websocket rejected")
+        self.connected = True
+        # The legacy sequence ends with participantList (plus host info/producers for attendees, which follow).
+        message = await self.wait_for('joinState' if self.join_state else 'participantList')
+        self.stats.join_latencies.append(time.perf_counter() - started)
+        return message.get('data') if self.join_state else None
+
+    async def setup_transport(self):
+        transport = await self.request('createWebRtcTransport')
+        await self.request('connectTransport', {'transportId': transport['id'], 'dtlsParameters': transport['dtlsParameters']})
+        return transport['id']
+
+    async def close(self):
+        if self.connected:
+            await self.communicator.disconnect()
+
+
+class Stats:
+    def __init__(self):
+        self.join_latencies = []
+        self.consume_latencies = []  # transport ready -> every producer consumed and resumed
+        self.latencies = {}  # message type -> [seconds]
+        self.errors = {}     # message type -> count
+        self.failed_clients = 0
+        self.bytes_received = 0  # signaling frames, as on the wire (UTF-8 text or binary)
+
+
+class Command(BaseCommand):
+    help = ("Drive N rooms x M clients through InterviewConsumer against an in-process SFU stand-in "
+            "and report join latency, per-message-type throughput and memory per connection.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10)
+        parser.add_argument('--clients', type=int, default=5, help="clients per room, including the host")
+        parser.add_argument('--concurrency', type=int, default=50, help="clients joining at the same time")
+        parser.add_argument('--legacy', action='store_true', help="use the multi-message join sequence instead of joinState")
+        parser.add_argument('--producers', type=int, default=3, choices=(1, 2, 3), help="host producers: mic, camera, screen share")
+        parser.add_argument('--batch', action='store_true', help="attendees use consumeAll/resumeConsumers instead of one consume/resumeConsumer per producer")
+        parser.add_argument('--binary', action='store_true', help="negotiate the MessagePack subprotocol instead of JSON frames")
+        parser.add_argument('--sfu-url', help="use a running SFU (e.g. the Node server) instead of the stand-in")
+        parser.add_argument('--sfu-nodes', type=int, default=1, help="stand-in SFU nodes to spread the rooms over (MEDIASOUP_NODES)")
+        parser.add_argument('--sfu-latency-ms', type=float, default=5.0)
+        parser.add_argument('--sfu-jitter-ms', type=float, default=5.0)
+        parser.add_argument('--sfu-failure-rate', type=float, default=0.0, help="fraction of SFU requests answered with a 500")
+        parser.add_argument('--timeout', type=float, default=10.0, help="seconds to wait for any single reply")
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="measure memory with tracemalloc instead of RSS (exact, but slows everything down several times)")
+        parser.add_argument('--keep-rooms', action='store_true', help="leave the Room rows created by the run in the DB")
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        standins = []
+        if options['sfu_url']:
+            sfu_urls = [options['sfu_url']]
+        else:
+            for _ in range(max(1, options['sfu_nodes'])):
+                standins.append(await SfuStandIn(latency=options['sfu_latency_ms'] / 1000, jitter=options['sfu_jitter_ms'] / 1000,
+                                                 failure_rate=options['sfu_failure_rate']).start())
+            sfu_urls = [standin.url for standin in standins]
+        original_url, settings.MEDIASOUP_NODE_URL = settings.MEDIASOUP_NODE_URL, sfu_urls[0]
+        original_nodes, settings.MEDIASOUP_NODES = settings.MEDIASOUP_NODES, sfu_urls if len(sfu_urls) > 1 else []
+
+        prefix = f'loadtest-{uuid.uuid4().hex[:8]}'
+        room_names = [f'{prefix}-{i}' for i in range(options['rooms'])]
+        application = URLRouter(routing.websocket_urlpatterns)
+        stats = Stats()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        clients = []
+        if options['trace_memory']:
+            tracemalloc.start()
+            baseline = tracemalloc.take_snapshot()
+        else:
+            baseline = rss_bytes()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*[self._run_room(application, name, options, stats, semaphore, clients) for name in room_names])
+            elapsed = time.perf_counter() - started
+            connected = [client for client in clients if client.connected]
+            placed = {} # SFU node -> rooms placed on it
+            for name in room_names:
+                node = _rooms[name].sfu_node if name in _rooms else None
+                placed[node or sfu_urls[0]] = placed.get(node or sfu_urls[0], 0) + 1
+            if options['trace_memory']:
+                memory = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, 'filename'))
+            else:
+                memory = rss_bytes() - baseline if baseline is not None else None
+        finally:
+            if options['trace_memory']:
+                tracemalloc.stop()
+            await asyncio.gather(*[client.close() for client in clients], return_exceptions=True)
+            for name in room_names:
+                state = _rooms.get(name)
+                if state is not None:
+                    await state.flush()
+            await stop_event_streams()
+            await stop_health_checks()
+            await close_sfu_clients()
+            settings.MEDIASOUP_NODE_URL, settings.MEDIASOUP_NODES = original_url, original_nodes
+            for standin in standins:
+                await standin.stop()
+            if not options['keep_rooms']:
+                await asyncio.to_thread(lambda: Room.objects.filter(name__startswith=prefix).delete())
+
+        self._report(options, stats, elapsed, len(connected), memory, standins, placed)
+
+    async def _run_room(self, application, room, options, stats, semaphore, clients):
+        # The host joins and publishes first, so attendees find producers to consume on join.
+        host = LoadClient(application, room, 'host', not options['legacy'], options['timeout'], stats, options['binary'])
+        clients.append(host)
+        try:
+            async with semaphore:
+                await host.join()
+                transport_id = await host.setup_transport()
+                for kind, source in PRODUCER_KINDS[:options['producers']]:
+                    await host.request('produce', {'transportId': transport_id, 'kind': kind, 'rtpParameters': {}, 'appData': {'source': source}})
+        except Exception as e:
+            stats.failed_clients += 1
+            self.stderr.write(f"{room}/host: {e}")
+            return
+        attendees = [LoadClient(application, room, f'attendee-{uuid.uuid4().hex[:10]}', not options['legacy'], options['timeout'], stats, options['binary'])
+                     for _ in range(options['clients'] - 1)]
+        clients.extend(attendees)
+        await asyncio.gather(*[self._run_attendee(attendee, semaphore, stats, options['batch'], len(PRODUCER_KINDS[:options['producers']])) for attendee in attendees])
+
+    async def _run_attendee(self, attendee, semaphore, stats, batch, producer_count):
+        try:
+            async with semaphore:
+                state = await attendee.join()
+                producers = state['producers'] if state else [
+                    (await attendee.wait_for('newProducer'))['data'] for _ in range(producer_count)
+                ]
+                transport_id = await attendee.setup_transport()
+                started = time.perf_counter()
+                if batch:
+                    consumed = await attendee.request('consumeAll', {'transportId': transport_id, 'producerIds': [p['producerId'] for p in producers], 'rtpCapabilities': {}})
+                    await attendee.request('resumeConsumers', {'consumerIds': [c['id'] for c in consumed['consumers']]})
+                else:
+                    for producer in producers:
+                        consumer = await attendee.request('consume', {'transportId': transport_id, 'producerId': producer['producerId'], 'rtpCapabilities': {}})
+                        await attendee.request('resumeConsumer', {'consumerId': consumer['id']})
+                stats.consume_latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            stats.failed_clients += 1
+            self.stderr.write(f"{attendee.communicator.scope['path']}: {e!r}")
+
+    def _report(self, options, stats, elapsed, connected, memory, standins, placed):
+        ms = lambda seconds: f"{seconds * 1000:8.2f}"
+        total = options['rooms'] * options['clients']
+        self.stdout.write(f"{options['rooms']} rooms x {options['clients']} clients ({'legacy' if options['legacy'] else 'joinState'} join) "
+                          f"in {elapsed:.2f}s; {connected}/{total} connected, {stats.failed_clients} failed")
+        joins = stats.join_latencies
+        self.stdout.write(f"join latency ms   p50 {ms(percentile(joins, 50))}  p95 {ms(percentile(joins, 95))}  "
+                          f"p99 {ms(percentile(joins, 99))}  max {ms(max(joins, default=0))}")
+        consumes = stats.consume_latencies
+        self.stdout.write(f"consume all ms    p50 {ms(percentile(consumes, 50))}  p95 {ms(percentile(consumes, 95))}  "
+                          f"p99 {ms(percentile(consumes, 99))}  max {ms(max(consumes, default=0))}")
+        self.stdout.write(f"{'message type':24} {'count':>7} {'errors':>7} {'msg/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for message_type in sorted(set(stats.latencies) | set(stats.errors)):
+            latencies = stats.latencies.get(message_type, [])
+            self.stdout.write(
+                f"{message_type:24} {len(latencies):7d} {stats.errors.get(message_type, 0):7d} {len(latencies) / elapsed:9.1f} "
+                f"{ms(percentile(latencies, 50))} {ms(percentile(latencies, 95))} {ms(percentile(latencies, 99))}"
+            )
+        self.stdout.write(f"signaling received: {stats.bytes_received / 1024:.1f} KiB ({'MessagePack' if options['binary'] else 'JSON'}), "
+                          f"{stats.bytes_received / max(connected, 1) / 1024:.2f} KiB per connection")
+        if connected and memory is not None:
+            source = 'tracemalloc' if options['trace_memory'] else 'RSS'
+            self.stdout.write(f"memory ({source}): {memory / 1024:.0f} KiB while connected, {memory / connected / 1024:.1f} KiB per connection")
+        for standin in standins:
+            self.stdout.write(f"SFU stand-in {standin.url}: {placed.get(standin.url, 0)} rooms, {standin.requests} requests, "
+                              f"{standin.failures_injected} injected failures")
@@ -0,0 +1,51 @@
+import asyncio
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from interview_app.prewarm import expire_warmed_rooms, warm_rooms
+
+
+class Command(BaseCommand):
+    help = "Pre-provision rooms for scheduled interviews and/or expire warmed rooms that went unused."
+
+    def add_arguments(self, parser):
+        parser.add_argument('rooms', nargs='*', help="room names, optionally as name@<ISO 8601 start time>")
+        parser.add_argument('--file', help="CSV of 'name,scheduled_start' rows ('-' for stdin)")
+        parser.add_argument('--concurrency', type=int, help="rooms warmed in parallel (default PREWARM_CONCURRENCY)")
+        parser.add_argument('--ttl', type=int, help="seconds past the scheduled start to keep an unused room (default PREWARM_TTL_SECONDS)")
+        parser.add_argument('--expire', action='store_true', help="also expire unused warmed rooms past their expiry")
+
+    def handle(self, *args, **options):
+        rooms = [self._parse(*entry.split('@', 1)) for entry in options['rooms']]
+        if options['file']:
+            handle = sys.stdin if options['file'] == '-' else open(options['file'], newline='')
+            with handle:
+                rooms += [self._parse(*row[:2]) for row in csv.reader(handle) if row and row[0].strip()]
+        if not rooms and not options['expire']:
+            raise CommandError("Give room names, --file, or --expire")
+
+        async def run():
+            results = await warm_rooms(rooms, options['concurrency'], options['ttl']) if rooms else []
+            expired = await expire_warmed_rooms() if options['expire'] else None
+            return results, expired
+
+        results, expired = asyncio.run(run())
+        for result in results:
+            if result['warmed']:
+                self.stdout.write(f"{result['room']}: warmed, expires {result['expiresAt']}")
+            else:
+                self.stderr.write(f"{result['room']}: failed: {result['error']}")
+        if expired is not None:
+            self.stdout.write(f"Expired {expired} unused warmed room(s)")
+        if any(not result['warmed'] for result in results):
+            raise CommandError("Some rooms could not be warmed")
+
+    def _parse(self, name, start=None):
+        name, start = name.strip(), (start or '').strip()
+        scheduled_start = parse_datetime(start) if start else None
+        if not name or (start and scheduled_start is None):
+            raise CommandError(f"Invalid room entry: {name!r} {start!r}")
+        return name, scheduled_start
@@ -0,0 +1,26 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from interview_app.channel_layer import ChannelHub, acquire_hub_lock
+
+
+class Command(BaseCommand):
+    help = "Run the LocalHubChannelLayer hub in the foreground (instead of autostarting it inside a worker)."
+
+    def add_arguments(self, parser):
+        config = settings.CHANNEL_LAYERS['default'].get('CONFIG', {})
+        parser.add_argument('--path', default=config.get('path', '/tmp/interview_channel_hub.sock'))
+        parser.add_argument('--group-expiry', type=int, default=config.get('group_expiry', 86400))
+
+    def handle(self, *args, **options):
+        lock_file = acquire_hub_lock(options['path'])
+        if lock_file is None:
+            raise CommandError(f"Another hub already serves {options['path']}")
+        hub = ChannelHub(options['path'], group_expiry=options['group_expiry'])
+        self.stdout.write(f"Channel hub listening on {options['path']}")
+        try:
+            asyncio.run(hub.serve_forever())
+        except KeyboardInterrupt:
+            pass
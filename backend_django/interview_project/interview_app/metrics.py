@@ -0,0 +1,188 @@
+# interview_app/metrics.py
+# In-process metrics in the Prometheus text format, scraped from
+# /api/interview/metrics/ (views.metrics).
+#
+# Recording is kept cheap enough for the signaling hot path: a histogram
+# observation is one bisect over a short bucket tuple plus a few integer
+# additions on a per-label-set list; nothing is formatted or sorted until a
+# scrape. Metrics are written from the event loop only, so increments cannot
+# interleave; the one exception is DB_OPS_SECONDS, observed from the DB
+# executor's threads (db.py) under a lock. Gauges that describe current state
+# (rooms, group sizes) are computed from callbacks at scrape time and cost
+# nothing in between.
+import bisect
+import functools
+import threading
+import time
+
+# Seconds; covers a sub-millisecond in-memory handler up to a request timing out.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _label_text(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        _registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, label_names=()):
+        super().__init__(name, help, label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _samples(self):
+        for label_values, value in sorted(self._values.items()):
+            yield f'{self.name}{_label_text(self.label_names, label_values)} {_number(value)}'
+
+
+class Gauge(_Metric):
+    """A gauge set with inc()/dec(), or computed at scrape time by ``collect``.
+
+    ``collect`` returns a number (unlabelled) or an iterable of (label_values, value).
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help, label_names=(), collect=None):
+        super().__init__(name, help, label_names)
+        self._values = {}
+        self.collect = collect
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) - amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def _samples(self):
+        if self.collect is not None:
+            collected = self.collect()
+            items = [((), collected)] if isinstance(collected, (int, float)) else collected
+        else:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f'{self.name}{_label_text(self.label_names, label_values)} {_number(value)}'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label_values -> [count per bucket..., count in +Inf, sum]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _samples(self):
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                yield f'{self.name}_bucket{_label_text(self.label_names, label_values, [("le", le)])} {cumulative}'
+            labels = _label_text(self.label_names, label_values)
+            yield f'{self.name}_sum{labels} {_number(series[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# --- Label normalization ---
+# Batch actions that sit where an id would ('/consumers/resume-batch'), kept as they are.
+_LITERAL_SEGMENTS = frozenset({'resume-batch', 'consume-batch'})
+# Every endpoint the signaling code calls; anything else is labelled 'other'.
+_SFU_ENDPOINTS = frozenset({
+    '/rooms',
+    '/rooms/:id',
+    '/rooms/:id/close',
+    '/rooms/:id/router-rtp-capabilities',
+    '/rooms/:id/clients/:id/disconnected',
+    '/rooms/:id/clients/:id/producers',
+    '/rooms/:id/clients/:id/transports',
+    '/rooms/:id/clients/:id/transports/:id/connect',
+    '/rooms/:id/clients/:id/transports/:id/produce',
+    '/rooms/:id/clients/:id/transports/:id/consume',
+    '/rooms/:id/clients/:id/transports/:id/consume-batch',
+    '/rooms/:id/clients/:id/consumers/:id/resume',
+    '/rooms/:id/clients/:id/consumers/resume-batch',
+})
+
+
+def sfu_endpoint_label(endpoint):
+    """'/rooms/abc/clients/x/transports/t1/connect' -> '/rooms/:id/clients/:id/transports/:id/connect'.
+
+    SFU paths alternate collection and id ('/rooms/<id>/clients/<id>/...'), so
+    every second segment is an id unless it is a batch action; a split is
+    several times cheaper than a regex. Paths matching no known endpoint (an
+    unquoted id with a '/' in it, say) all share the label 'other'.
+    """
+    parts = endpoint.split('/')
+    parts[2::2] = [part if part in _LITERAL_SEGMENTS else ':id' for part in parts[2::2]]
+    label = '/'.join(parts)
+    return label if label in _SFU_ENDPOINTS else 'other'
+
+
+# --- Metrics recorded by the signaling code ---
+RECEIVE_SECONDS = Histogram('interview_receive_seconds', 'Time InterviewConsumer.receive spends per message type.', ['type'])
+SFU_REQUEST_SECONDS = Histogram('interview_sfu_request_seconds', 'Duration of mediasoup REST calls per endpoint.', ['method', 'endpoint'])
+DB_OPS_SECONDS = Histogram('interview_db_ops_seconds', 'Time each *_db_ops helper blocks its thread.', ['op'])
+ERRORS = Counter('interview_errors_total', 'Errors by where they happened and their type.', ['where', 'type'])
+SOCKETS = Gauge('interview_sockets', 'Open signaling WebSockets in this process.')
+
+
+_db_ops_lock = threading.Lock()
+
+
+def timed_db_op(fn):
+    """Decorator recording a *_db_ops helper's duration in DB_OPS_SECONDS."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _db_ops_lock:
+                DB_OPS_SECONDS.observe(time.perf_counter() - started, fn.__name__)
+    return wrapper
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interview_app', '0002_auto_20250529_2050'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='scheduled_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='warm_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='warmed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _hash(capabilities):
+    # Same as interview_app.capabilities.capabilities_hash, frozen here for the migration.
+    return hashlib.sha256(json.dumps(capabilities, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:32]
+
+
+def move_to_shared_capabilities(apps, schema_editor):
+    Room = apps.get_model('interview_app', 'Room')
+    RtpCapabilities = apps.get_model('interview_app', 'RtpCapabilities')
+    for room in Room.objects.exclude(router_rtp_capabilities=None).only('pk', 'router_rtp_capabilities'):
+        caps_hash = _hash(room.router_rtp_capabilities)
+        RtpCapabilities.objects.get_or_create(hash=caps_hash, defaults={'capabilities': room.router_rtp_capabilities})
+        Room.objects.filter(pk=room.pk).update(rtp_capabilities_id=caps_hash)
+
+
+def copy_back_to_rooms(apps, schema_editor):
+    Room = apps.get_model('interview_app', 'Room')
+    for room in Room.objects.exclude(rtp_capabilities=None).select_related('rtp_capabilities'):
+        Room.objects.filter(pk=room.pk).update(router_rtp_capabilities=room.rtp_capabilities.capabilities)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interview_app', '0003_room_prewarm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RtpCapabilities',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('capabilities', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rtp_capabilities',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rooms', to='interview_app.rtpcapabilities'),
+        ),
+        migrations.RunPython(move_to_shared_capabilities, copy_back_to_rooms),
+        migrations.RemoveField(
+            model_name='room',
+            name='router_rtp_capabilities',
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interview_app', '0004_rtp_capabilities'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='sfu_node',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interview_app', '0005_room_sfu_node'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['room', 'is_host'], name='interview_a_room_id_b77787_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['last_seen'], name='interview_a_last_se_4c755e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['created_at'], name='interview_a_created_8cc3e6_idx'),
+        ),
+    ]
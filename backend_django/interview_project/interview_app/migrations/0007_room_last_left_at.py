@@ -0,0 +1,25 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interview_app', '0006_reaper_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='room',
+            name='interview_a_created_8cc3e6_idx',
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_left_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['last_left_at'], name='interview_a_last_le_c69bbf_idx'),
+        ),
+    ]
@@ -1,8 +1,19 @@
 # interview_app/models.py
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.conf import settings # If you store user model
 
+class RtpCapabilities(models.Model):
+    # Router RTP capabilities, content-addressed: every room whose router was created from the
+    # same mediaCodecs points at one row (interview_app/capabilities.py)
+    hash = models.CharField(max_length=64, primary_key=True)
+    capabilities = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.hash
+
 class Room(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100, unique=True)
@@ -11,7 +22,18 @@ class Room(models.Model):
     host_client_id = models.CharField(max_length=255, null=True, blank=True)
     # host = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="hosted_rooms") # Alternative if using Django users
     created_at = models.DateTimeField(auto_now_add=True)
-    router_rtp_capabilities = models.JSONField(null=True, blank=True)
+    rtp_capabilities = models.ForeignKey(RtpCapabilities, related_name='rooms', on_delete=models.SET_NULL, null=True, blank=True)
+    # Base URL of the mediasoup node hosting the room's router (interview_app/placement.py)
+    sfu_node = models.CharField(max_length=255, null=True, blank=True)
+    # Set when the room was pre-provisioned ahead of a scheduled interview (interview_app/prewarm.py)
+    scheduled_start = models.DateTimeField(null=True, blank=True)
+    warmed_at = models.DateTimeField(null=True, blank=True)
+    warm_expires_at = models.DateTimeField(null=True, blank=True)
+    # Creation time, then the time a participant last left: an empty room has been empty since then
+    last_left_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['last_left_at'])] # Empty-room sweep (interview_app/reaper.py)
 
     def __str__(self):
         return self.name
@@ -22,6 +44,14 @@ class Participant(models.Model):
     display_name = models.CharField(max_length=100)
     is_host = models.BooleanField(default=False)
     joined_at = models.DateTimeField(auto_now_add=True)
+    # Refreshed by the reaper of the process serving the participant; rows it stops refreshing are orphans
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'is_host']),
+            models.Index(fields=['last_seen']),
+        ]
 
     def __str__(self):
         return f"{self.display_name} ({'Host' if self.is_host else 'Attendee'}) in {self.room.name}"
\ No newline at end of file
@@ -0,0 +1,175 @@
+# interview_app/placement.py
+# Room -> SFU node placement across MEDIASOUP_NODES. Nodes sit on a consistent
+# hash ring, so a room keeps mapping to the same node while the node set is
+# stable. Placing a room walks the ring from the room's hash, skipping nodes
+# that are unhealthy or over MEDIASOUP_PLACEMENT's room/consumer limits, and
+# takes the least loaded of the first few it meets.
+#
+# The assignment is part of the room's state (RoomState.sfu_node, persisted on
+# Room.sfu_node): a room stays on its node while that node is healthy, and is
+# only moved when the node stops answering. Health and load come from polling
+# each node's GET /stats; rooms placed since the last poll count towards the
+# node's load so a burst of new rooms does not all land on one node.
+import asyncio
+import bisect
+import hashlib
+import logging
+
+import httpx
+from django.conf import settings
+
+from . import lifespan
+from .metrics import Gauge
+from .sfu_client import get_sfu_client
+from .sfu_resilience import OPEN, get_breaker
+
+logger = logging.getLogger(__name__)
+
+
+def _ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class SfuNode:
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True  # Until a poll says otherwise
+        self.failures = 0
+        self.stats = {}
+        self.placed = 0      # Rooms placed here since the last poll
+
+    def load(self, config):
+        rooms = self.stats.get('rooms', 0) + self.placed
+        return max(rooms / config['max_rooms'], self.stats.get('consumers', 0) / config['max_consumers'])
+
+
+class Placement:
+    def __init__(self, urls):
+        self.urls = tuple(urls)
+        self.nodes = {url: SfuNode(url) for url in self.urls}
+        points = settings.MEDIASOUP_PLACEMENT['virtual_nodes']
+        self._ring = sorted((_ring_hash(f'{url}#{i}'), url) for url in self.urls for i in range(points))
+        self._ring_keys = [point for point, _ in self._ring]
+        self._task = None
+
+    def ring_order(self, room_name):
+        """Every node, in the order the ring visits them starting at ``room_name``'s hash."""
+        start = bisect.bisect(self._ring_keys, _ring_hash(room_name))
+        seen = []
+        for i in range(len(self._ring)):
+            url = self._ring[(start + i) % len(self._ring)][1]
+            if url not in seen:
+                seen.append(url)
+                if len(seen) == len(self.nodes):
+                    break
+        return seen
+
+    def live_nodes(self):
+        return frozenset(url for url, node in self.nodes.items() if node.healthy)
+
+    def accepting(self, node):
+        # Healthy by the last poll, and calls to it are not failing fast in the meantime.
+        return node.healthy and get_breaker(node.url).state != OPEN
+
+    def choose(self, room_name):
+        config = settings.MEDIASOUP_PLACEMENT
+        ordered = [self.nodes[url] for url in self.ring_order(room_name)]
+        usable = [node for node in ordered if self.accepting(node) and node.load(config) < 1.0]
+        if not usable:
+            usable = [node for node in ordered if self.accepting(node)] or ordered
+            logger.warning("Placement: no node under its limits for room %s, using %s", room_name, usable[0].url)
+        return min(usable[:config['choices']], key=lambda node: node.load(config)).url
+
+    async def node_for(self, room_state):
+        """The SFU node for ``room_state``'s room, placing (or re-placing) the room if needed."""
+        if len(self.urls) == 1:
+            return self.urls[0]
+        self.ensure_started()
+        current = room_state.sfu_node
+        if current is not None and current in self.nodes and self.nodes[current].healthy:
+            return current
+        candidate = self.choose(room_state.room_name)
+        self.nodes[candidate].placed += 1 # Counted before the await so concurrent placements see it
+        node_url = await room_state.assign_sfu_node(candidate, self.live_nodes())
+        if node_url != candidate:
+            self.nodes[candidate].placed -= 1 # The room already had a live node (loaded from the DB)
+        elif node_url != current:
+            logger.info("Placement: room %s on %s%s", room_state.room_name, node_url, f" (moved from {current})" if current else "")
+        return node_url
+
+    # --- Health / load polling ---
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*[self.check(node) for node in self.nodes.values()])
+            await asyncio.sleep(settings.MEDIASOUP_PLACEMENT['health_interval'])
+
+    async def check(self, node):
+        config = settings.MEDIASOUP_PLACEMENT
+        try:
+            response = await get_sfu_client(node.url).request('GET', '/stats', timeout=config['health_timeout'])
+            response.raise_for_status()
+            node.stats = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            node.failures += 1
+            if node.healthy and node.failures >= config['unhealthy_after']:
+                node.healthy = False
+                logger.warning("Placement: node %s marked unhealthy after %d failed checks: %r", node.url, node.failures, e)
+            return
+        node.placed = 0
+        node.failures = 0
+        if not node.healthy:
+            node.healthy = True
+            logger.info("Placement: node %s is healthy again", node.url)
+
+
+_placement = None
+
+
+def get_placement():
+    """The Placement for the configured nodes (MEDIASOUP_NODES, else MEDIASOUP_NODE_URL)."""
+    global _placement
+    urls = tuple(settings.MEDIASOUP_NODES or [settings.MEDIASOUP_NODE_URL])
+    if _placement is None or _placement.urls != urls:
+        if _placement is not None and _placement._task is not None:
+            _placement._task.cancel()
+        _placement = Placement(urls)
+    return _placement
+
+
+async def start_health_checks():
+    placement = get_placement()
+    if len(placement.urls) > 1:
+        placement.ensure_started()
+
+
+async def stop_health_checks():
+    if _placement is not None:
+        await _placement.stop()
+
+
+def _node_samples(value):
+    placement = _placement
+    return [((url,), value(node)) for url, node in placement.nodes.items()] if placement is not None else []
+
+
+Gauge('interview_sfu_node_healthy', 'Whether placement considers the SFU node healthy.', ['node'],
+      collect=lambda: _node_samples(lambda node: int(node.healthy)))
+Gauge('interview_sfu_node_rooms', 'Rooms on the SFU node at the last poll, plus rooms placed since.', ['node'],
+      collect=lambda: _node_samples(lambda node: node.stats.get('rooms', 0) + node.placed))
+
+lifespan.on_startup(start_health_checks)
+lifespan.on_shutdown(stop_health_checks)
@@ -0,0 +1,107 @@
+# interview_app/prewarm.py
+# Pre-provisioning of rooms for scheduled interviews. Warming a room creates its
+# Room row, makes the SFU create the router (via the capabilities request) and
+# stores the router's RTP capabilities, so the first participant's connect()
+# finds everything in place instead of paying for it lazily.
+#
+# Warmed rooms that nobody uses are expired after PREWARM_TTL_SECONDS past
+# their scheduled start: the SFU router is closed and the Room row deleted.
+import asyncio
+import datetime
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from .consumers import mediasoup_get, mediasoup_request
+from .db import run_db
+from .log import fields
+from .metrics import timed_db_op
+from .models import Room
+from .placement import get_placement
+from .room_state import _rooms, get_room_state
+
+logger = logging.getLogger(__name__)
+
+
+@timed_db_op
+def warm_room_db_ops(room_name, scheduled_start, expires_at):
+    room, _ = Room.objects.get_or_create(name=room_name)
+    room.scheduled_start = scheduled_start
+    room.warm_expires_at = expires_at
+    room.save(update_fields=['scheduled_start', 'warm_expires_at'])
+
+
+@timed_db_op
+def mark_warmed_db_ops(room_name):
+    Room.objects.filter(name=room_name).update(warmed_at=timezone.now())
+
+
+@timed_db_op
+def expired_rooms_db_ops(now):
+    return list(
+        Room.objects.filter(warm_expires_at__lte=now, participants__isnull=True).values_list('name', 'sfu_node')
+    )
+
+
+@timed_db_op
+def delete_rooms_db_ops(room_names):
+    # Re-check emptiness: a participant may have joined since the candidates were listed.
+    return Room.objects.filter(name__in=room_names, participants__isnull=True).delete()[0]
+
+
+async def warm_room(room_name, scheduled_start=None, ttl=None):
+    """Provision one room; returns a result dict and never raises for SFU/DB errors."""
+    ttl = settings.PREWARM_TTL_SECONDS if ttl is None else ttl
+    if scheduled_start is not None and timezone.is_naive(scheduled_start):
+        scheduled_start = timezone.make_aware(scheduled_start)
+    expires_at = (scheduled_start or timezone.now()) + datetime.timedelta(seconds=ttl)
+    try:
+        await run_db(warm_room_db_ops, room_name, scheduled_start, expires_at)
+        # Placing the room now means its router is created on the node its participants will use.
+        state = get_room_state(room_name)
+        node = await get_placement().node_for(state)
+        # Always ask the SFU, even with capabilities in the DB: this is what creates the router.
+        rtp_caps = await mediasoup_get(f'/rooms/{room_name}/router-rtp-capabilities', node=node)
+        if not rtp_caps:
+            raise Exception("SFU returned no router capabilities")
+        if not state.router_rtp_capabilities:
+            await state.set_rtp_capabilities(rtp_caps)
+        await run_db(mark_warmed_db_ops, room_name)
+    except Exception as e:
+        logger.warning("Prewarm: room %s failed: %s", room_name, e, extra=fields(event='prewarm.room', room=room_name))
+        return {'room': room_name, 'warmed': False, 'error': str(e)}
+    logger.info("Prewarm: room %s ready until %s", room_name, expires_at, extra=fields(event='prewarm.room', room=room_name))
+    return {'room': room_name, 'warmed': True, 'expiresAt': expires_at.isoformat(), 'sfuNode': node}
+
+
+async def warm_rooms(rooms, concurrency=None, ttl=None):
+    """Warm ``rooms`` (iterable of (name, scheduled_start or None)) with at most ``concurrency`` in flight."""
+    semaphore = asyncio.Semaphore(concurrency or settings.PREWARM_CONCURRENCY)
+
+    async def bounded(room_name, scheduled_start):
+        async with semaphore:
+            return await warm_room(room_name, scheduled_start, ttl)
+
+    return await asyncio.gather(*[bounded(name, start) for name, start in rooms])
+
+
+async def expire_warmed_rooms(now=None):
+    """Close the SFU router and delete the row of every warmed room past its expiry with no participants."""
+    candidates = await run_db(expired_rooms_db_ops, now or timezone.now())
+    # Warming leaves a state actor behind, so only an actor with participants (some maybe not persisted yet) means in use.
+    closed = []
+    for room_name, sfu_node in candidates:
+        state = _rooms.get(room_name)
+        if state is not None and state.participants:
+            continue
+        try:
+            await mediasoup_request('DELETE', f'/rooms/{room_name}', node=sfu_node)
+        except Exception as e: # e.g. 409: clients are connected on the SFU after all
+            logger.warning("Prewarm: closing router of expired room %s failed: %s", room_name, e)
+            continue
+        closed.append(room_name)
+    deleted = await run_db(delete_rooms_db_ops, closed) if closed else 0
+    if deleted:
+        logger.info("Prewarm: expired %d unused warmed room(s)", deleted, extra=fields(event='prewarm.expire'))
+    return deleted
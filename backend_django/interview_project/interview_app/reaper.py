@@ -0,0 +1,185 @@
+# interview_app/reaper.py
+# Periodic reconciliation of the database and the SFU nodes with the sessions
+# that are actually live (REAPER settings). disconnect() does the cleanup when a
+# socket closes normally; this catches what it misses when a worker crashes.
+#
+# Every process refreshes Participant.last_seen for the participants its room
+# actors hold, attached or detached. Each sweep then, in bulk:
+#  - deletes Participant rows nobody has refreshed for stale_after seconds;
+#  - clears Room.host_client_id where the host's row is gone (the room's next
+#    joiner is elected host, as when a host leaves). Rooms with a local actor
+#    are left to it: it drops a host it has no participant or detached session
+#    for, such as one loaded from the DB after a restart;
+#  - deletes Room rows that have been empty for room_idle seconds (since
+#    Room.last_left_at) and are not warmed for an upcoming interview;
+#  - lists each SFU node's rooms and clients (GET /rooms) and closes rooms and
+#    clients that no participant or warmed room accounts for. They are only
+#    closed once two consecutive sweeps have seen them orphaned, so sessions
+#    still being set up are left alone.
+import asyncio
+import datetime
+import logging
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import lifespan
+from .consumers import mediasoup_request
+from .db import run_db
+from .metrics import Counter, timed_db_op
+from .models import Participant, Room
+from .placement import get_placement
+from .room_state import _rooms
+
+logger = logging.getLogger(__name__)
+
+BATCH = 500  # Rows per IN (...) list
+
+
+def _batches(items):
+    items = list(items)
+    for i in range(0, len(items), BATCH):
+        yield items[i:i + BATCH]
+
+
+@timed_db_op
+def touch_participants_db_ops(client_ids, now):
+    for batch in _batches(client_ids):
+        Participant.objects.filter(client_id__in=batch).update(last_seen=now)
+
+
+@timed_db_op
+def reap_db_ops(now, local_rooms):
+    config = settings.REAPER
+    stale = Participant.objects.filter(last_seen__lt=now - datetime.timedelta(seconds=config['stale_after']))
+    left_rooms = set(stale.values_list('room_id', flat=True))
+    participants = stale.delete()[0]
+    for batch in _batches(left_rooms):
+        Room.objects.filter(id__in=batch).update(last_left_at=now) # Their idle time starts now
+
+    stale_hosts = set(
+        Room.objects.filter(host_client_id__isnull=False)
+        .exclude(host_client_id__in=Participant.objects.values('client_id'))
+        .values_list('name', flat=True)
+    ) - local_rooms  # A local actor may not have written its host's row yet
+    hosts = sum(Room.objects.filter(name__in=batch).update(host_client_id=None) for batch in _batches(stale_hosts))
+
+    idle = set(
+        Room.objects.filter(participants__isnull=True, last_left_at__lt=now - datetime.timedelta(seconds=config['room_idle']))
+        .filter(Q(warm_expires_at__isnull=True) | Q(warm_expires_at__lte=now))
+        .values_list('name', flat=True)
+    ) - local_rooms
+    rooms = sum(Room.objects.filter(name__in=batch, participants__isnull=True).delete()[0] for batch in _batches(idle))
+    return {'participants': participants, 'hosts': hosts, 'rooms': rooms}
+
+
+@timed_db_op
+def sfu_expected_db_ops(room_names, now):
+    """room_name -> (sfu_node, client ids in the DB, warmed) for the rooms an SFU node reported."""
+    expected = {}
+    for batch in _batches(room_names):
+        for name, sfu_node, warm_expires_at in Room.objects.filter(name__in=batch).values_list('name', 'sfu_node', 'warm_expires_at'):
+            expected[name] = (sfu_node, set(), warm_expires_at is not None and warm_expires_at > now)
+        for name, client_id in Participant.objects.filter(room__name__in=batch).values_list('room__name', 'client_id'):
+            expected[name][1].add(client_id)
+    return expected
+
+
+class Reaper:
+    def __init__(self):
+        self._task = None
+        self._suspects = {}  # node -> {(room, client or None)} seen orphaned by the previous sweep
+
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.REAPER['interval'])
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Reaper: sweep failed")
+
+    async def sweep(self):
+        now = timezone.now()
+        loop = asyncio.get_running_loop()
+        local = {name: state for name, state in list(_rooms.items()) if not state.stopped and state.loop is loop}
+        await run_db(touch_participants_db_ops, [c for state in local.values() for c in state.participants], now)
+        removed = await run_db(reap_db_ops, now, set(local))
+        for state in local.values():
+            removed['hosts'] += await state.drop_absent_host()
+        removed.update(sfu_rooms=0, sfu_clients=0)
+        for url in get_placement().urls:
+            try:
+                for kind, count in (await self.reconcile_node(url, now, local)).items():
+                    removed[kind] += count
+            except Exception as e:
+                logger.warning("Reaper: could not reconcile SFU node %s: %r", url, e)
+        for kind, count in removed.items():
+            if count:
+                REAPED.inc(kind, amount=count)
+        if any(removed.values()):
+            logger.info("Reaper: removed %s", ', '.join(f'{count} {kind}' for kind, count in removed.items() if count))
+        return removed
+
+    async def reconcile_node(self, url, now, local):
+        listing = await mediasoup_request('GET', '/rooms', node=url)
+        expected = await run_db(sfu_expected_db_ops, list(listing), now)
+        orphans = set()
+        for room_name, client_ids in listing.items():
+            sfu_node, keep, warm = expected.get(room_name, (None, set(), False))
+            state = local.get(room_name)
+            if state is not None:
+                sfu_node, keep = state.sfu_node or sfu_node, keep | set(state.participants)
+            if sfu_node is not None and sfu_node != url:
+                keep = set() # The room has moved to another node
+            if not keep and not warm:
+                orphans.add((room_name, None))
+            else:
+                orphans.update((room_name, client_id) for client_id in client_ids if client_id not in keep)
+
+        confirmed = orphans & self._suspects.get(url, set())
+        self._suspects[url] = orphans - confirmed
+        closing = [(room_name, client_id) for room_name, client_id in confirmed if client_id is None or (room_name, None) not in confirmed]
+        results = await asyncio.gather(*[
+            mediasoup_request('POST', f'/rooms/{room_name}/close' if client_id is None else f'/rooms/{room_name}/clients/{client_id}/disconnected', node=url)
+            for room_name, client_id in closing
+        ], return_exceptions=True)
+        done = [orphan for orphan, result in zip(closing, results) if not isinstance(result, Exception)]
+        if len(done) < len(closing):
+            logger.warning("Reaper: %d of %d SFU cleanups on %s failed", len(closing) - len(done), len(closing), url)
+        return {
+            'sfu_rooms': sum(client_id is None for _, client_id in done),
+            'sfu_clients': sum(client_id is not None for _, client_id in done),
+        }
+
+
+_reaper = Reaper()
+
+
+async def start_reaper():
+    if settings.REAPER['enabled']:
+        _reaper.ensure_started()
+
+
+async def stop_reaper():
+    await _reaper.stop()
+
+
+REAPED = Counter('interview_reaped_total', 'Orphaned rows and SFU sessions removed by the reaper.', ['kind'])
+
+lifespan.on_startup(start_reaper)
+lifespan.on_shutdown(stop_reaper)
@@ -0,0 +1,379 @@
+# interview_app/room_state.py
+# Authoritative in-process state for each room (host, roster, display names,
+# producers, router capabilities). Every mutation for a room goes through that
+# room's mailbox and is applied by a single asyncio task, so host election and
+# roster changes are serialized without touching the database. The Room and
+# Participant tables are updated write-behind by a second per-room task.
+#
+# The state is per process: all sockets of a room must be served by the same
+# worker process for it to be authoritative.
+#
+# Sessions are resumable: a participant whose socket drops can be detached
+# instead of removed, keeping its roster entry, host role and producers for a
+# grace period. A new socket presenting the participant's resume token
+# reattaches to it; if none does in time, the detach callback tears it down.
+import asyncio
+import contextvars
+import hmac
+import logging
+import secrets
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import tracing
+from .capabilities import capabilities_hash, ensure_stored
+from .db import run_db
+from .metrics import Gauge, timed_db_op
+from .models import Room, Participant
+from .roster import RosterBroadcaster
+
+logger = logging.getLogger(__name__)
+
+_rooms = {}  # room_name -> RoomState
+
+Gauge('interview_rooms_active', 'Rooms with a live state actor in this process.', collect=lambda: len(_rooms))
+Gauge('interview_room_participants', 'Participants (group members) per active room.', ['room'],
+      collect=lambda: [((name,), len(state.participants)) for name, state in list(_rooms.items())])
+
+
+def room_group_name(room_name):
+    return f'interview_{room_name}'
+
+
+# --- Persistence (run off the event loop, in order, by the room's persist task) ---
+@timed_db_op
+def load_room_state_db_ops(room_name):
+    room, _ = Room.objects.select_related('rtp_capabilities').get_or_create(name=room_name)
+    known_names = dict(Participant.objects.filter(room=room).values_list('client_id', 'display_name'))
+    caps = room.rtp_capabilities
+    return room.host_client_id, caps.capabilities if caps else None, caps.hash if caps else None, room.sfu_node, known_names
+
+
+@timed_db_op
+def persist_participant_join_db_ops(room_name, client_id, display_name, is_host):
+    # One transaction of at most four statements: room id, host column (hosts only), participant update, insert if new.
+    with transaction.atomic():
+        room_id = Room.objects.filter(name=room_name).values_list('id', flat=True).first()
+        if room_id is None: # Only if the row went away after the actor loaded it
+            room_id = Room.objects.get_or_create(name=room_name)[0].id
+        if is_host:
+            Room.objects.filter(id=room_id).exclude(host_client_id=client_id).update(host_client_id=client_id)
+        values = {'room_id': room_id, 'display_name': display_name, 'is_host': is_host, 'last_seen': timezone.now()}
+        if not Participant.objects.filter(client_id=client_id).update(**values):
+            Participant.objects.create(client_id=client_id, **values)
+
+
+@timed_db_op
+def persist_participant_leave_db_ops(room_name, client_id, clear_host):
+    Participant.objects.filter(client_id=client_id).delete()
+    Room.objects.filter(name=room_name).update(last_left_at=timezone.now())
+    if clear_host:
+        Room.objects.filter(name=room_name, host_client_id=client_id).update(host_client_id=None)
+
+
+@timed_db_op
+def persist_host_dropped_db_ops(room_name, client_id):
+    Room.objects.filter(name=room_name, host_client_id=client_id).update(host_client_id=None)
+
+
+@timed_db_op
+def persist_room_ended_db_ops(room_name):
+    # One bulk DELETE for the whole room instead of one per leaving participant.
+    Participant.objects.filter(room__name=room_name).delete()
+    Room.objects.filter(name=room_name).update(host_client_id=None, sfu_node=None, last_left_at=timezone.now())
+
+
+@timed_db_op
+def persist_sfu_node_db_ops(room_name, node_url):
+    Room.objects.filter(name=room_name).update(sfu_node=node_url)
+
+
+@timed_db_op
+def persist_display_name_db_ops(client_id, display_name):
+    Participant.objects.filter(client_id=client_id).update(display_name=display_name)
+
+
+@timed_db_op
+def persist_rtp_capabilities_db_ops(room_name, caps_hash, rtp_caps):
+    ensure_stored(caps_hash, rtp_caps)
+    Room.objects.filter(name=room_name).update(rtp_capabilities_id=caps_hash)
+
+
+class RoomState:
+    def __init__(self, room_name):
+        self.room_name = room_name
+        self.host_client_id = None
+        self.router_rtp_capabilities = None
+        self.router_rtp_capabilities_hash = None
+        self.sfu_node = None     # base URL of the SFU node hosting the router (placement.py)
+        self.participants = {}   # client_id -> {'client_id', 'display_name', 'is_host'}
+        self.producers = {}      # producer_id -> {'clientId', 'producerId', 'kind', 'appData'}
+        self.known_names = {}    # display names of participant rows left in the DB
+        self.channels = {}       # client_id -> channel name of the socket currently attached
+        self.resume_tokens = {}  # client_id -> token a reconnecting socket must present
+        self.detached = {}       # client_id -> TimerHandle of the pending teardown
+        self.ended = set()       # clients removed by end(); their sockets' own leave is a no-op
+        self.loop = asyncio.get_running_loop()
+        self.stopped = False
+        self.roster_broadcaster = RosterBroadcaster(self, room_group_name(room_name))
+        self._mailbox = asyncio.Queue()
+        self._persist_queue = asyncio.Queue()
+        self._expiring = set()  # Running on_expire tasks of detached participants
+        # The actor's tasks start from an empty context: they serve every session, so must not inherit the
+        # trace of the one whose connect() created them; ops carry their caller's trace instead (tracing.py).
+        self._loading_trace = tracing.current()
+        self._task = contextvars.Context().run(self.loop.create_task, self._run())
+        self._persist_task = contextvars.Context().run(self.loop.create_task, self._run_persistence())
+
+    # --- Reads: plain dictionary lookups, safe to call from any coroutine on the loop ---
+    def is_host(self, client_id):
+        return client_id is not None and self.host_client_id == client_id
+
+    def roster(self):
+        """Participant list in the order the clients expect (host first, then by name)."""
+        return sorted(self.participants.values(), key=lambda p: (not p['is_host'], p['display_name']))
+
+    def host_info(self):
+        return self.participants.get(self.host_client_id) if self.host_client_id else None
+
+    def producers_of(self, client_id):
+        return [p for p in self.producers.values() if p['clientId'] == client_id]
+
+    # --- Mutations: queued to the room task ---
+    def join(self, client_id, channel_name=None):
+        return self._call('join', client_id, channel_name)
+
+    def leave(self, client_id, channel_name=None, expired=False):
+        """Remove the participant; None if ``channel_name`` is no longer its socket or, with ``expired``, it was resumed."""
+        return self._call('leave', client_id, channel_name, expired)
+
+    def detach(self, client_id, channel_name, grace, on_expire):
+        """Keep the participant for ``grace`` seconds, then run ``on_expire()`` unless it was resumed."""
+        return self._call('detach', client_id, channel_name, grace, on_expire)
+
+    def resume(self, client_id, token, channel_name):
+        return self._call('resume', client_id, token, channel_name)
+
+    def end(self):
+        """Remove every participant at once, without roster deltas; returns their client ids and the room's SFU node."""
+        return self._call('end')
+
+    def rename(self, client_id, display_name):
+        return self._call('rename', client_id, display_name)
+
+    def add_producer(self, client_id, producer_id, kind, app_data):
+        return self._call('add_producer', client_id, producer_id, kind, app_data)
+
+    def remove_producer(self, producer_id):
+        return self._call('remove_producer', producer_id)
+
+    def set_rtp_capabilities(self, rtp_caps):
+        return self._call('set_rtp_capabilities', rtp_caps)
+
+    def assign_sfu_node(self, node_url, live_nodes):
+        """Keep the current node if it is in ``live_nodes``, else move the room to ``node_url``; returns the room's node."""
+        return self._call('assign_sfu_node', node_url, live_nodes)
+
+    def drop_absent_host(self):
+        """Forget a host that is neither in the room nor detached, e.g. one loaded from before a restart; True if dropped."""
+        return self._call('drop_absent_host')
+
+    def _call(self, op, *args):
+        if self.stopped:
+            # The actor retired between lookup and use; hand the call to its successor.
+            return get_room_state(self.room_name)._call(op, *args)
+        future = self.loop.create_future()
+        self._mailbox.put_nowait((getattr(self, f'_{op}'), args, future, tracing.current()))
+        return tracing.trace_future(f'room_state.{op}', 'room_state', future)
+
+    def _persist(self, fn, *args):
+        self._persist_queue.put_nowait((fn, args, tracing.current()))
+
+    def _join(self, client_id, channel_name):
+        # A fresh join replaces a detached session of the same client (its SFU transports are stale).
+        stale_session = self._cancel_detach(client_id)
+        self.ended.discard(client_id)
+        previous = self.participants.get(client_id)
+        if not self.host_client_id or self.host_client_id == client_id:
+            is_host = True
+            self.host_client_id = client_id
+            display_name = self.known_names.get(client_id, "Host")
+        else:
+            is_host = False
+            display_name = self.known_names.get(client_id, f"User-{client_id[:5]}")
+        if previous is not None:
+            display_name = previous['display_name']
+        self.participants[client_id] = {'client_id': client_id, 'display_name': display_name, 'is_host': is_host}
+        self.channels[client_id] = channel_name
+        self.resume_tokens[client_id] = resume_token = secrets.token_urlsafe(18)
+        self.roster_broadcaster.record('join', self.participants[client_id])
+        self._persist(persist_participant_join_db_ops, self.room_name, client_id, display_name, is_host)
+        return {'is_host': is_host, 'display_name': display_name, 'resume_token': resume_token, 'stale_session': stale_session}
+
+    def _leave(self, client_id, channel_name, expired):
+        if client_id in self.ended:
+            self.ended.discard(client_id)
+            return None # Already torn down in bulk by end()
+        if expired:
+            if self.detached.pop(client_id, None) is None:
+                return None # Resumed (or replaced) after the grace timer fired
+        elif channel_name is not None and self.channels.get(client_id, channel_name) != channel_name:
+            return None # A newer socket has taken over this participant
+        self._cancel_detach(client_id)
+        self.channels.pop(client_id, None)
+        self.resume_tokens.pop(client_id, None)
+        participant = self.participants.pop(client_id, None)
+        self.known_names.pop(client_id, None)
+        for producer_id in [p['producerId'] for p in self.producers_of(client_id)]:
+            del self.producers[producer_id]
+        host_left = participant is not None and self.host_client_id == client_id
+        if host_left:
+            self.host_client_id = None
+        if participant is not None:
+            self.roster_broadcaster.record('leave', participant)
+            self._persist(persist_participant_leave_db_ops, self.room_name, client_id, host_left)
+        return {'removed': participant is not None, 'host_left': host_left}
+
+    def _drop_absent_host(self):
+        host_client_id = self.host_client_id
+        if host_client_id is None or host_client_id in self.participants or host_client_id in self.detached:
+            return False
+        self.host_client_id = None # The next joiner is elected host, as when a host leaves
+        self._persist(persist_host_dropped_db_ops, self.room_name, host_client_id)
+        return True
+
+    def _detach(self, client_id, channel_name, grace, on_expire):
+        if client_id not in self.participants or self.channels.get(client_id) != channel_name:
+            return False
+        del self.channels[client_id]
+        self.detached[client_id] = self.loop.call_later(grace, self._expire_detached, on_expire)
+        return True
+
+    def _expire_detached(self, on_expire):
+        task = self.loop.create_task(on_expire())
+        self._expiring.add(task)
+        task.add_done_callback(self._expiring.discard)
+
+    def _resume(self, client_id, token, channel_name):
+        expected = self.resume_tokens.get(client_id)
+        participant = self.participants.get(client_id)
+        if participant is None or not expected or not token or not hmac.compare_digest(expected, token):
+            return None
+        self._cancel_detach(client_id)
+        self.channels[client_id] = channel_name
+        # Tokens are single use; the resumed socket gets the next one.
+        self.resume_tokens[client_id] = resume_token = secrets.token_urlsafe(18)
+        return {'is_host': participant['is_host'], 'display_name': participant['display_name'], 'resume_token': resume_token}
+
+    def _cancel_detach(self, client_id):
+        handle = self.detached.pop(client_id, None)
+        if handle is not None:
+            handle.cancel()
+        return handle is not None
+
+    def _end(self):
+        client_ids, sfu_node = list(self.participants), self.sfu_node
+        for handle in self.detached.values():
+            handle.cancel()
+        self.ended.update(self.channels) # Only attached sockets will still call leave(); detached ones are gone
+        for collection in (self.participants, self.producers, self.channels, self.resume_tokens, self.detached, self.known_names):
+            collection.clear()
+        self.host_client_id = self.sfu_node = None # The next session is placed afresh
+        self.roster_broadcaster.cancel() # Nobody is left to receive pending deltas
+        self._persist(persist_room_ended_db_ops, self.room_name)
+        return {'client_ids': client_ids, 'sfu_node': sfu_node}
+
+    def _rename(self, client_id, display_name):
+        participant = self.participants.get(client_id)
+        if participant is None:
+            raise Participant.DoesNotExist(f"Participant {client_id} is not in room {self.room_name}")
+        participant['display_name'] = display_name
+        self.roster_broadcaster.record('rename', participant)
+        self._persist(persist_display_name_db_ops, client_id, display_name)
+        return dict(participant)
+
+    def _add_producer(self, client_id, producer_id, kind, app_data):
+        # True only for the first registration: both the produce relay and the SFU event stream report producers.
+        if producer_id in self.producers:
+            return False
+        self.producers[producer_id] = {'clientId': client_id, 'producerId': producer_id, 'kind': kind, 'appData': app_data}
+        return True
+
+    def _remove_producer(self, producer_id):
+        return self.producers.pop(producer_id, None)
+
+    def _set_rtp_capabilities(self, rtp_caps):
+        self.router_rtp_capabilities = rtp_caps
+        self.router_rtp_capabilities_hash = caps_hash = capabilities_hash(rtp_caps)
+        self._persist(persist_rtp_capabilities_db_ops, self.room_name, caps_hash, rtp_caps)
+
+    def _assign_sfu_node(self, node_url, live_nodes):
+        if self.sfu_node is not None and self.sfu_node in live_nodes:
+            return self.sfu_node
+        self.sfu_node = node_url
+        self._persist(persist_sfu_node_db_ops, self.room_name, node_url)
+        return node_url
+
+    def _noop(self):
+        pass
+
+    async def _run(self):
+        try:
+            with tracing.activate(self._loading_trace): # Attributed to the session whose join started the actor
+                self.host_client_id, self.router_rtp_capabilities, self.router_rtp_capabilities_hash, self.sfu_node, self.known_names = \
+                    await run_db(load_room_state_db_ops, self.room_name)
+        except Exception:
+            logger.exception("Failed to load room %s from DB, starting empty", self.room_name)
+        self._loading_trace = None
+        idle_timeout = getattr(settings, 'ROOM_STATE_IDLE_SECONDS', 60)
+        while True:
+            try:
+                fn, args, future, trace = await asyncio.wait_for(self._mailbox.get(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                if self.participants:
+                    continue
+                await self._persist_queue.join() # Flush before a successor could reload from the DB
+                if self.participants or not self._mailbox.empty():
+                    continue
+                self._retire()
+                return
+            if future.cancelled():
+                continue
+            try:
+                with tracing.activate(trace): # So _persist() picks up the caller's trace
+                    future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _run_persistence(self):
+        while True:
+            fn, args, trace = await self._persist_queue.get()
+            try:
+                with tracing.activate(trace):
+                    await run_db(fn, *args)
+            except Exception:
+                logger.exception("Persisting %s for room %s failed", fn.__name__, self.room_name)
+            finally:
+                self._persist_queue.task_done()
+
+    def _retire(self):
+        self.stopped = True
+        self.roster_broadcaster.cancel()
+        if _rooms.get(self.room_name) is self:
+            del _rooms[self.room_name]
+        self._persist_task.cancel()
+
+    async def flush(self):
+        """Wait until every queued mutation has been applied and persisted."""
+        await self._call('noop')
+        await self._persist_queue.join()
+
+
+def get_room_state(room_name):
+    """Return the live RoomState for ``room_name``, starting its actor if needed."""
+    state = _rooms.get(room_name)
+    if state is None or state.stopped or state.loop is not asyncio.get_running_loop():
+        state = _rooms[room_name] = RoomState(room_name)
+    return state
@@ -0,0 +1,124 @@
+# interview_app/roster.py
+# Coalesced roster broadcasts. Roster changes recorded by RoomState are held
+# for a short window, merged per client and published to the room group as one
+# numbered 'participantListDelta'. New joiners (and clients that detect a gap in
+# the sequence numbers) get a full 'participantList' snapshot instead.
+#
+# Delta ops are idempotent: 'join' and 'rename' upsert the participant, 'leave'
+# removes it if present. A snapshot tagged with seq N already reflects changes
+# that will be published in N+1, so clients can apply N+1 on top of it safely.
+#
+# Large rooms (ROSTER_LARGE_ROOM): once a room grows past `threshold`, pushing
+# every change to every member costs O(members) frames of O(changes) each, and
+# each joiner's snapshot is O(members) itself. From then on deltas only go to
+# the members entitled to the full roster (the host), while the room group gets
+# a 'participantCount' with the count and host, coalesced over `count_interval`.
+# Attendees page through the roster on demand (page()). The room goes back to
+# full rosters below threshold * exit_ratio, starting with a fresh snapshot for
+# everyone; the gap keeps a room hovering around the threshold from flapping.
+import logging
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .codec import encode_group_event
+
+logger = logging.getLogger(__name__)
+
+
+class RosterBroadcaster:
+    def __init__(self, room_state, group_name):
+        self.room_state = room_state
+        self.group_name = group_name
+        self.seq = 0
+        self._pending = {}  # client_id -> change, in first-change order
+        self._flush_handle = None
+        self._flush_task = None
+        self.large = False
+        self._left_large = False  # Back to full rosters since the last flush: publish a snapshot
+        self._ordered = None  # Cached roster(), dropped on every change
+
+    def receives_full_roster(self, client_id):
+        return not self.large or self.room_state.is_host(client_id)
+
+    def _update_mode(self):
+        config = settings.ROSTER_LARGE_ROOM
+        count = len(self.room_state.participants)
+        if not self.large and count > config['threshold']:
+            self.large, self._left_large = True, False
+            logger.info("Room %s has %d participants, switching to large-room roster mode", self.room_state.room_name, count)
+        elif self.large and count <= config['threshold'] * config['exit_ratio']:
+            self.large, self._left_large = False, True
+            logger.info("Room %s is down to %d participants, back to full rosters", self.room_state.room_name, count)
+
+    def record(self, op, participant):
+        client_id = participant['client_id']
+        previous = self._pending.get(client_id)
+        if op == 'rename' and previous is not None and previous['op'] == 'join':
+            op = 'join' # The others have not seen the join yet; send it with the new name
+        self._pending[client_id] = {'op': op, 'participant': dict(participant)}
+        self._ordered = None
+        self._update_mode()
+        if self._flush_handle is None:
+            window = settings.ROSTER_LARGE_ROOM['count_interval'] if self.large else getattr(settings, 'ROSTER_BROADCAST_DEBOUNCE_SECONDS', 0.1)
+            self._flush_handle = self.room_state.loop.call_later(window, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_task = self.room_state.loop.create_task(self.flush())
+
+    def ordered(self):
+        if self._ordered is None:
+            self._ordered = self.room_state.roster()
+        return self._ordered
+
+    def snapshot(self):
+        return {'type': 'participantList', 'seq': self.seq, 'data': self.ordered()}
+
+    def count_message(self):
+        host = self.room_state.host_info()
+        return {'type': 'participantCount', 'seq': self.seq, 'data': {
+            'count': len(self.room_state.participants),
+            'rosterMode': 'count' if self.large else 'full',
+            'host': {'hostClientId': host['client_id'], 'hostDisplayName': host['display_name']} if host else None,
+        }}
+
+    def page(self, offset, limit):
+        """One page of the ordered roster; pages are cut from the roster as of ``seq``."""
+        ordered = self.ordered()
+        participants = ordered[offset:offset + limit]
+        next_offset = offset + len(participants)
+        return {'type': 'participantPage', 'seq': self.seq, 'data': {
+            'offset': offset, 'total': len(ordered), 'participants': participants,
+            'nextOffset': next_offset if next_offset < len(ordered) else None,
+        }}
+
+    async def flush(self):
+        self._flush_handle = None
+        if not self._pending:
+            return
+        changes = list(self._pending.values())
+        self._pending.clear()
+        self.seq += 1
+        left_large, self._left_large = self._left_large, False
+        channel_layer = get_channel_layer()
+        try:
+            if not self.large:
+                # Members that only had counts need the whole roster again; the others take it as a resync.
+                message = self.snapshot() if left_large else {'type': 'participantListDelta', 'data': {'seq': self.seq, 'changes': changes}}
+                await channel_layer.group_send(self.group_name, encode_group_event(message))
+                return
+            host_channel = self.room_state.channels.get(self.room_state.host_client_id)
+            if host_channel is not None: # A detached host gets the whole roster when it resumes
+                await channel_layer.send(host_channel, encode_group_event(
+                    {'type': 'participantListDelta', 'data': {'seq': self.seq, 'changes': changes}}))
+            await channel_layer.group_send(self.group_name, encode_group_event(self.count_message()))
+        except Exception:
+            logger.exception("Failed to publish roster update %s to %s", self.seq, self.group_name)
+
+    def cancel(self):
+        self._pending.clear()
+        self._ordered = None
+        self.large = self._left_large = False
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
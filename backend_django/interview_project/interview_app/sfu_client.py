@@ -0,0 +1,125 @@
+# interview_app/sfu_client.py
+# Process-wide pool of httpx.AsyncClient instances used to talk to the Node.js
+# mediasoup server(s). One client (and therefore one keep-alive connection pool)
+# is kept per SFU base URL and shared by every consumer in the process.
+import asyncio
+import importlib.util
+import threading
+
+import httpx
+from django.conf import settings
+
+from . import lifespan
+
+_clients = {}  # base_url -> _PooledClient
+_clients_lock = threading.Lock()
+
+
+class PoolStats:
+    """Counters for one SFU connection pool."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.pool_hits = 0     # requests served over an already-open keep-alive connection
+        self.connects = 0      # new TCP connections opened
+        self.waits = 0         # requests that started while every pooled connection was busy
+        self.errors = 0
+        self.clients_created = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def _pool_config(base_url):
+    config = dict(getattr(settings, 'MEDIASOUP_HTTP_POOL', {}))
+    config.update(getattr(settings, 'MEDIASOUP_HTTP_POOL_OVERRIDES', {}).get(base_url, {}))
+    return config
+
+
+def _http2_available():
+    return importlib.util.find_spec('h2') is not None
+
+
+class _PooledClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.config = _pool_config(base_url)
+        self.stats = PoolStats()
+        self.client = None
+        self.loop = None
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        # An AsyncClient is bound to the loop it first ran on; rebuild it if that loop went away.
+        if self.client is None or self.client.is_closed or self.loop is not loop or loop.is_closed():
+            http2 = bool(self.config.get('http2')) and _http2_available()
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.config.get('timeout', 10.0),
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self.config.get('max_connections'),
+                    max_keepalive_connections=self.config.get('max_keepalive_connections'),
+                    keepalive_expiry=self.config.get('keepalive_expiry', 5.0),
+                ),
+            )
+            self.loop = loop
+            self.stats.clients_created += 1
+        return self.client
+
+    async def request(self, method, endpoint, **kwargs):
+        client = self._ensure_client()
+        stats = self.stats
+        max_connections = self.config.get('max_connections')
+        if max_connections and stats.in_flight >= max_connections:
+            stats.waits += 1
+        opened = False
+
+        async def trace(event_name, info):
+            nonlocal opened
+            if event_name == 'connection.connect_tcp.started':
+                opened = True
+                stats.connects += 1
+
+        stats.requests += 1
+        stats.in_flight += 1
+        try:
+            response = await client.request(method, endpoint, extensions={'trace': trace}, **kwargs)
+        except httpx.HTTPError:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+        if not opened:
+            stats.pool_hits += 1
+        return response
+
+    async def aclose(self):
+        client, self.client = self.client, None
+        # A client left over from another (finished) loop cannot be closed from this one.
+        if client is not None and not client.is_closed and self.loop is asyncio.get_running_loop():
+            await client.aclose()
+
+
+def get_sfu_client(base_url=None):
+    """Return the shared pooled client for ``base_url`` (defaults to MEDIASOUP_NODE_URL)."""
+    base_url = base_url or settings.MEDIASOUP_NODE_URL
+    pooled = _clients.get(base_url)
+    if pooled is None:
+        with _clients_lock:
+            pooled = _clients.setdefault(base_url, _PooledClient(base_url))
+    return pooled
+
+
+def pool_stats():
+    """Snapshot of the counters of every SFU pool, keyed by base URL."""
+    return {base_url: pooled.stats.as_dict() for base_url, pooled in list(_clients.items())}
+
+
+async def close_sfu_clients():
+    for pooled in list(_clients.values()):
+        await pooled.aclose()
+
+
+lifespan.on_shutdown(close_sfu_clients)
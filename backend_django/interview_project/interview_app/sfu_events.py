@@ -0,0 +1,199 @@
+# interview_app/sfu_events.py
+# Mirror of the SFU's producers, fed by the Node server's lifecycle event stream
+# (GET /events, server-sent events). One background task per process and SFU
+# node keeps the stream open and reconnects with backoff; every (re)connect
+# starts with a full snapshot, so closures missed while disconnected are still
+# noticed.
+#
+# Events are applied to the registry and, for rooms served by this process (a
+# live RoomState), pushed into the room's group: producers that appear or close
+# on the SFU side become newProducer/producerClosed, consumer and transport
+# closures go to the client that owned them. While the stream is live, joins
+# read host producers from the registry instead of polling the SFU.
+import asyncio
+import logging
+
+import httpx
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import lifespan
+from .codec import encode_group_event, loads
+from .log import fields
+from .placement import get_placement
+from .room_state import _rooms, room_group_name
+
+logger = logging.getLogger(__name__)
+
+
+class ProducerRegistry:
+    def __init__(self):
+        self.rooms = {}  # room_id -> {producer_id: {'clientId', 'producerId', 'kind', 'appData'}}
+
+    def add(self, room_id, producer):
+        self.rooms.setdefault(room_id, {})[producer['producerId']] = producer
+
+    def remove(self, room_id, producer_id):
+        producers = self.rooms.get(room_id)
+        producer = producers.pop(producer_id, None) if producers else None
+        if producers is not None and not producers:
+            del self.rooms[room_id]
+        return producer
+
+    def producers_of(self, room_id, client_id):
+        return [p for p in self.rooms.get(room_id, {}).values() if p['clientId'] == client_id]
+
+
+async def _parse_sse(lines):
+    """Yield (event, data) pairs from an iterator of server-sent event lines."""
+    event, data = 'message', []
+    async for line in lines:
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue # Heartbeat / comment
+        else:
+            name, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if name == 'event':
+                event = value
+            elif name == 'data':
+                data.append(value)
+
+
+class SfuEventStream:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.registry = ProducerRegistry()
+        self.live = False     # Connected and synced with a snapshot
+        self.events = 0
+        self.reconnects = 0
+        self._task = None
+
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self.live = False
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        config = settings.MEDIASOUP_EVENTS
+        backoff = config['reconnect_min']
+        while True:
+            try:
+                # A dedicated client: the stream holds its connection for as long as it is open.
+                timeout = httpx.Timeout(config['connect_timeout'], read=config['read_timeout'])
+                async with httpx.AsyncClient(base_url=self.base_url, timeout=timeout) as client:
+                    async with client.stream('GET', '/events', headers={'Accept': 'text/event-stream'}) as response:
+                        response.raise_for_status()
+                        logger.info("SFU events: connected to %s", self.base_url)
+                        backoff = config['reconnect_min']
+                        async for event, data in _parse_sse(response.aiter_lines()):
+                            self.events += 1
+                            try:
+                                await self._apply(event, loads(data))
+                            except Exception:
+                                logger.exception("SFU events: failed to apply %s event", event)
+            except asyncio.CancelledError:
+                self.live = False
+                raise
+            except Exception as e:
+                logger.warning("SFU events: stream from %s lost: %r; retrying in %.1fs", self.base_url, e, backoff)
+            self.live = False
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, config['reconnect_max'])
+
+    async def _apply(self, event, data):
+        if event == 'snapshot':
+            await self._apply_snapshot(data['rooms'])
+            self.live = True
+        elif event == 'producerCreated':
+            await self._producer_created(data['roomId'], {k: data.get(k) for k in ('clientId', 'producerId', 'kind', 'appData')})
+        elif event == 'producerClosed':
+            await self._producer_closed(data['roomId'], data['producerId'])
+        elif event in ('consumerClosed', 'transportClosed'):
+            await self._notify_client(data['roomId'], data['clientId'], event, data)
+        elif event == 'roomClosed':
+            # Producers of a closed router report their own closures; drop anything left over.
+            for producer_id in list(self.registry.rooms.get(data['roomId'], {})):
+                await self._producer_closed(data['roomId'], producer_id)
+        logger.debug("SFU events: %s", event, extra=fields(event='sfu.event', room=data.get('roomId')))
+
+    async def _apply_snapshot(self, rooms):
+        # Diff against what we had: producers that closed while the stream was down are closed now.
+        for room_id, producers in list(self.registry.rooms.items()):
+            current = {p['producerId'] for p in rooms.get(room_id, [])}
+            for producer_id in [pid for pid in producers if pid not in current]:
+                await self._producer_closed(room_id, producer_id)
+        for room_id, producers in rooms.items():
+            for producer in producers:
+                await self._producer_created(room_id, producer)
+
+    async def _producer_created(self, room_id, producer):
+        self.registry.add(room_id, producer)
+        state = _rooms.get(room_id)
+        # Whichever of this event and the consumer's produce relay registers the producer first announces it.
+        if state is not None and await state.add_producer(producer['clientId'], producer['producerId'], producer['kind'], producer.get('appData') or {}):
+            await _group_send(room_id, {'type': 'newProducer', 'data': producer})
+
+    async def _producer_closed(self, room_id, producer_id):
+        producer = self.registry.remove(room_id, producer_id)
+        state = _rooms.get(room_id)
+        if state is not None:
+            removed = await state.remove_producer(producer_id)
+            if removed is not None:
+                await _group_send(room_id, {'type': 'producerClosed', 'data': {'clientId': removed['clientId'], 'producerId': producer_id}})
+        return producer
+
+    async def _notify_client(self, room_id, client_id, event, data):
+        state = _rooms.get(room_id)
+        if state is not None and client_id in state.participants:
+            await _group_send(room_id, {'type': event, 'data': data}, target_client_id=client_id)
+
+
+async def _group_send(room_id, message, target_client_id=None):
+    event = encode_group_event(message)
+    if target_client_id is not None:
+        event['target_client_id'] = target_client_id
+    await get_channel_layer().group_send(room_group_name(room_id), event)
+
+
+_streams = {}  # base_url -> SfuEventStream
+
+
+def get_event_stream(base_url=None):
+    """The event stream for ``base_url`` (default MEDIASOUP_NODE_URL), started on first use if enabled."""
+    base_url = base_url or settings.MEDIASOUP_NODE_URL
+    stream = _streams.get(base_url)
+    if stream is None:
+        stream = _streams[base_url] = SfuEventStream(base_url)
+    if settings.MEDIASOUP_EVENTS['enabled']:
+        stream.ensure_started()
+    return stream
+
+
+async def start_event_streams():
+    if settings.MEDIASOUP_EVENTS['enabled']:
+        for node_url in get_placement().urls:
+            get_event_stream(node_url)
+
+
+async def stop_event_streams():
+    for stream in list(_streams.values()):
+        await stream.stop()
+
+
+lifespan.on_startup(start_event_streams)
+lifespan.on_shutdown(stop_event_streams)
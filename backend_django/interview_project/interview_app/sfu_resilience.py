@@ -0,0 +1,171 @@
+# interview_app/sfu_resilience.py
+# Tail-latency controls for calls to the mediasoup nodes (MEDIASOUP_CALL_POLICY):
+#  - every call has a deadline for its endpoint, covering retries and hedges;
+#  - idempotent calls (GET, DELETE and the POSTs listed as idempotent) are
+#    retried with jittered backoff after a network error or a 502/503/504;
+#  - a GET that has not answered after hedge_after gets a duplicate request and
+#    the first answer wins;
+#  - each node has a circuit breaker: after breaker_failures consecutive
+#    failures it opens and calls fail at once with SfuUnavailable; after
+#    breaker_cooldown one trial call is let through and its outcome closes or
+#    reopens it.
+# Only network errors, deadline overruns and 502/503/504 count as failures; other
+# error statuses are answers from a working node.
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+from django.conf import settings
+
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class SfuUnavailable(Exception):
+    """Raised without calling the node while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, node):
+        self.node = node
+        self.state = CLOSED
+        self.failures = 0        # Consecutive
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.rejected = 0
+
+    def check(self):
+        """Raise SfuUnavailable if a call would be refused now; takes nothing, so callers can fail before queueing."""
+        if self.state == OPEN and time.monotonic() - self.opened_at < settings.MEDIASOUP_CALL_POLICY['breaker_cooldown']:
+            self.rejected += 1
+            raise SfuUnavailable(f"Circuit breaker open for {self.node}")
+        if self.state == HALF_OPEN and self.trial_in_flight:
+            self.rejected += 1
+            raise SfuUnavailable(f"Circuit breaker half-open for {self.node}, trial call in flight")
+
+    def before_call(self):
+        """Let a call through or raise SfuUnavailable. Returns True if the call is the half-open trial."""
+        self.check()
+        if self.state == OPEN:
+            self.state = HALF_OPEN # Cooled down
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("SFU breaker for %s closed", self.node)
+        self.state, self.failures, self.trial_in_flight = CLOSED, 0, False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= settings.MEDIASOUP_CALL_POLICY['breaker_failures']):
+            logger.warning("SFU breaker for %s opened after %d consecutive failures", self.node, self.failures)
+            self.state, self.opened_at = OPEN, time.monotonic()
+
+    def release_trial(self):
+        # The trial call ended without an outcome (e.g. the caller was cancelled).
+        self.trial_in_flight = False
+
+    def as_dict(self):
+        return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected}
+
+
+_breakers = {}  # base_url -> CircuitBreaker
+
+
+def get_breaker(node=None):
+    node = node or settings.MEDIASOUP_NODE_URL
+    breaker = _breakers.get(node)
+    if breaker is None:
+        breaker = _breakers[node] = CircuitBreaker(node)
+    return breaker
+
+
+def breaker_states():
+    return {node: breaker.as_dict() for node, breaker in _breakers.items()}
+
+
+def is_idempotent(method, label):
+    return method in ('GET', 'DELETE') or label in settings.MEDIASOUP_CALL_POLICY['idempotent']
+
+
+async def _hedged(send, delay, label):
+    first = asyncio.ensure_future(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+    HEDGES.inc(label)
+    pending = {first, asyncio.ensure_future(send())}
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not pending:
+                return task.result()  # Both failed: raise the last error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call(send, node, method, label):
+    """Run ``send()`` (one request to ``node``, returning an httpx.Response) under the call policy.
+
+    Raises SfuUnavailable if the node's breaker is open, httpx.TimeoutException
+    once the endpoint's deadline is spent, or the last attempt's RequestError.
+    """
+    policy = settings.MEDIASOUP_CALL_POLICY
+    breaker = get_breaker(node)
+    trial = breaker.before_call()
+    deadline = policy['deadlines'].get(label, policy['default_deadline'])
+    attempts = 1 + (policy['retries'] if is_idempotent(method, label) else 0)
+    hedge_after = policy['hedge_after'] if method == 'GET' else 0
+
+    async def attempt_all():
+        for attempt in range(attempts):
+            if attempt:
+                RETRIES.inc(label)
+                await asyncio.sleep(policy['retry_backoff'] * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                if breaker.state == OPEN:
+                    raise SfuUnavailable(f"Circuit breaker open for {node}")
+            try:
+                response = await (_hedged(send, hedge_after, label) if hedge_after else send())
+            except httpx.RequestError:
+                breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                continue
+            if response.status_code in RETRYABLE_STATUSES:
+                breaker.record_failure()
+                if attempt < attempts - 1:
+                    continue
+            else:
+                breaker.record_success()
+            return response
+
+    try:
+        return await asyncio.wait_for(attempt_all(), deadline)
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise httpx.TimeoutException(f"SFU deadline of {deadline}s exceeded for {method} {label}") from None
+    finally:
+        if trial:
+            breaker.release_trial()
+
+
+RETRIES = Counter('interview_sfu_retries_total', 'SFU calls retried after a network error or 502/503/504.', ['endpoint'])
+HEDGES = Counter('interview_sfu_hedges_total', 'Duplicate SFU reads sent because the first was slow.', ['endpoint'])
+Gauge('interview_sfu_breaker_state', 'SFU circuit breaker state (0 closed, 1 half-open, 2 open).', ['node'],
+      collect=lambda: [((node,), _STATE_VALUES[breaker.state]) for node, breaker in list(_breakers.items())])
@@ -0,0 +1,344 @@
+# interview_app/sfu_standin.py
+# In-process stand-in for the Node.js mediasoup server, for load tests and local
+# runs without mediasoup. It speaks plain HTTP/1.1 (keep-alive) on asyncio and
+# implements the REST endpoints mediasoup_request calls, keeping just enough
+# state (rooms, clients, transports, producers, consumers) to answer them like
+# server.js does. No media flows.
+#
+# latency / jitter (seconds) delay every response, and failure_rate is the
+# fraction of requests answered with a 500, to exercise error paths. GET /events
+# serves the same lifecycle event stream as server.js; close_producer() and
+# drop_event_streams() simulate SFU-side failures.
+import asyncio
+import json
+import random
+import re
+import uuid
+from urllib.parse import unquote
+
+ROUTER_RTP_CAPABILITIES = {
+    'codecs': [
+        {'kind': 'audio', 'mimeType': 'audio/opus', 'clockRate': 48000, 'channels': 2, 'preferredPayloadType': 100,
+         'rtcpFeedback': [{'type': 'transport-cc'}], 'parameters': {}},
+        {'kind': 'video', 'mimeType': 'video/VP8', 'clockRate': 90000, 'preferredPayloadType': 101,
+         'rtcpFeedback': [{'type': 'nack'}, {'type': 'nack', 'parameter': 'pli'}, {'type': 'ccm', 'parameter': 'fir'},
+                          {'type': 'goog-remb'}, {'type': 'transport-cc'}],
+         'parameters': {'x-google-start-bitrate': 1000}},
+    ],
+    'headerExtensions': [
+        {'kind': 'audio', 'uri': 'urn:ietf:params:rtp-hdrext:sdes:mid', 'preferredId': 1},
+        {'kind': 'video', 'uri': 'urn:ietf:params:rtp-hdrext:sdes:mid', 'preferredId': 1},
+    ],
+}
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _transport_params(transport_id):
+    return {
+        'id': transport_id,
+        'iceParameters': {'usernameFragment': uuid.uuid4().hex[:16], 'password': uuid.uuid4().hex, 'iceLite': True},
+        'iceCandidates': [{'foundation': 'udpcandidate', 'priority': 1076302079, 'ip': '127.0.0.1', 'protocol': 'udp', 'port': 40000, 'type': 'host'}],
+        'dtlsParameters': {'role': 'auto', 'fingerprints': [{'algorithm': 'sha-256', 'value': 'AA:' * 31 + 'AA'}]},
+        'sctpParameters': None,
+    }
+
+
+class SfuStandIn:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rooms = {}  # room_id -> {client_id: {'transports': {id: {'connected'}}, 'producers': {id: {...}}, 'consumers': {id: {...}}}}
+        self.requests = 0
+        self.failures_injected = 0
+        self._random = random.Random(seed)
+        self._server = None
+        self._connections = set()  # Writers of open connections, closed on stop()
+        self._event_writers = set()
+        self.event_seq = 0
+        self._routes = [
+            ('GET', r'/stats', self.stats),
+            ('GET', r'/rooms', self.list_rooms),
+            ('GET', r'/rooms/([^/]+)/router-rtp-capabilities', self.router_rtp_capabilities),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/transports', self.create_transport),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/transports/([^/]+)/connect', self.connect_transport),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/transports/([^/]+)/produce', self.produce),
+            ('GET', r'/rooms/([^/]+)/clients/([^/]+)/producers', self.list_producers),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/transports/([^/]+)/consume', self.consume),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/transports/([^/]+)/consume-batch', self.consume_batch),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/consumers/resume-batch', self.resume_batch),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/consumers/([^/]+)/resume', self.resume_consumer),
+            ('POST', r'/rooms/([^/]+)/clients/([^/]+)/disconnected', self.client_disconnected),
+            ('POST', r'/rooms/([^/]+)/close', self.close_room),
+            ('DELETE', r'/rooms/([^/]+)', self.delete_room),
+        ]
+        self._routes = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in self._routes]
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections): # Idle keep-alive connections would outlive the server
+                writer.close()
+            while self._connections: # Let their handlers see EOF and finish
+                await asyncio.sleep(0)
+            await self._server.wait_closed()
+            self._server = None
+
+    # --- HTTP plumbing ---
+    async def _serve_connection(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                if method == 'GET' and target == '/events':
+                    await self._serve_events(reader, writer)
+                    break
+                status, payload = await self._dispatch(method, target.split('?', 1)[0], body)
+                self._write_response(writer, status, payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _serve_events(self, reader, writer):
+        # No Content-Length: the body is the stream, ended by closing the connection.
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n')
+        snapshot = {room_id: [dict(p, clientId=client_id) for client_id, client in room.items() for p in client['producers'].values()]
+                    for room_id, room in self.rooms.items()}
+        writer.write(self._event_frame('snapshot', {'rooms': snapshot}))
+        self._event_writers.add(writer)
+        try:
+            await reader.read() # Until the reader hangs up
+        finally:
+            self._event_writers.discard(writer)
+
+    def _event_frame(self, event, data):
+        return f'id: {self.event_seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+    def emit(self, event, data):
+        self.event_seq += 1
+        if self._event_writers:
+            frame = self._event_frame(event, data)
+            for writer in list(self._event_writers):
+                writer.write(frame)
+
+    def drop_event_streams(self):
+        for writer in list(self._event_writers):
+            writer.close()
+        self._event_writers.clear()
+
+    def _write_response(self, writer, status, payload):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), 'text/plain; charset=utf-8'
+        else:
+            body, content_type = json.dumps(payload).encode(), 'application/json; charset=utf-8'
+        writer.write(
+            f'HTTP/1.1 {status} {_STATUS_TEXT.get(status, "OK")}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n'.encode('latin-1') + body
+        )
+
+    async def _dispatch(self, method, path, body):
+        self.requests += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures_injected += 1
+            return 500, {'error': 'Injected failure'}
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                try:
+                    return 200, handler(json.loads(body) if body else {}, *map(unquote, match.groups())) # Decoded like Express params
+                except HttpError as e:
+                    return e.status, {'error': str(e)}
+        return 404, {'error': f'No route for {method} {path}'}
+
+    # --- State helpers mirroring server.js ---
+    def _room(self, room_id, create=False):
+        room = self.rooms.get(room_id)
+        if room is None:
+            if not create:
+                raise HttpError(404, f'Room {room_id} not found')
+            room = self.rooms[room_id] = {}
+        return room
+
+    def _client(self, room_id, client_id, create=False):
+        room = self._room(room_id, create)
+        client = room.get(client_id)
+        if client is None:
+            if not create:
+                raise HttpError(404, f'Client {client_id} not found')
+            client = room[client_id] = {'transports': {}, 'producers': {}, 'consumers': {}}
+        return client
+
+    def _transport(self, room_id, client_id, transport_id):
+        transport = self._client(room_id, client_id)['transports'].get(transport_id)
+        if transport is None:
+            raise HttpError(404, f'Transport {transport_id} not found')
+        return transport
+
+    def _find_producer(self, room_id, producer_id):
+        for client in self._room(room_id).values():
+            if producer_id in client['producers']:
+                return client['producers'][producer_id]
+        return None
+
+    # --- Endpoints ---
+    def stats(self, data):
+        clients = [client for room in self.rooms.values() for client in room.values()]
+        return {
+            'rooms': len(self.rooms), 'clients': len(clients),
+            'transports': sum(len(c['transports']) for c in clients),
+            'producers': sum(len(c['producers']) for c in clients),
+            'consumers': sum(len(c['consumers']) for c in clients),
+        }
+
+    def list_rooms(self, data):
+        return {room_id: list(room) for room_id, room in self.rooms.items()}
+
+    def router_rtp_capabilities(self, data, room_id):
+        self._room(room_id, create=True)
+        return ROUTER_RTP_CAPABILITIES
+
+    def create_transport(self, data, room_id, client_id):
+        transport_id = str(uuid.uuid4())
+        self._client(room_id, client_id, create=True)['transports'][transport_id] = {'connected': False}
+        return _transport_params(transport_id)
+
+    def connect_transport(self, data, room_id, client_id, transport_id):
+        self._transport(room_id, client_id, transport_id)['connected'] = True
+        return 'OK'
+
+    def produce(self, data, room_id, client_id, transport_id):
+        if not self._transport(room_id, client_id, transport_id)['connected']:
+            raise HttpError(400, 'Transport not DTLS connected for producing.')
+        producer_id = str(uuid.uuid4())
+        producer = self._client(room_id, client_id)['producers'][producer_id] = {
+            'producerId': producer_id, 'kind': data.get('kind'), 'appData': {**(data.get('appData') or {}), 'roomId': room_id, 'clientId': client_id},
+        }
+        self.emit('producerCreated', {'roomId': room_id, 'clientId': client_id, **producer})
+        return {'id': producer_id}
+
+    def close_producer(self, room_id, client_id, producer_id):
+        """Close a producer from the SFU side, as a transport failure would."""
+        if self._client(room_id, client_id)['producers'].pop(producer_id, None) is not None:
+            self._producer_gone(room_id, client_id, producer_id)
+
+    def _producer_gone(self, room_id, client_id, producer_id):
+        self.emit('producerClosed', {'roomId': room_id, 'clientId': client_id, 'producerId': producer_id})
+        # Consumers of a closed producer close with it ('producerclose' in mediasoup).
+        for consumer_client_id, client in self.rooms.get(room_id, {}).items():
+            for consumer_id in [cid for cid, c in client['consumers'].items() if c['producerId'] == producer_id]:
+                del client['consumers'][consumer_id]
+                self.emit('consumerClosed', {'roomId': room_id, 'clientId': consumer_client_id, 'consumerId': consumer_id, 'producerId': producer_id})
+
+    def list_producers(self, data, room_id, client_id):
+        client = self._room(room_id).get(client_id)
+        return list(client['producers'].values()) if client else []
+
+    def consume(self, data, room_id, client_id, transport_id):
+        self._transport(room_id, client_id, transport_id)
+        producer = self._find_producer(room_id, data.get('producerId'))
+        if producer is None:
+            raise HttpError(404, f"Producer {data.get('producerId')} not found")
+        consumer_id = str(uuid.uuid4())
+        self._client(room_id, client_id)['consumers'][consumer_id] = {'producerId': producer['producerId'], 'paused': True}
+        return {
+            'id': consumer_id, 'producerId': producer['producerId'], 'kind': producer['kind'],
+            'rtpParameters': {'codecs': [], 'encodings': [{'ssrc': self._random.randrange(1, 2 ** 31)}]},
+            'paused': True, 'appData': producer['appData'],
+        }
+
+    def resume_consumer(self, data, room_id, client_id, consumer_id):
+        consumer = self._client(room_id, client_id)['consumers'].get(consumer_id)
+        if consumer is None:
+            raise HttpError(404, f'Consumer {consumer_id} not found')
+        consumer['paused'] = False
+        return 'OK'
+
+    def consume_batch(self, data, room_id, client_id, transport_id):
+        self._transport(room_id, client_id, transport_id)
+        consumers, errors = [], []
+        for producer_id in data.get('producerIds') or []:
+            try:
+                consumers.append(self.consume({**data, 'producerId': producer_id}, room_id, client_id, transport_id))
+            except HttpError as e:
+                errors.append({'producerId': producer_id, 'error': str(e)})
+        return {'consumers': consumers, 'errors': errors}
+
+    def resume_batch(self, data, room_id, client_id):
+        resumed, errors = [], []
+        for consumer_id in data.get('consumerIds') or []:
+            try:
+                self.resume_consumer({}, room_id, client_id, consumer_id)
+                resumed.append(consumer_id)
+            except HttpError as e:
+                errors.append({'consumerId': consumer_id, 'error': str(e)})
+        return {'resumed': resumed, 'errors': errors}
+
+    def client_disconnected(self, data, room_id, client_id):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            client = room.pop(client_id, None)
+            if client is not None:
+                for producer_id in client['producers']:
+                    self._producer_gone(room_id, client_id, producer_id)
+                for consumer_id, consumer in client['consumers'].items():
+                    self.emit('consumerClosed', {'roomId': room_id, 'clientId': client_id, 'consumerId': consumer_id, 'producerId': consumer['producerId']})
+                for transport_id in client['transports']:
+                    self.emit('transportClosed', {'roomId': room_id, 'clientId': client_id, 'transportId': transport_id})
+            if not room:
+                del self.rooms[room_id]
+                self.emit('roomClosed', {'roomId': room_id})
+        return 'OK'
+
+    def close_room(self, data, room_id):
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return {'success': True, 'closed': False, 'clients': 0}
+        self.emit('roomClosed', {'roomId': room_id})
+        return {'success': True, 'closed': True, 'clients': len(room)}
+
+    def delete_room(self, data, room_id):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return {'success': True, 'closed': False}
+        if room:
+            raise HttpError(409, f'Room {room_id} has {len(room)} active client(s)')
+        del self.rooms[room_id]
+        self.emit('roomClosed', {'roomId': room_id})
+        return {'success': True, 'closed': True}
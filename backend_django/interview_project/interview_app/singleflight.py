@@ -0,0 +1,65 @@
+# interview_app/singleflight.py
+# Deduplication of concurrent identical reads. Callers asking for the same key
+# while a call is in flight wait for that call instead of issuing their own;
+# results can additionally be kept for a short TTL. Results are shared between
+# callers, so treat them as read-only.
+import asyncio
+import time
+
+
+class SingleFlight:
+    MAX_CACHED = 1024 # Expired entries are swept once the cache grows past this
+
+    def __init__(self):
+        self._in_flight = {}  # key -> asyncio.Task
+        self._cache = {}      # key -> (expires_at, result)
+        self.calls = 0
+        self.shared = 0
+        self.cache_hits = 0
+
+    async def do(self, key, fn, ttl=None):
+        """Return ``await fn()``, sharing one in-flight call (and an optional ``ttl`` cache) per key."""
+        if ttl:
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self.cache_hits += 1
+                    return cached[1]
+                del self._cache[key]
+
+        task = self._in_flight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            self.calls += 1
+            task = asyncio.ensure_future(self._run(key, fn, ttl))
+            self._in_flight[key] = task
+        else:
+            self.shared += 1
+        # A cancelled caller must not cancel the call other callers are waiting on.
+        return await asyncio.shield(task)
+
+    async def _run(self, key, fn, ttl):
+        try:
+            result = await fn()
+            # Only cache if invalidate() did not detach this call while it was running.
+            if ttl and self._in_flight.get(key) is asyncio.current_task():
+                self._store(key, result, ttl)
+            return result
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+
+    def _store(self, key, result, ttl):
+        now = time.monotonic()
+        if len(self._cache) >= self.MAX_CACHED:
+            for stale in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+                del self._cache[stale]
+        self._cache[key] = (now + ttl, result)
+
+    def invalidate(self, key):
+        """Drop the cached result for ``key``; later callers start a fresh call even if one is in flight."""
+        self._cache.pop(key, None)
+        self._in_flight.pop(key, None)
+
+    def stats(self):
+        return {'calls': self.calls, 'shared': self.shared, 'cache_hits': self.cache_hits,
+                'in_flight': len(self._in_flight), 'cached': len(self._cache)}
@@ -0,0 +1,42 @@
+# interview_app/teardown.py
+# Ending a room as a whole (host 'endRoom' message or the admin API). Letting
+# every socket leave on its own costs one DB write, one SFU /disconnected call
+# and one roster delta per participant for a room that is going away; here the
+# room state drops everyone in one step, the group gets a single 'roomEnded'
+# (each socket closes itself on it), the participant rows go in one bulk
+# DELETE and the SFU router is closed with one call.
+import logging
+
+from channels.layers import get_channel_layer
+
+from .codec import encode_group_event
+from .consumers import mediasoup_request, producers_endpoint, sfu_reads
+from .log import fields
+from .room_state import get_room_state, room_group_name
+
+logger = logging.getLogger(__name__)
+
+
+async def end_room(room_name, ended_by=None):
+    """End ``room_name`` for everyone; returns a summary dict and never raises for SFU errors.
+
+    Rooms are served by one process (see room_state.py); sockets of the room
+    connected to another process still close on 'roomEnded' but leave one by one.
+    """
+    ended = await get_room_state(room_name).end()
+    client_ids = ended['client_ids']
+    await get_channel_layer().group_send(
+        room_group_name(room_name), encode_group_event({'type': 'roomEnded', 'data': {'roomName': room_name, 'endedBy': ended_by}})
+    )
+    for client_id in client_ids:
+        sfu_reads.invalidate(producers_endpoint(room_name, client_id))
+    try:
+        # Closing the router closes every transport, producer and consumer of the room.
+        result = await mediasoup_request('POST', f'/rooms/{room_name}/close', node=ended['sfu_node'])
+        sfu_closed = bool(result and result.get('closed'))
+    except Exception as e:
+        logger.warning("End room: closing SFU router of %s failed: %s", room_name, e, extra=fields(event='room.end', room=room_name))
+        sfu_closed = False
+    logger.info("End room: %s ended by %s, %d participant(s) removed", room_name, ended_by or 'admin', len(client_ids),
+                extra=fields(event='room.end', room=room_name))
+    return {'room': room_name, 'participants': len(client_ids), 'sfuClosed': sfu_closed}
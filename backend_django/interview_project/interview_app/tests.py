@@ -1,3 +1,814 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
 
-# Create your tests here.
+import httpx
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import capabilities, codec, lifespan, routing, sfu_resilience, tracing
+from .channel_layer import LocalHubChannelLayer
+from .admission import SfuOverloaded, sfu_slot
+from .consumers import mediasoup_request, sfu_id
+from .metrics import sfu_endpoint_label
+from .models import Participant, Room
+from .placement import Placement
+from .reaper import Reaper, reap_db_ops
+from .room_state import get_room_state, room_group_name, load_room_state_db_ops, persist_participant_join_db_ops, persist_participant_leave_db_ops
+from .sfu_events import SfuEventStream, _parse_sse
+from .sfu_client import close_sfu_clients, get_sfu_client
+from .sfu_resilience import SfuUnavailable, get_breaker
+from .sfu_standin import SfuStandIn
+from .singleflight import SingleFlight
+
+application = URLRouter(routing.websocket_urlpatterns)
+
+
+@contextlib.asynccontextmanager
+async def stand_in_sfu(**kwargs):
+    """An SfuStandIn that mediasoup_request talks to for the duration of the block."""
+    sfu = await SfuStandIn(**kwargs).start()
+    try:
+        with override_settings(MEDIASOUP_NODE_URL=sfu.url, MEDIASOUP_NODES=[]):
+            yield sfu
+    finally:
+        await close_sfu_clients()
+        await sfu.stop()
+
+
+async def connect(room, client_id, query='joinState=1', subprotocols=None):
+    communicator = WebsocketCommunicator(application, f'/ws/interview/{room}/{client_id}/?{query}', subprotocols=subprotocols)
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def receive_until(communicator, message_type, timeout=2):
+    """The next message of ``message_type``, skipping others."""
+    while True:
+        message = json.loads(await communicator.receive_from(timeout))
+        if message['type'] == message_type:
+            return message
+
+
+async def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for condition"
+        await asyncio.sleep(0.01)
+
+
+async def create_transport(client, connected=True):
+    await client.send_json_to({'type': 'createWebRtcTransport', 'data': {}})
+    transport_id = (await receive_until(client, 'transportCreated'))['data']['id']
+    if connected:
+        await client.send_json_to({'type': 'connectTransport', 'data': {'transportId': transport_id, 'dtlsParameters': {}}})
+        await receive_until(client, 'transportConnected')
+    return transport_id
+
+
+# Background tasks the first socket would start (lifespan.ensure_started) stay off; DB helpers run on the
+# test's thread so they see its transaction.
+@override_settings(
+    DB_EXECUTOR={**settings.DB_EXECUTOR, 'mode': 'thread_sensitive'},
+    MEDIASOUP_EVENTS={**settings.MEDIASOUP_EVENTS, 'enabled': False},
+    REAPER={**settings.REAPER, 'enabled': False},
+    LOOP_WATCHDOG={**settings.LOOP_WATCHDOG, 'enabled': False},
+    ROSTER_BROADCAST_DEBOUNCE_SECONDS=0.01,
+)
+class SignalingTestCase(TestCase):
+    def setUp(self):
+        capabilities._stored.clear() # Rolled back with the previous test's transaction
+
+
+class RoomStateTests(SignalingTestCase):
+    async def test_host_leaving_hands_the_role_to_the_next_joiner(self):
+        async with stand_in_sfu():
+            host = await connect('handoff', 'host')
+            self.assertTrue((await receive_until(host, 'joinState'))['data']['isHost'])
+            attendee = await connect('handoff', 'attendee')
+            self.assertFalse((await receive_until(attendee, 'joinState'))['data']['isHost'])
+
+            await host.disconnect()
+            self.assertEqual((await receive_until(attendee, 'hostLeft'))['data']['clientId'], 'host')
+            newcomer = await connect('handoff', 'newcomer')
+            state = (await receive_until(newcomer, 'joinState'))['data']
+            self.assertTrue(state['isHost'])
+            self.assertEqual({p['client_id'] for p in state['participants']}, {'attendee', 'newcomer'})
+            await attendee.disconnect()
+            await newcomer.disconnect()
+
+
+class JoinQueryBudgetTests(TestCase):
+    """The connect path's DB work is a fixed, small number of queries whatever the room size."""
+
+    def setUp(self):
+        self.room = Room.objects.create(name='budget')
+        Participant.objects.bulk_create(
+            Participant(room=self.room, client_id=f'client-{i}', display_name=f'Client {i}') for i in range(20)
+        )
+
+    def test_load_room_state(self):
+        with self.assertNumQueries(2): # room (with capabilities), display names
+            host, caps, caps_hash, sfu_node, known_names = load_room_state_db_ops('budget')
+        self.assertEqual(len(known_names), 20)
+
+    def test_join_new_attendee(self):
+        # SAVEPOINT, room id, participant update, insert, RELEASE
+        with self.assertNumQueries(5):
+            persist_participant_join_db_ops('budget', 'newcomer', 'Newcomer', False)
+        self.assertEqual(Participant.objects.get(client_id='newcomer').room, self.room)
+
+    def test_join_returning_host(self):
+        # SAVEPOINT, room id, host column, participant update, RELEASE
+        with self.assertNumQueries(5):
+            persist_participant_join_db_ops('budget', 'client-3', 'Client 3', True)
+        self.assertEqual(Room.objects.get(name='budget').host_client_id, 'client-3')
+        self.assertTrue(Participant.objects.get(client_id='client-3').is_host)
+
+    def test_join_rolls_back_as_a_whole(self):
+        # A failure inside the transaction leaves neither the host column nor the participant row behind.
+        with self.assertRaises(Exception):
+            persist_participant_join_db_ops('budget', 'newcomer', None, True) # display_name is NOT NULL
+        self.assertIsNone(Room.objects.get(name='budget').host_client_id)
+        self.assertFalse(Participant.objects.filter(client_id='newcomer').exists())
+
+
+class RosterTests(SignalingTestCase):
+    async def test_deltas_are_numbered_consecutively_from_the_snapshot(self):
+        async with stand_in_sfu():
+            host = await connect('roster', 'host')
+            seq = (await receive_until(host, 'joinState'))['data']['participantsSeq']
+            others = []
+            for client_id in ('a', 'b', 'c'):
+                others.append(await connect('roster', client_id))
+                await receive_until(others[-1], 'joinState')
+            joined, seqs = set(), []
+            while not joined >= {'a', 'b', 'c'}:
+                delta = (await receive_until(host, 'participantListDelta'))['data']
+                if delta['seq'] <= seq:
+                    continue # Already reflected in the snapshot (the host's own join may be)
+                seqs.append(delta['seq'])
+                joined.update(c['participant']['client_id'] for c in delta['changes'] if c['op'] == 'join')
+            self.assertEqual(seqs, list(range(seq + 1, seq + 1 + len(seqs))))
+            for communicator in [host] + others:
+                await communicator.disconnect()
+
+    @override_settings(ROSTER_BROADCAST_DEBOUNCE_SECONDS=0.3)
+    async def test_changes_within_the_window_are_coalesced(self):
+        async with stand_in_sfu():
+            host = await connect('coalesce', 'host')
+            await receive_until(host, 'participantListDelta') # The host's own join
+            a = await connect('coalesce', 'a')
+            await a.send_json_to({'type': 'updateDisplayName', 'data': {'displayName': 'Alice'}})
+            await receive_until(a, 'displayNameUpdated')
+            delta = (await receive_until(host, 'participantListDelta'))['data']
+            self.assertEqual(delta['changes'], [{'op': 'join', 'participant': {'client_id': 'a', 'display_name': 'Alice', 'is_host': False}}])
+            await a.disconnect()
+            await host.disconnect()
+
+    @override_settings(ROSTER_LARGE_ROOM={'threshold': 4, 'exit_ratio': 0.8, 'count_interval': 0.02, 'page_size': 2})
+    async def test_large_rooms_send_attendees_counts_and_pages(self):
+        async with stand_in_sfu():
+            host = await connect('webinar', 'host')
+            await receive_until(host, 'joinState')
+            attendees = []
+            for i in range(5):
+                attendees.append(await connect('webinar', f'a{i}'))
+                state = (await receive_until(attendees[-1], 'joinState'))['data']
+            self.assertEqual((state['rosterMode'], state['participantCount']), ('count', 6))
+            self.assertEqual([p['client_id'] for p in state['participants']], ['host'])
+
+            count = (await receive_until(attendees[0], 'participantCount'))['data']
+            self.assertEqual((count['rosterMode'], count['host']['hostClientId']), ('count', 'host'))
+            await receive_until(host, 'participantListDelta') # The host still gets every change
+            await attendees[0].send_json_to({'type': 'requestParticipantPage', 'data': {'offset': 0, 'limit': 50}})
+            page = (await receive_until(attendees[0], 'participantPage'))['data']
+            self.assertEqual((len(page['participants']), page['total'], page['nextOffset']), (2, 6, 2))
+
+            for communicator in attendees[2:]:
+                await communicator.disconnect()
+            snapshot = await receive_until(attendees[0], 'participantList') # Down to 3 <= 4 * 0.8: full rosters again
+            self.assertEqual({p['client_id'] for p in snapshot['data']}, {'host', 'a0', 'a1'})
+            for communicator in [host] + attendees[:2]:
+                await communicator.disconnect()
+
+
+class PrewarmViewTests(TestCase):
+    def test_anonymous_callers_are_refused(self):
+        for url in ('/api/interview/rooms/prewarm/', '/api/interview/rooms/prewarm/expire/'):
+            response = self.client.post(url, {'rooms': ['warm']}, content_type='application/json')
+            self.assertIn(response.status_code, (401, 403), url)
+        self.assertFalse(Room.objects.exists())
+
+    def test_staff_may_expire_warmed_rooms(self):
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        response = self.client.post('/api/interview/rooms/prewarm/expire/')
+        self.assertEqual(response.status_code, 200)
+
+
+class ReceiveTests(SignalingTestCase):
+    async def assert_survives(self, communicator, **frame):
+        await communicator.send_to(**frame)
+        self.assertEqual((await receive_until(communicator, 'error'))['message'], 'Malformed message.')
+        await communicator.send_json_to({'type': 'requestParticipantList'})
+        await receive_until(communicator, 'participantList')
+
+    async def test_non_string_message_types_are_rejected(self):
+        async with stand_in_sfu():
+            client = await connect('malformed', 'host')
+            await receive_until(client, 'joinState')
+            for message_type in (['x'], {'a': 1}, None, 3):
+                await self.assert_survives(client, text_data=json.dumps({'type': message_type}))
+            await client.disconnect()
+
+    async def test_frames_that_are_not_message_objects_are_rejected(self):
+        async with stand_in_sfu():
+            client = await connect('not-objects', 'host')
+            await receive_until(client, 'joinState')
+            for text in ('[1, 2]', '"hi"', '3', 'null'):
+                await self.assert_survives(client, text_data=text)
+            await client.disconnect()
+
+    @unittest.skipIf(codec._msgpack is None, "msgpack is not installed")
+    def test_binary_frames_with_an_invalid_type_do_not_decode(self):
+        with self.assertRaises(codec.DecodeError):
+            codec.decode_binary(b'\x92\x91\x01\x80') # [[1], {}]
+
+
+class FanOutTests(SignalingTestCase):
+    @unittest.skipIf(codec._msgpack is None, "msgpack is not installed")
+    async def test_every_recipient_decodes_the_same_payload(self):
+        message = {'type': 'newProducer', 'data': {'clientId': 'host', 'producerId': 'p1', 'kind': 'video', 'appData': {'n': 1.5, 'tags': ['a', 'é']}}}
+        async with stand_in_sfu():
+            json_clients = [await connect('fan-out', client_id) for client_id in ('host', 'a')]
+            binary_client = await connect('fan-out', 'b', subprotocols=[codec.BINARY_SUBPROTOCOL])
+            for client in json_clients:
+                await receive_until(client, 'joinState')
+            await get_channel_layer().group_send(room_group_name('fan-out'), codec.encode_group_event(message))
+            received = [await receive_until(client, 'newProducer') for client in json_clients]
+            while True:
+                decoded = codec.decode_binary((await binary_client.receive_output(2))['bytes'])
+                if decoded['type'] == 'newProducer':
+                    received.append(decoded)
+                    break
+            self.assertEqual(received, [message] * 3)
+            for client in (*json_clients, binary_client):
+                await client.disconnect()
+
+
+class BatchConsumeTests(SignalingTestCase):
+    async def test_one_bad_id_fails_its_item_not_the_batch(self):
+        async with stand_in_sfu():
+            host = await connect('batch', 'host')
+            await receive_until(host, 'joinState')
+            send_transport = await create_transport(host)
+            producer_ids = []
+            for kind in ('audio', 'video'):
+                await host.send_json_to({'type': 'produce', 'data': {'transportId': send_transport, 'kind': kind, 'rtpParameters': {}}})
+                producer_ids.append((await receive_until(host, 'produced'))['data']['producerId'])
+            attendee = await connect('batch', 'attendee')
+            await receive_until(attendee, 'joinState')
+            recv_transport = await create_transport(attendee, connected=False)
+
+            await attendee.send_json_to({'type': 'consumeAll', 'data': {'transportId': recv_transport, 'rtpCapabilities': {}, 'producerIds': [producer_ids[0], 'missing', producer_ids[1]]}})
+            consumed = (await receive_until(attendee, 'consumedAll'))['data']
+            self.assertEqual([consumer['producerId'] for consumer in consumed['consumers']], producer_ids)
+            self.assertEqual([error['producerId'] for error in consumed['errors']], ['missing'])
+
+            consumer_ids = [consumer['id'] for consumer in consumed['consumers']]
+            await attendee.send_json_to({'type': 'resumeConsumers', 'data': {'consumerIds': [consumer_ids[0], 'missing', consumer_ids[1]]}})
+            resumed = (await receive_until(attendee, 'consumersResumed'))['data']
+            self.assertEqual(resumed['consumerIds'], consumer_ids)
+            self.assertEqual([error['consumerId'] for error in resumed['errors']], ['missing'])
+
+            await attendee.send_json_to({'type': 'consumeAll', 'data': {'transportId': recv_transport, 'rtpCapabilities': {}}})
+            consumed = (await receive_until(attendee, 'consumedAll'))['data'] # Defaults to every producer but the attendee's own
+            self.assertEqual(sorted(consumer['producerId'] for consumer in consumed['consumers']), sorted(producer_ids))
+            for client in (attendee, host):
+                await client.disconnect()
+
+
+class SfuEventsTests(SignalingTestCase):
+    async def test_server_sent_events_are_parsed(self):
+        async def lines():
+            for line in (': heartbeat', 'event: producerClosed', 'data: {"a":', 'data: 1}', '', '', 'data: x', ''):
+                yield line
+
+        self.assertEqual([event async for event in _parse_sse(lines())], [('producerClosed', '{"a":\n1}'), ('message', 'x')])
+
+    async def produce(self, host, transport_id, kind):
+        await host.send_json_to({'type': 'produce', 'data': {'transportId': transport_id, 'kind': kind, 'rtpParameters': {}}})
+        return (await receive_until(host, 'produced'))['data']['producerId']
+
+    @override_settings(MEDIASOUP_EVENTS={**settings.MEDIASOUP_EVENTS, 'enabled': False, 'reconnect_min': 0.01, 'reconnect_max': 0.02})
+    async def test_sfu_side_closures_reach_the_room_including_while_reconnecting(self):
+        async with stand_in_sfu() as sfu:
+            stream = SfuEventStream(sfu.url)
+            stream.ensure_started()
+            try:
+                await wait_for(lambda: stream.live)
+                host = await connect('sfu-events', 'host')
+                await receive_until(host, 'joinState')
+                transport_id = await create_transport(host)
+                audio, video, screen = [await self.produce(host, transport_id, kind) for kind in ('audio', 'video', 'video')]
+                await wait_for(lambda: len(stream.registry.producers_of('sfu-events', 'host')) == 3)
+
+                sfu.close_producer('sfu-events', 'host', audio) # As a transport failure on the Node side would
+                self.assertEqual((await receive_until(host, 'producerClosed'))['data']['producerId'], audio)
+
+                sfu.drop_event_streams()
+                await wait_for(lambda: not stream.live)
+                sfu.close_producer('sfu-events', 'host', video) # Missed: nobody is listening
+                await wait_for(lambda: stream.live)
+                self.assertEqual(stream.reconnects, 1)
+                self.assertEqual((await receive_until(host, 'producerClosed'))['data']['producerId'], video) # From the snapshot diff
+
+                sfu.close_room({}, 'sfu-events') # Closes the router without reporting each producer
+                self.assertEqual((await receive_until(host, 'producerClosed'))['data']['producerId'], screen)
+                self.assertNotIn('sfu-events', stream.registry.rooms)
+                self.assertEqual(get_room_state('sfu-events').producers, {})
+                await host.disconnect()
+            finally:
+                await stream.stop()
+
+
+class CapabilitiesTests(SignalingTestCase):
+    async def test_clients_holding_the_current_hash_are_not_sent_the_capabilities_again(self):
+        async with stand_in_sfu():
+            host = await connect('caps', 'host')
+            first = (await receive_until(host, 'joinState'))['data']
+            caps_hash = first['routerRtpCapabilitiesHash']
+            self.assertEqual(caps_hash, capabilities.capabilities_hash(first['routerRtpCapabilities']))
+
+            cached = await connect('caps', 'cached', query=f'joinState=1&capsHash={caps_hash}')
+            state = (await receive_until(cached, 'joinState'))['data']
+            self.assertEqual((state['routerRtpCapabilities'], state['routerRtpCapabilitiesHash']), (None, caps_hash))
+
+            stale = await connect('caps', 'stale', query='joinState=1&capsHash=0123456789abcdef')
+            state = (await receive_until(stale, 'joinState'))['data']
+            self.assertEqual((state['routerRtpCapabilities'], state['routerRtpCapabilitiesHash']), (first['routerRtpCapabilities'], caps_hash))
+            for client in (stale, cached, host):
+                await client.disconnect()
+
+
+class SessionResumeTests(SignalingTestCase):
+    async def test_resume_with_token_and_refuse_a_reused_one(self):
+        async with stand_in_sfu():
+            host = await connect('resume', 'host')
+            token = (await receive_until(host, 'joinState'))['data']['resumeToken']
+            attendee = await connect('resume', 'attendee')
+            await receive_until(attendee, 'joinState')
+
+            await host.disconnect(code=1006) # Dropped, not closed: the session is kept
+            host = await connect('resume', 'host', f'joinState=1&resume={token}')
+            resumed = (await receive_until(host, 'sessionResumed'))['data']
+            self.assertTrue(resumed['isHost'])
+            self.assertNotEqual(resumed['resumeToken'], token)
+
+            await host.disconnect(code=1006)
+            host = await connect('resume', 'host', f'joinState=1&resume={token}') # Tokens are single use
+            await receive_until(host, 'resumeFailed')
+            self.assertNotEqual((await receive_until(host, 'joinState'))['data']['resumeToken'], resumed['resumeToken'])
+            await host.disconnect()
+            await attendee.disconnect()
+
+
+class EndRoomTests(SignalingTestCase):
+    def test_anonymous_callers_are_refused(self):
+        response = self.client.post('/api/interview/rooms/live/end/')
+        self.assertIn(response.status_code, (401, 403))
+
+    async def test_only_attached_clients_are_marked_ended(self):
+        state = get_room_state('ending')
+        await state.join('attached', 'channel-1')
+        await state.join('dropped', 'channel-2')
+        self.assertTrue(await state.detach('dropped', 'channel-2', 60, None))
+        ended = await state.end()
+        self.assertEqual(set(ended['client_ids']), {'attached', 'dropped'})
+        self.assertEqual(state.ended, {'attached'}) # 'dropped' has no socket left to call leave()
+
+
+@override_settings(MEDIASOUP_CALL_POLICY={**settings.MEDIASOUP_CALL_POLICY, 'breaker_failures': 2, 'breaker_cooldown': 0.05, 'retries': 0})
+class CircuitBreakerTests(TestCase):
+    async def test_opens_after_consecutive_failures_and_recovers_through_a_trial(self):
+        breaker = get_breaker('http://breaker-test:1')
+
+        async def fail():
+            raise httpx.ConnectError("refused")
+
+        for _ in range(2):
+            with self.assertRaises(httpx.ConnectError):
+                await sfu_resilience.call(fail, breaker.node, 'POST', '/rooms/:id/close')
+        self.assertEqual(breaker.state, sfu_resilience.OPEN)
+        with self.assertRaises(SfuUnavailable):
+            await sfu_resilience.call(fail, breaker.node, 'POST', '/rooms/:id/close')
+
+        await asyncio.sleep(0.06)
+        self.assertTrue(breaker.before_call()) # The half-open trial
+        self.assertEqual(breaker.state, sfu_resilience.HALF_OPEN)
+        with self.assertRaises(SfuUnavailable):
+            breaker.before_call() # One trial at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, sfu_resilience.OPEN)
+
+        await asyncio.sleep(0.06)
+        response = await sfu_resilience.call(lambda: asyncio.sleep(0, httpx.Response(200)), breaker.node, 'GET', '/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(breaker.state, sfu_resilience.CLOSED)
+
+    def test_batch_endpoints_keep_their_own_label(self):
+        self.assertEqual(sfu_endpoint_label('/rooms/r/clients/c/consumers/resume-batch'), '/rooms/:id/clients/:id/consumers/resume-batch')
+        self.assertEqual(sfu_endpoint_label('/rooms/r/clients/c/consumers/k1/resume'), '/rooms/:id/clients/:id/consumers/:id/resume')
+
+
+class SfuPathTests(SignalingTestCase):
+    def test_unknown_paths_share_one_label(self):
+        self.assertEqual(sfu_endpoint_label('/rooms/r/clients/c/consumers/a/b/c/d/resume'), 'other')
+        self.assertEqual(sfu_endpoint_label('/stats'), 'other')
+        self.assertEqual(sfu_endpoint_label(f'/rooms/r/clients/c/consumers/{sfu_id("a/b/c/d")}/resume'), '/rooms/:id/clients/:id/consumers/:id/resume')
+
+    async def test_client_supplied_ids_cannot_reach_another_endpoint(self):
+        async with stand_in_sfu() as sfu:
+            client = await connect('quoted-ids', 'host')
+            await receive_until(client, 'joinState')
+            await client.send_json_to({'type': 'resumeConsumer', 'data': {'consumerId': '../../../close?'}})
+            self.assertEqual((await receive_until(client, 'error'))['requestType'], 'resumeConsumer')
+            self.assertIn('quoted-ids', sfu.rooms) # Not closed by '/rooms/quoted-ids/clients/host/consumers/../../../close?/resume'
+            await client.disconnect()
+
+
+class AdmissionTests(SignalingTestCase):
+    @override_settings(SIGNALING_RATE_LIMITS={'*': (30, 60), 'requestParticipantList': (0.01, 2)})
+    async def test_messages_over_the_rate_limit_are_refused(self):
+        async with stand_in_sfu():
+            client = await connect('limited', 'host')
+            await receive_until(client, 'joinState')
+            for _ in range(2):
+                await client.send_json_to({'type': 'requestParticipantList'})
+                await receive_until(client, 'participantList')
+            await client.send_json_to({'type': 'requestParticipantList'})
+            error = await receive_until(client, 'error')
+            self.assertEqual((error['message'], error['requestType']), ('Rate limit exceeded.', 'requestParticipantList'))
+            self.assertGreater(error['retryAfter'], 0)
+            await client.disconnect()
+
+    @override_settings(SFU_CONCURRENCY={'process': 1, 'room': 1, 'queue_timeout': 0.05})
+    async def test_calls_releasing_sfu_resources_are_not_capped(self):
+        async with sfu_slot('/rooms/capped/clients/a/transports'):
+            with self.assertRaises(SfuOverloaded):
+                async with sfu_slot('/rooms/capped/clients/b/transports'):
+                    pass
+            async with sfu_slot('/rooms/capped/clients/a/disconnected'):
+                pass
+
+    @override_settings(SFU_CONCURRENCY={'process': 1, 'room': 1, 'queue_timeout': 1.0})
+    async def test_an_open_breaker_fails_before_waiting_for_a_slot(self):
+        node = 'http://breaker-slot-test:1'
+        breaker = get_breaker(node)
+        breaker.state, breaker.opened_at = sfu_resilience.OPEN, time.monotonic()
+        async with sfu_slot('/rooms/busy/clients/a/transports'):
+            started = time.monotonic()
+            with self.assertRaises(SfuUnavailable):
+                await mediasoup_request('GET', '/rooms/busy/router-rtp-capabilities', node=node)
+            self.assertLess(time.monotonic() - started, 0.5)
+
+
+class ReaperTests(SignalingTestCase):
+    def test_rooms_are_idle_from_when_their_last_participant_left(self):
+        now = timezone.now()
+        long_ago = now - datetime.timedelta(days=7)
+        Room.objects.create(name='old-and-idle')
+        Room.objects.create(name='old-just-emptied')
+        Room.objects.filter(name__startswith='old-').update(created_at=long_ago, last_left_at=long_ago)
+        persist_participant_join_db_ops('old-just-emptied', 'leaver', 'Leaver', False)
+        persist_participant_leave_db_ops('old-just-emptied', 'leaver', False)
+
+        removed = reap_db_ops(now, set())
+        self.assertEqual(removed['rooms'], 1)
+        self.assertEqual(list(Room.objects.values_list('name', flat=True)), ['old-just-emptied'])
+
+    async def test_a_host_left_over_from_before_a_restart_is_dropped(self):
+        await Room.objects.acreate(name='restarted', host_client_id='ghost')
+        await Room.objects.acreate(name='host-away', host_client_id='ghost')
+        restarted, away = get_room_state('restarted'), get_room_state('host-away')
+        self.assertFalse((await restarted.join('attendee', 'channel-1'))['is_host']) # 'ghost' still holds the role
+        await away.join('ghost', 'channel-2')
+        await away.join('attendee', 'channel-3')
+        self.assertTrue(await away.detach('ghost', 'channel-2', 60, None)) # May still resume: keeps the role
+
+        async with stand_in_sfu():
+            await Reaper().sweep()
+        self.assertEqual((restarted.host_client_id, away.host_client_id), (None, 'ghost'))
+        self.assertTrue((await restarted.join('next', 'channel-4'))['is_host'])
+        await restarted.flush()
+        self.assertEqual((await Room.objects.aget(name='restarted')).host_client_id, 'next')
+
+
+class TracingTests(TestCase):
+    def test_clients_cannot_force_a_trace_unless_allowed(self):
+        self.assertIsNone(tracing.start_trace('room', 'client', forced=True))
+        with override_settings(SIGNALING_TRACING={**settings.SIGNALING_TRACING, 'allow_forced': True}):
+            self.assertIsNotNone(tracing.start_trace('room', 'client', forced=True))
+
+    def test_only_the_newest_trace_files_are_kept(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(SIGNALING_TRACING={**settings.SIGNALING_TRACING, 'dir': directory, 'max_files': 3}):
+            paths = []
+            for i in range(5):
+                paths.append(tracing.write_trace(tracing.Trace('room', f'client-{i}')))
+                os.utime(paths[-1], (i, i)) # Distinct mtimes, oldest first
+        self.assertEqual(sorted(os.listdir(directory)), sorted(os.path.basename(path) for path in paths[-3:]))
+
+
+class SfuStandInTests(TestCase):
+    async def test_injected_failures_are_answered_with_a_500(self):
+        sfu = await SfuStandIn(failure_rate=1.0).start()
+        try:
+            async with httpx.AsyncClient(base_url=sfu.url) as client:
+                response = await client.get('/rooms/standin/router-rtp-capabilities')
+            self.assertEqual((response.status_code, sfu.failures_injected), (500, 1))
+        finally:
+            await sfu.stop()
+
+
+@override_settings(
+    MEDIASOUP_EVENTS={**settings.MEDIASOUP_EVENTS, 'enabled': False},
+    REAPER={**settings.REAPER, 'enabled': False},
+    LOOP_WATCHDOG={**settings.LOOP_WATCHDOG, 'enabled': False},
+)
+class LoadTestCommandTests(TransactionTestCase): # The command runs its own event loop and DB threads
+    def test_a_small_run_reports_joins_and_cleans_up(self):
+        out = io.StringIO()
+        call_command('loadtest', rooms=2, clients=3, producers=2, sfu_latency_ms=0, sfu_jitter_ms=0, timeout=5, stdout=out)
+        report = out.getvalue()
+        self.assertIn('6/6 connected, 0 failed', report)
+        self.assertIn('join latency ms', report)
+        self.assertRegex(report, r'\nconsume\s+8\s+0\s') # 2 rooms x 2 attendees x 2 producers, no errors
+        self.assertFalse(Room.objects.filter(name__startswith='loadtest-').exists())
+
+
+class SingleFlightTests(TestCase):
+    async def test_concurrent_identical_reads_share_one_call(self):
+        flight, release, calls = SingleFlight(), asyncio.Event(), []
+
+        async def read():
+            calls.append(1)
+            await release.wait()
+            return {'producers': []}
+
+        waiters = [asyncio.ensure_future(flight.do('key', read, ttl=5)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(await flight.do('key', read, ttl=5), results[0]) # Served from the TTL cache
+        self.assertEqual((len(calls), flight.stats()['shared'], flight.stats()['cache_hits']), (1, 4, 1))
+
+    async def test_a_failure_reaches_every_waiter_and_is_not_cached(self):
+        flight, release, calls = SingleFlight(), asyncio.Event(), []
+
+        async def read():
+            calls.append(1)
+            await release.wait()
+            raise SfuUnavailable("down")
+
+        waiters = [asyncio.ensure_future(flight.do('key', read, ttl=5)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, SfuUnavailable) for result in results))
+        with self.assertRaises(SfuUnavailable):
+            await flight.do('key', read, ttl=5)
+        self.assertEqual(len(calls), 2) # Retried, not replayed from the cache
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+
+class PlacementTests(SignalingTestCase):
+    NODES = [f'http://127.0.0.1:{port}' for port in (1, 2, 3)] # Nothing listens: health polls fail, but not twice in a test
+
+    def test_a_room_maps_to_the_same_node_every_time(self):
+        for room in ('alpha', 'beta', 'gamma'):
+            self.assertEqual(len({Placement(self.NODES).choose(room) for _ in range(3)}), 1)
+        self.assertEqual(Placement(self.NODES).choose('alpha'), Placement(list(reversed(self.NODES))).choose('alpha'))
+
+    def test_adding_a_node_moves_about_one_in_n_rooms_all_onto_it(self):
+        rooms = [f'room-{i}' for i in range(2000)]
+        before, after = Placement(self.NODES), Placement(self.NODES + ['http://127.0.0.1:4'])
+        moved = [room for room in rooms if before.choose(room) != after.choose(room)]
+        self.assertEqual({after.choose(room) for room in moved}, {'http://127.0.0.1:4'})
+        self.assertAlmostEqual(len(moved) / len(rooms), 1 / 4, delta=0.08)
+
+    async def test_a_room_stays_on_its_persisted_node(self):
+        placement = Placement(self.NODES)
+        pinned = next(url for url in self.NODES if url != placement.choose('pinned'))
+        await Room.objects.acreate(name='pinned', sfu_node=pinned)
+        try:
+            self.assertEqual(await placement.node_for(get_room_state('pinned')), pinned)
+            placement.nodes[pinned].healthy = False # Moved only once its node stops answering
+            replacement = placement.choose('pinned')
+            self.assertNotEqual(replacement, pinned)
+            self.assertEqual(await placement.node_for(get_room_state('pinned')), replacement)
+            await get_room_state('pinned').flush()
+            self.assertEqual((await Room.objects.aget(name='pinned')).sfu_node, replacement)
+        finally:
+            await placement.stop()
+            await close_sfu_clients()
+
+
+class SfuClientTests(TestCase):
+    async def test_sequential_requests_reuse_one_keep_alive_connection(self):
+        async with stand_in_sfu() as sfu:
+            client = get_sfu_client(sfu.url)
+            for _ in range(5):
+                (await client.request('GET', '/stats')).raise_for_status()
+            stats = client.stats.as_dict()
+            self.assertEqual((stats['requests'], stats['connects'], stats['pool_hits']), (5, 1, 4))
+
+    async def test_requests_beyond_max_connections_are_counted_as_waits(self):
+        async with stand_in_sfu(latency=0.05) as sfu:
+            with override_settings(MEDIASOUP_HTTP_POOL={**settings.MEDIASOUP_HTTP_POOL, 'max_connections': 2}):
+                client = get_sfu_client(sfu.url)
+                await asyncio.gather(*[client.request('GET', '/stats') for _ in range(5)])
+            self.assertEqual((client.stats.connects, client.stats.waits), (2, 3))
+
+
+class LifespanTests(SignalingTestCase):
+    async def test_a_failed_startup_is_logged_retried_and_does_not_refuse_sockets(self):
+        calls = []
+
+        async def failing_hook():
+            calls.append(1)
+            raise RuntimeError("startup failed")
+
+        lifespan.on_startup(failing_hook)
+        try:
+            async with stand_in_sfu():
+                with self.assertLogs('interview_app.consumers', 'ERROR'):
+                    first = await connect('lifespan', 'a')
+                    await receive_until(first, 'joinState')
+                second = await connect('lifespan', 'b')
+                await receive_until(second, 'joinState')
+                self.assertEqual(len(calls), 2) # Not replayed from a cached failure
+                await first.disconnect()
+                await second.disconnect()
+        finally:
+            lifespan._startup_hooks.remove(failing_hook)
+
+
+HUB_SCRIPT = """
+import asyncio, sys
+from interview_app.channel_layer import ChannelHub, acquire_hub_lock
+
+async def main(path):
+    lock = acquire_hub_lock(path)
+    hub = ChannelHub(path)
+    await hub.start()
+    print('ready', flush=True)
+    await hub.server.serve_forever()
+
+asyncio.run(main(sys.argv[1]))
+"""
+
+
+class LocalHubChannelLayerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'hub.sock')
+        self.layers = []
+
+    def layer(self, **kwargs):
+        layer = LocalHubChannelLayer(path=self.path, connect_timeout=2.0, **kwargs)
+        self.layers.append(layer)
+        return layer
+
+    async def close_layers(self):
+        for layer in self.layers:
+            await layer.close()
+            if layer._hub is not None:
+                layer._hub.stop_thread()
+            if layer._lock_file is not None:
+                layer._lock_file.close()
+
+    async def receive(self, layer, channel, timeout=1.0):
+        return await asyncio.wait_for(layer.receive(channel), timeout)
+
+    async def test_send_and_receive_within_and_across_workers(self):
+        a, b = self.layer(), self.layer()
+        try:
+            channel_a, channel_b = await a.new_channel(), await b.new_channel()
+            await b.sync() # The hub knows b before a sends to it
+            await a.send(channel_a, {'type': 'local'})
+            self.assertEqual(await self.receive(a, channel_a), {'type': 'local'})
+            await a.send(channel_b, {'type': 'remote', 'data': b'\x00bytes'})
+            self.assertEqual(await self.receive(b, channel_b), {'type': 'remote', 'data': b'\x00bytes'})
+        finally:
+            await self.close_layers()
+
+    async def test_group_send_reaches_members_of_both_workers_once(self):
+        a, b = self.layer(), self.layer()
+        try:
+            channel_a, channel_b = await a.new_channel(), await b.new_channel()
+            await a.group_add('room', channel_a)
+            await b.group_add('room', channel_b)
+            await b.sync()
+            await a.group_send('room', {'type': 'hello'})
+            self.assertEqual(await self.receive(a, channel_a), {'type': 'hello'})
+            self.assertEqual(await self.receive(b, channel_b), {'type': 'hello'})
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.receive(b, channel_b, timeout=0.1)
+        finally:
+            await self.close_layers()
+
+    async def test_group_membership_expires(self):
+        a, b = self.layer(group_expiry=0.2), self.layer(group_expiry=0.2)
+        try:
+            channel_a, channel_b = await a.new_channel(), await b.new_channel()
+            await a.group_add('room', channel_a)
+            await b.group_add('room', channel_b)
+            await b.sync()
+            await asyncio.sleep(0.3)
+            await a.group_send('room', {'type': 'late'})
+            for layer, channel in ((a, channel_a), (b, channel_b)):
+                with self.assertRaises(asyncio.TimeoutError):
+                    await self.receive(layer, channel, timeout=0.1)
+        finally:
+            await self.close_layers()
+
+    async def test_a_full_channel_refuses_sends(self):
+        a = self.layer(capacity=2)
+        try:
+            channel = await a.new_channel()
+            for i in range(2):
+                await a.send(channel, {'type': 'fill', 'n': i})
+            with self.assertRaises(ChannelFull):
+                await a.send(channel, {'type': 'overflow'})
+        finally:
+            await self.close_layers()
+
+    async def test_a_dead_in_process_hub_is_restarted(self):
+        a = self.layer()
+        try:
+            channel = await a.new_channel()
+            a._hub.stop_thread()
+            os.unlink(self.path)
+            await a._reader_task # The hub's side of the connection is gone
+            await a.group_add('room', channel) # Reconnects through a fresh hub thread instead of spinning
+            self.assertTrue(a._hub.serving())
+        finally:
+            await self.close_layers()
+
+    async def test_an_unreachable_hub_fails_within_the_connect_timeout(self):
+        a = self.layer(autostart=False)
+        a.connect_timeout = 0.2
+        started = time.monotonic()
+        with self.assertRaises(ConnectionError):
+            await a.new_channel()
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    async def test_a_worker_takes_over_the_hub_when_its_process_dies(self):
+        hub_process = subprocess.Popen([sys.executable, '-c', HUB_SCRIPT, self.path], cwd=settings.BASE_DIR, stdout=subprocess.PIPE)
+        self.addCleanup(hub_process.kill)
+        self.assertEqual(hub_process.stdout.readline().strip(), b'ready')
+        a, b = self.layer(), self.layer()
+        try:
+            channel_b = await b.new_channel()
+            await b.group_add('room', channel_b)
+            await b.sync()
+            await a.group_send('room', {'type': 'before'})
+            self.assertEqual(await self.receive(b, channel_b), {'type': 'before'})
+            self.assertIsNone(a._hub) # Served by the other process
+
+            hub_process.kill()
+            hub_process.wait()
+            for _ in range(100): # Both workers reconnect by themselves; one of them now runs the hub
+                if any(layer._hub is not None and layer._hub.serving() for layer in (a, b)) and a._writer and b._writer:
+                    break
+                await asyncio.sleep(0.02)
+            else:
+                self.fail("No worker took over the hub")
+            await b.sync()
+            await a.group_send('room', {'type': 'after'})
+            self.assertEqual(await self.receive(b, channel_b), {'type': 'after'})
+        finally:
+            await self.close_layers()
@@ -0,0 +1,172 @@
+# interview_app/tracing.py
+# Opt-in per-session tracing (SIGNALING_TRACING). A traced session records
+# spans for connect(), each message handler, each mediasoup_request, each room
+# state operation and each *_db_ops helper it causes, and writes them on
+# disconnect to <dir>/<room>-<client>-<start>.json in the Chrome trace event
+# format (chrome://tracing, https://ui.perfetto.dev).
+#
+# Sessions are traced when sampled (sample_rate) or, if allow_forced is set,
+# when the client connects with ?trace=1; only the newest max_files trace files
+# are kept. The session's Trace lives in a context variable, so tasks the
+# handlers start inherit it; the room actor carries it over explicitly for the
+# operations (and write-behind DB helpers) it runs on a session's behalf.
+# Handlers are recorded as complete ('X') events on the session's thread row;
+# SFU, room state and DB spans can overlap, so they are async ('b'/'e') events.
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('interview_trace', default=None)
+
+
+class Trace:
+    def __init__(self, room_name, client_id):
+        self.room_name = room_name
+        self.client_id = client_id
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.events = []
+        self.dropped = 0
+        self._next_id = 0
+
+    def _now_us(self):
+        return round((time.perf_counter() - self._origin) * 1e6, 1)
+
+    def _add(self, event):
+        if len(self.events) >= settings.SIGNALING_TRACING['max_events']:
+            self.dropped += 1
+            return
+        self.events.append(event)
+
+    def complete(self, name, cat, start_us, args=None):
+        self._add({'name': name, 'cat': cat, 'ph': 'X', 'ts': start_us, 'dur': round(self._now_us() - start_us, 1),
+                   'pid': 1, 'tid': 1, 'args': args or {}})
+
+    def begin_async(self, name, cat, args=None):
+        self._next_id += 1
+        self._add({'name': name, 'cat': cat, 'ph': 'b', 'id': self._next_id, 'ts': self._now_us(), 'pid': 1, 'tid': 1, 'args': args or {}})
+        return self._next_id
+
+    def end_async(self, span_id, name, cat, args=None):
+        self._add({'name': name, 'cat': cat, 'ph': 'e', 'id': span_id, 'ts': self._now_us(), 'pid': 1, 'tid': 1, 'args': args or {}})
+
+    def document(self):
+        label = f'{self.room_name}/{self.client_id}'
+        return {
+            'traceEvents': [
+                {'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': label}},
+                {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': 'signaling'}},
+            ] + self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'room': self.room_name, 'client': self.client_id, 'startedAt': self.started_at, 'droppedEvents': self.dropped},
+        }
+
+
+def start_trace(room_name, client_id, forced=False):
+    """A Trace for a new session if it is forced or sampled, else None."""
+    config = settings.SIGNALING_TRACING
+    if not (forced and config['allow_forced']) and random.random() >= config['sample_rate']:
+        return None
+    return Trace(room_name, client_id)
+
+
+def current():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(trace):
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(name, cat, **args):
+    """Record the block as a handler span ('X') on the current trace, if any."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = trace._now_us()
+    try:
+        yield
+    except BaseException as e:
+        args['error'] = type(e).__name__
+        raise
+    finally:
+        trace.complete(name, cat, start, args)
+
+
+@contextlib.contextmanager
+def async_span(name, cat, trace=None, **args):
+    """Record the block as an async span ('b'/'e'), for work that may overlap other spans."""
+    trace = trace or _current.get()
+    if trace is None:
+        yield
+        return
+    span_id = trace.begin_async(name, cat, args)
+    end_args = {}
+    try:
+        yield
+    except BaseException as e:
+        end_args['error'] = type(e).__name__
+        raise
+    finally:
+        trace.end_async(span_id, name, cat, end_args)
+
+
+def record(name, cat, started, **args):
+    """Record a handler span on the current trace from ``started`` (a time.perf_counter() value) until now."""
+    trace = _current.get()
+    if trace is not None:
+        trace.complete(name, cat, round((started - trace._origin) * 1e6, 1), args)
+
+
+def trace_future(name, cat, future, **args):
+    """Record from now until ``future`` completes (for operations handed to another task)."""
+    trace = _current.get()
+    if trace is not None:
+        span_id = trace.begin_async(name, cat, args)
+        future.add_done_callback(lambda f: trace.end_async(span_id, name, cat, {'error': 'failed'} if not f.cancelled() and f.exception() else {}))
+    return future
+
+
+def _safe(value):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(value))[:64]
+
+
+def write_trace(trace):
+    """Write ``trace`` as a Chrome trace JSON file (blocking; call off the event loop). Returns the path."""
+    directory = settings.SIGNALING_TRACING['dir']
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(trace.started_at))
+    path = os.path.join(directory, f'{_safe(trace.room_name)}-{_safe(trace.client_id)}-{stamp}-{os.getpid()}.json')
+    with open(path, 'w') as f:
+        json.dump(trace.document(), f, default=str)
+    _prune(directory, settings.SIGNALING_TRACING['max_files'])
+    return path
+
+
+def _prune(directory, max_files):
+    """Delete the oldest trace files beyond ``max_files``."""
+    with os.scandir(directory) as entries:
+        files = [entry for entry in entries if entry.is_file() and entry.name.endswith('.json')]
+    if len(files) <= max_files:
+        return
+    files.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in files[:len(files) - max_files]:
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass # Pruned concurrently by another worker
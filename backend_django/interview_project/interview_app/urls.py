@@ -1,6 +1,11 @@
 from django.urls import path
-# from . import views
+from . import views
 
 urlpatterns = [
-    # path('some-http-endpoint/', views.some_view, name='some_view'),
-]
\ No newline at end of file
+    path('metrics/', views.metrics, name='metrics'),
+    path('sfu-pool/', views.sfu_pool_stats, name='sfu_pool_stats'),
+    path('sfu-nodes/', views.sfu_nodes, name='sfu_nodes'),
+    path('rooms/prewarm/', views.prewarm_rooms, name='prewarm_rooms'),
+    path('rooms/prewarm/expire/', views.expire_prewarmed_rooms, name='expire_prewarmed_rooms'),
+    path('rooms/<str:room_name>/end/', views.end_room, name='end_room'),
+]
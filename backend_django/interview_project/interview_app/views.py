@@ -1,3 +1,70 @@
-from django.shortcuts import render
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
-# Create your views here.
+from . import metrics as metrics_registry
+from . import teardown
+from .placement import get_placement
+from .prewarm import expire_warmed_rooms, warm_rooms
+from .sfu_client import pool_stats
+from .sfu_resilience import get_breaker
+
+
+@api_view(['GET'])
+def sfu_pool_stats(request):
+    """Counters of the shared mediasoup HTTP pools (requests, hits, waits, connects)."""
+    return Response(pool_stats())
+
+
+@api_view(['GET'])
+def sfu_nodes(request):
+    """Placement's view of the SFU nodes: health, last reported load, rooms placed since that report, circuit breaker."""
+    return Response({
+        url: {'healthy': node.healthy, 'failures': node.failures, 'stats': node.stats, 'placedSinceCheck': node.placed,
+              'breaker': get_breaker(url).as_dict()}
+        for url, node in get_placement().nodes.items()
+    })
+
+
+def metrics(request):
+    """Prometheus scrape endpoint (text exposition format)."""
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser]) # Creates routers on the SFU: staff only
+def prewarm_rooms(request):
+    """Pre-provision rooms for scheduled interviews.
+
+    Body: {"rooms": [{"name": "...", "scheduledStart": "<ISO 8601>"} | "name", ...],
+           "ttlSeconds": optional, "concurrency": optional}
+    """
+    rooms = []
+    for entry in request.data.get('rooms') or []:
+        name, start = (entry, None) if isinstance(entry, str) else (entry.get('name'), entry.get('scheduledStart'))
+        scheduled_start = parse_datetime(start) if start else None
+        if not name or (start and scheduled_start is None):
+            return Response({'error': f'Invalid room entry: {entry!r}'}, status=status.HTTP_400_BAD_REQUEST)
+        rooms.append((name, scheduled_start))
+    if not rooms:
+        return Response({'error': 'No rooms given.'}, status=status.HTTP_400_BAD_REQUEST)
+    results = async_to_sync(warm_rooms)(rooms, request.data.get('concurrency'), request.data.get('ttlSeconds'))
+    return Response({'rooms': results})
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def expire_prewarmed_rooms(request):
+    """Close and delete warmed rooms that expired unused."""
+    return Response({'expired': async_to_sync(expire_warmed_rooms)()})
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser]) # Disconnects everyone in the room: staff only
+def end_room(request, room_name):
+    """End an interview: close every socket of the room, delete its participants and close the SFU router."""
+    return Response(async_to_sync(teardown.end_room)(room_name))
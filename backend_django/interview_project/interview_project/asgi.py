@@ -4,6 +4,8 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 # from channels.auth import AuthMiddlewareStack # If you add Django auth later
 import interview_app.routing # Make sure this import is correct
+from interview_app.lifespan import LifespanApp
+import interview_app.reaper # Registers the reaper's lifespan hooks
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'interview_project.settings')
 
@@ -11,5 +13,6 @@ application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": URLRouter( # Ensure this uses your routing
             interview_app.routing.websocket_urlpatterns
-        )
+        ),
+    "lifespan": LifespanApp(), # Startup/shutdown hooks, e.g. closing the shared SFU HTTP pool
 })
\ No newline at end of file
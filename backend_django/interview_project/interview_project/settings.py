@@ -44,6 +44,189 @@ INSTALLED_APPS = [
     'corsheaders',  # For handling CORS
 ]
 MEDIASOUP_NODE_URL = os.environ.get("MEDIASOUP_NODE_URL", "http://localhost:4000")
+# Several mediasoup nodes: comma-separated base URLs. Each room is placed on one of them
+# (interview_app/placement.py); empty means MEDIASOUP_NODE_URL alone.
+MEDIASOUP_NODES = [url.strip() for url in os.environ.get("MEDIASOUP_NODES", "").split(",") if url.strip()]
+MEDIASOUP_PLACEMENT = {
+    "virtual_nodes": 64,           # ring points per node
+    "choices": 2,                  # least loaded of the first N usable nodes on the ring
+    "max_rooms": int(os.environ.get("MEDIASOUP_NODE_MAX_ROOMS", "200")),
+    "max_consumers": int(os.environ.get("MEDIASOUP_NODE_MAX_CONSUMERS", "5000")),
+    "health_interval": 5.0,        # seconds between GET /stats polls
+    "health_timeout": 2.0,
+    "unhealthy_after": 2,          # consecutive failed polls before a node stops getting rooms
+}
+# Shared HTTP connection pool used for every call to the mediasoup Node.js server
+# (see interview_app/sfu_client.py). Per-SFU overrides are keyed by base URL.
+MEDIASOUP_HTTP_POOL = {
+    "timeout": float(os.environ.get("MEDIASOUP_HTTP_TIMEOUT", "10.0")),
+    "max_connections": int(os.environ.get("MEDIASOUP_HTTP_MAX_CONNECTIONS", "100")),
+    "max_keepalive_connections": int(os.environ.get("MEDIASOUP_HTTP_MAX_KEEPALIVE", "20")),
+    "keepalive_expiry": float(os.environ.get("MEDIASOUP_HTTP_KEEPALIVE_EXPIRY", "30.0")),
+    "http2": os.environ.get("MEDIASOUP_HTTP2", "0") == "1", # Needs the optional 'h2' package
+}
+MEDIASOUP_HTTP_POOL_OVERRIDES = {
+    # "http://sfu-2:4000": {"max_connections": 200},
+}
+# Deadlines, retries, hedging and circuit breaking for mediasoup REST calls
+# (interview_app/sfu_resilience.py). Endpoints are keyed by their metrics label
+# (interview_app/metrics.py sfu_endpoint_label); a deadline covers all attempts.
+MEDIASOUP_CALL_POLICY = {
+    "default_deadline": MEDIASOUP_HTTP_POOL["timeout"],
+    "deadlines": {
+        "/rooms/:id/router-rtp-capabilities": 3.0,
+        "/rooms/:id/clients/:id/producers": 1.5,
+        "/rooms/:id/clients/:id/transports": 4.0,
+        "/rooms/:id/clients/:id/transports/:id/connect": 4.0,
+        "/rooms/:id/clients/:id/transports/:id/produce": 4.0,
+        "/rooms/:id/clients/:id/transports/:id/consume": 3.0,
+        "/rooms/:id/clients/:id/transports/:id/consume-batch": 5.0,
+        "/rooms/:id/clients/:id/consumers/:id/resume": 2.0,
+        "/rooms/:id/clients/:id/consumers/resume-batch": 3.0,
+        "/rooms/:id/clients/:id/disconnected": 5.0,
+    },
+    # POSTs that are safe to repeat; GET and DELETE always are
+    "idempotent": frozenset({
+        "/rooms/:id/clients/:id/consumers/:id/resume",
+        "/rooms/:id/clients/:id/consumers/resume-batch",
+        "/rooms/:id/clients/:id/disconnected",
+        "/rooms/:id/close",
+    }),
+    "retries": 2,
+    "retry_backoff": 0.05,      # seconds before the first retry, doubling, +-50% jitter
+    "hedge_after": float(os.environ.get("MEDIASOUP_HEDGE_AFTER", "0.25")),  # 0 disables hedged GETs
+    "breaker_failures": 5,      # consecutive failures that open a node's breaker
+    "breaker_cooldown": 5.0,    # seconds open before a trial call is let through
+}
+# Concurrent mediasoup calls (interview_app/admission.py): per room and per process.
+# A call waits up to queue_timeout seconds for a slot, then fails instead of queueing on.
+SFU_CONCURRENCY = {
+    "process": int(os.environ.get("SFU_MAX_IN_FLIGHT", "256")),
+    "room": int(os.environ.get("SFU_MAX_IN_FLIGHT_PER_ROOM", "16")),
+    "queue_timeout": 2.0,
+}
+# Lifecycle event stream from the Node server (GET /events, interview_app/sfu_events.py).
+# While it is connected, joins read producers from the mirrored registry instead of the SFU.
+MEDIASOUP_EVENTS = {
+    "enabled": os.environ.get("MEDIASOUP_EVENTS", "1") == "1",
+    "connect_timeout": 5.0,
+    "read_timeout": 45.0,     # > 2 missed heartbeats (config.events.heartbeatMs on the Node side)
+    "reconnect_min": 0.5,
+    "reconnect_max": 30.0,
+}
+# Host producer listings fetched on join are shared for this long (seconds);
+# produce/closeProducer/disconnect invalidate them immediately (interview_app/singleflight.py)
+MEDIASOUP_PRODUCERS_CACHE_TTL = float(os.environ.get("MEDIASOUP_PRODUCERS_CACHE_TTL", "2.0"))
+# Room pre-warming (interview_app/prewarm.py): rooms warmed in parallel per
+# request, and how long past its scheduled start an unused warmed room is kept.
+PREWARM_CONCURRENCY = int(os.environ.get("PREWARM_CONCURRENCY", "8"))
+PREWARM_TTL_SECONDS = int(os.environ.get("PREWARM_TTL_SECONDS", "3600"))
+# Token buckets per client, (refill per second, burst), keyed by message type;
+# "*" counts every message from the client. Unlisted types only count towards "*".
+SIGNALING_RATE_LIMITS = {
+    "*": (30, 60),
+    "updateDisplayName": (0.5, 3),
+    "requestParticipantList": (1, 5),
+    "requestParticipantPage": (5, 20),
+    "createWebRtcTransport": (1, 4),
+    "connectTransport": (2, 6),
+    "produce": (2, 6),
+    "closeProducer": (2, 6),
+    "consume": (20, 60),
+    "resumeConsumer": (20, 60),
+    "consumeAll": (1, 5),
+    "resumeConsumers": (2, 10),
+    "endRoom": (0.2, 2),
+}
+# New joins are refused with 'serverBusy' and close code 1013 while this process holds more
+# than max_sockets sockets, more than max_sfu_waiting SFU calls are queued for a slot, or the
+# recent p90 event loop lag (LOOP_WATCHDOG) is above max_loop_lag seconds.
+SIGNALING_ADMISSION = {
+    "max_sockets": int(os.environ.get("SIGNALING_MAX_SOCKETS", "5000")),
+    "max_sfu_waiting": int(os.environ.get("SIGNALING_MAX_SFU_WAITING", "128")),
+    "max_loop_lag": float(os.environ.get("SIGNALING_MAX_LOOP_LAG", "0.25")),
+    "retry_after": 2.0,         # seconds; the hint sent is 1-2x this
+}
+# Event loop lag monitor (interview_app/loop_watchdog.py): lag is sampled every interval
+# seconds; a loop blocked for block_threshold seconds gets the blocking stack logged.
+LOOP_WATCHDOG = {
+    "enabled": os.environ.get("LOOP_WATCHDOG", "1") == "1",
+    "interval": float(os.environ.get("LOOP_WATCHDOG_INTERVAL", "0.1")),
+    "block_threshold": float(os.environ.get("LOOP_WATCHDOG_BLOCK_THRESHOLD", "0.25")),
+    "window": 600,              # recent samples behind the quantile gauges (one minute at 0.1s)
+    "stack_depth": 25,
+}
+# Per-session handshake tracing (interview_app/tracing.py): the share of sessions traced, whether
+# clients may force it with ?trace=1 (off: any client could fill the disk), and where the Chrome
+# trace JSON files go; only the newest max_files are kept.
+SIGNALING_TRACING = {
+    "sample_rate": float(os.environ.get("SIGNALING_TRACE_SAMPLE_RATE", "0")),
+    "allow_forced": os.environ.get("SIGNALING_TRACE_ALLOW_FORCED", "0") == "1",
+    "dir": os.environ.get("SIGNALING_TRACE_DIR", str(BASE_DIR / "traces")),
+    "max_files": int(os.environ.get("SIGNALING_TRACE_MAX_FILES", "500")),
+    "max_events": 10000,        # per session; later events are counted as dropped
+}
+# Seconds a dropped participant keeps its roster entry, host role and SFU transports
+# while the client may reconnect with its resume token (0 tears down at once)
+SESSION_RESUME_GRACE_SECONDS = float(os.environ.get("SESSION_RESUME_GRACE_SECONDS", "15"))
+# Background reconciliation of stale rooms and participants with the SFU (interview_app/reaper.py).
+# stale_after must be well above interval: live participants are refreshed once per sweep.
+REAPER = {
+    "enabled": os.environ.get("REAPER_ENABLED", "1") == "1",
+    "interval": float(os.environ.get("REAPER_INTERVAL", "60")),
+    "stale_after": float(os.environ.get("REAPER_STALE_AFTER", "300")),
+    "room_idle": float(os.environ.get("REAPER_ROOM_IDLE", "86400")),  # empty Room rows older than this are deleted
+}
+# Seconds an empty room's in-memory state actor lingers before retiring (interview_app/room_state.py)
+ROOM_STATE_IDLE_SECONDS = float(os.environ.get("ROOM_STATE_IDLE_SECONDS", "60"))
+# Window in which roster changes are coalesced into one participantListDelta (interview_app/roster.py)
+ROSTER_BROADCAST_DEBOUNCE_SECONDS = float(os.environ.get("ROSTER_BROADCAST_DEBOUNCE_SECONDS", "0.1"))
+# Webinar-scale rooms (interview_app/roster.py): above `threshold` participants only the host receives the roster
+# and its deltas; attendees get a participantCount every `count_interval` seconds and page with requestParticipantPage.
+ROSTER_LARGE_ROOM = {
+    "threshold": int(os.environ.get("ROSTER_LARGE_ROOM_THRESHOLD", "200")),
+    "exit_ratio": 0.8,  # full rosters again once the room is down to threshold * exit_ratio
+    "count_interval": float(os.environ.get("ROSTER_LARGE_ROOM_COUNT_INTERVAL", "1.0")),
+    "page_size": int(os.environ.get("ROSTER_LARGE_ROOM_PAGE_SIZE", "100")),
+}
+# JSON implementation for signaling frames: "auto", "orjson", "ujson" or "json" (interview_app/codec.py)
+SIGNALING_JSON_CODEC = os.environ.get("SIGNALING_JSON_CODEC", "auto")
+# Offer the MessagePack signaling subprotocol (codec.BINARY_SUBPROTOCOL) when the 'msgpack' package is installed
+SIGNALING_BINARY = os.environ.get("SIGNALING_BINARY", "1") == "1"
+
+# Signaling logs go through a queue to a background writer thread (interview_app/log.py),
+# so a slow stdout never blocks the event loop. INTERVIEW_LOG_LEVEL=DEBUG shows per-message detail.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "structured": {
+            "()": "interview_app.log.StructuredFormatter",
+            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+        },
+    },
+    "handlers": {
+        "queued": {
+            "class": "interview_app.log.QueueingHandler",
+            "formatter": "structured",
+            "stream": "ext://sys.stdout",
+            "maxsize": 10000,
+        },
+    },
+    "loggers": {
+        "interview_app": {
+            "handlers": ["queued"],
+            "level": os.environ.get("INTERVIEW_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+# Keep 1 in N records of these high-frequency events (warnings and errors are never sampled).
+LOG_SAMPLE_RATES = {
+    "consumer.receive": int(os.environ.get("LOG_SAMPLE_RECEIVE", "1")),
+    "sfu.request": int(os.environ.get("LOG_SAMPLE_SFU", "1")),
+    "sfu.response": int(os.environ.get("LOG_SAMPLE_SFU", "1")),
+}
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer"
@@ -54,6 +237,21 @@ CHANNEL_LAYERS = {
         # },
     },
 }
+# Several ASGI worker processes on one box without Redis: CHANNEL_LAYER=localhub.
+# The hub is started by the first worker (or run with `manage.py run_channel_hub`).
+# Room state is per process, so the proxy must route all sockets of a room to one worker.
+if os.environ.get("CHANNEL_LAYER") == "localhub":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "interview_app.channel_layer.LocalHubChannelLayer",
+            "CONFIG": {
+                "path": os.environ.get("CHANNEL_HUB_SOCKET", "/tmp/interview_channel_hub.sock"),
+                "capacity": 100,
+                "expiry": 60,
+                "group_expiry": 86400,
+            },
+        },
+    }
 ASGI_APPLICATION = 'interview_project.asgi.application' # 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000", # Assuming React runs on port 3000
@@ -99,8 +297,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Connections are kept by the DB executor's threads (interview_app/db.py) and recycled after this many seconds.
+        'CONN_MAX_AGE': int(os.environ.get("DB_CONN_MAX_AGE", "600")),
+        'OPTIONS': {
+            # WAL lets readers carry on while a join storm writes; writers wait up to busy_timeout ms for
+            # the lock instead of failing, and IMMEDIATE takes it at BEGIN so a transaction never has to
+            # upgrade from read to write halfway through (which the busy timeout cannot resolve).
+            # WAL is recorded in the database file itself, so it is opt-in (SQLITE_WAL=1 in deployments):
+            # otherwise any manage.py run would convert the checked-in db.sqlite3.
+            'init_command': (
+                ('PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;' if os.environ.get("SQLITE_WAL", "0") == "1" else '')
+                + 'PRAGMA busy_timeout=5000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-16000;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
+# How *_db_ops helpers run from async code (interview_app/db.py): "pool" runs them on a bounded
+# thread pool, "thread_sensitive" on asgiref's single shared thread.
+DB_EXECUTOR = {
+    "mode": os.environ.get("DB_EXECUTOR_MODE", "pool"),
+    "threads": int(os.environ.get("DB_EXECUTOR_THREADS", "4")),
+}
 
 
 # Password validation
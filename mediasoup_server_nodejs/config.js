@@ -4,6 +4,10 @@ const os = require('os');
 module.exports = {
     listenIp: '0.0.0.0', // For the HTTP server that Django talks to
     listenPort: 4000,
+    // Server-sent event stream consumed by Django (GET /events)
+    events: {
+        heartbeatMs: 15000, // Comment line sent to idle streams so proxies and Django's read timeout see traffic
+    },
     mediasoup: {
         // Use at least 1 worker, or based on CPU cores.
         // Ensure os.cpus() is available and returns a valid array.
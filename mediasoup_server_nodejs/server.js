@@ -14,6 +14,32 @@ let workers = [];
 let nextWorkerIdx = 0;
 const rooms = {}; 
 
+// --- Lifecycle event stream (GET /events, server-sent events) ---
+// Django keeps one stream open per process and mirrors producers from it, so it
+// also learns about closures that happen here (transport failures, routers closed
+// when rooms empty, worker deaths) rather than only what it relayed itself.
+const eventClients = new Set();
+let eventSeq = 0;
+
+function emitEvent(type, data) {
+    eventSeq++;
+    if (eventClients.size === 0) return;
+    const frame = `id: ${eventSeq}\nevent: ${type}\ndata: ${JSON.stringify(data)}\n\n`;
+    eventClients.forEach(res => res.write(frame));
+}
+
+function producerSnapshot() {
+    const snapshot = {};
+    for (const [roomId, room] of Object.entries(rooms)) {
+        const producers = [];
+        room.clients.forEach((clientData, clientId) => clientData.producers.forEach(p => {
+            if (!p.closed) producers.push({ clientId, producerId: p.id, kind: p.kind, appData: p.appData });
+        }));
+        snapshot[roomId] = producers;
+    }
+    return snapshot;
+}
+
 async function createWorker() {
     const worker = await mediasoup.createWorker(config.mediasoup.workerSettings);
     console.log(`Node.js: Mediasoup worker ${worker.pid} created`);
@@ -31,8 +57,19 @@ async function getMediasoupWorker() {
     return worker;
 }
 
-async function getOrCreateRoom(roomId) {
-    if (rooms[roomId]) return rooms[roomId];
+// Rooms whose router is being created: concurrent requests for a new room (e.g. a
+// hedged duplicate GET from the signaling server) wait for the same router.
+const roomCreations = new Map();
+
+function getOrCreateRoom(roomId) {
+    if (rooms[roomId]) return Promise.resolve(rooms[roomId]);
+    if (!roomCreations.has(roomId)) {
+        roomCreations.set(roomId, createRoom(roomId).finally(() => roomCreations.delete(roomId)));
+    }
+    return roomCreations.get(roomId);
+}
+
+async function createRoom(roomId) {
     console.log(`Node.js: Creating new room: ${roomId}`);
     const worker = await getMediasoupWorker();
     const router = await worker.createRouter(config.mediasoup.routerOptions);
@@ -40,6 +77,7 @@ async function getOrCreateRoom(roomId) {
     const room = { id: roomId, router, clients: new Map() };
     rooms[roomId] = room;
     router.on('workerclose', () => { delete rooms[roomId]; console.log(`Node.js: Router for room ${roomId} closed.`); });
+    router.observer.once('close', () => emitEvent('roomClosed', { roomId }));
     return room;
 }
 
@@ -51,6 +89,39 @@ function getClientData(room, clientId) {
     return room.clients.get(clientId);
 }
 
+// Load report for Django's placement layer (interview_app/placement.py), polled as its health check.
+app.get('/stats', (req, res) => {
+    const stats = { rooms: 0, clients: 0, transports: 0, producers: 0, consumers: 0 };
+    for (const room of Object.values(rooms)) {
+        stats.rooms += 1;
+        for (const clientData of room.clients.values()) {
+            stats.clients += 1;
+            stats.transports += clientData.transports.size;
+            stats.producers += clientData.producers.size;
+            stats.consumers += clientData.consumers.size;
+        }
+    }
+    res.json(stats);
+});
+
+// Room -> client ids, for the signaling server's reconciler (interview_app/reaper.py).
+app.get('/rooms', (req, res) => {
+    const listing = {};
+    for (const [roomId, room] of Object.entries(rooms)) listing[roomId] = [...room.clients.keys()];
+    res.json(listing);
+});
+
+app.get('/events', (req, res) => {
+    console.log(`Node.js: GET /events, ${eventClients.size + 1} stream(s) open`);
+    res.writeHead(200, { 'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'Connection': 'keep-alive' });
+    // Every stream starts with the full producer list, so a reconnecting reader can resync.
+    res.write(`id: ${eventSeq}\nevent: snapshot\ndata: ${JSON.stringify({ rooms: producerSnapshot() })}\n\n`);
+    eventClients.add(res);
+    req.on('close', () => { eventClients.delete(res); console.log(`Node.js: /events stream closed, ${eventClients.size} open`); });
+});
+
+setInterval(() => eventClients.forEach(res => res.write(': heartbeat\n\n')), config.events.heartbeatMs).unref();
+
 app.get('/rooms/:roomId/router-rtp-capabilities', async (req, res) => {
     const { roomId } = req.params;
     console.log(`Node.js: GET /router-rtp-capabilities for room ${roomId}`);
@@ -65,6 +136,7 @@ app.post('/rooms/:roomId/clients/:clientId/transports', async (req, res) => {
         const room = await getOrCreateRoom(roomId); const clientData = getClientData(room, clientId);
         const transport = await room.router.createWebRtcTransport({...config.mediasoup.webRtcTransportOptions, appData: { roomId, clientId, dtlsConnected: false }});
         clientData.transports.set(transport.id, transport);
+        transport.observer.once('close', () => emitEvent('transportClosed', { roomId, clientId, transportId: transport.id }));
         console.log(`Node.js: Transport created for ${clientId} [id:${transport.id}]`);
         res.json({ id: transport.id, iceParameters: transport.iceParameters, iceCandidates: transport.iceCandidates, dtlsParameters: transport.dtlsParameters, sctpParameters: transport.sctpParameters });
     } catch (error) { console.error(`Node.js: Error POST /transports for ${clientId} in ${roomId}:`, error.message); res.status(500).json({ error: error.message }); }
@@ -96,6 +168,8 @@ app.post('/rooms/:roomId/clients/:clientId/transports/:transportId/produce', asy
         clientData.producers.set(producer.id, producer);
         producer.on('transportclose', () => { clientData.producers.delete(producer.id); console.log(`Node.js: Producer ${producer.id} transport closed.`); });
         producer.on('close', () => { clientData.producers.delete(producer.id); console.log(`Node.js: Producer ${producer.id} explicitly closed.`); });
+        producer.observer.once('close', () => emitEvent('producerClosed', { roomId, clientId, producerId: producer.id }));
+        emitEvent('producerCreated', { roomId, clientId, producerId: producer.id, kind: producer.kind, appData: producer.appData });
         console.log(`Node.js: Producer created for ${clientId} [id:${producer.id}, kind:${kind}]`);
         res.json({ id: producer.id });
     } catch (error) { console.error(`Node.js: Error POST /produce for ${clientId} [transportId:${transportId}, kind:${kind}]:`, error.message); res.status(500).json({ error: error.message }); }
@@ -113,26 +187,64 @@ app.get('/rooms/:roomId/clients/:clientId/producers', (req, res) => {
     res.json(activeProducers);
 });
 
+class HttpError extends Error {
+    constructor(status, message) { super(message); this.status = status; }
+}
+
+function getRecvTransport(roomId, clientId, transportId) {
+    const room = rooms[roomId]; if (!room) throw new HttpError(404, `Room ${roomId} not found`);
+    const consumingClientData = room.clients.get(clientId); if (!consumingClientData) throw new HttpError(404, `Consuming client ${clientId} not found`);
+    const recvTransport = consumingClientData.transports.get(transportId); if (!recvTransport) throw new HttpError(404, `Receiving transport ${transportId} not found`);
+    if (!recvTransport.appData.dtlsConnected) throw new HttpError(400, "Receiving transport not DTLS connected.");
+    return { room, consumingClientData, recvTransport };
+}
+
+async function createConsumer(room, consumingClientData, recvTransport, clientId, producerId, rtpCapabilities, appData) {
+    let producerToConsume = null;
+    for (const [, rcd] of room.clients) { if (rcd.producers && rcd.producers.has(producerId)) { producerToConsume = rcd.producers.get(producerId); break; } }
+    if (!producerToConsume || producerToConsume.closed) throw new HttpError(404, `Producer ${producerId} not found or closed`);
+    if (!room.router.canConsume({ producerId: producerToConsume.id, rtpCapabilities })) throw new HttpError(400, 'Client cannot consume producer');
+    const consumer = await recvTransport.consume({ producerId: producerToConsume.id, rtpCapabilities, paused: producerToConsume.kind === 'video', appData: { ...appData, roomId: room.id, consumingClientId: clientId, producerOwnerId: producerToConsume.appData.clientId }});
+    consumingClientData.consumers.set(consumer.id, consumer);
+    consumer.on('transportclose', () => { consumingClientData.consumers.delete(consumer.id); console.log(`Node.js: Consumer ${consumer.id} transport closed.`); });
+    consumer.on('producerclose', () => { consumingClientData.consumers.delete(consumer.id); console.log(`Node.js: Consumer ${consumer.id} producer closed.`); });
+    consumer.on('close', () => { consumingClientData.consumers.delete(consumer.id); console.log(`Node.js: Consumer ${consumer.id} explicitly closed.`); });
+    consumer.observer.once('close', () => emitEvent('consumerClosed', { roomId: room.id, clientId, consumerId: consumer.id, producerId: consumer.producerId }));
+    console.log(`Node.js: Consumer created for ${clientId} consuming ${producerId} [consumer_id:${consumer.id}]`);
+    return { id: consumer.id, producerId: consumer.producerId, kind: consumer.kind, rtpParameters: consumer.rtpParameters, paused: consumer.appData.producerPaused || consumer.paused, appData: consumer.appData };
+}
+
+async function resumeConsumer(clientData, consumerId) {
+    const consumer = clientData.consumers.get(consumerId); if (!consumer) throw new HttpError(404, `Consumer ${consumerId} not found`);
+    if (consumer.closed) throw new HttpError(400, "Consumer is closed.");
+    if (!consumer.paused && !consumer.producerPaused) { console.warn(`Node.js: Consumer ${consumerId} already resumed.`); return; }
+    await consumer.resume(); console.log(`Node.js: Consumer resumed [id:${consumerId}]`);
+}
+
 app.post('/rooms/:roomId/clients/:clientId/transports/:transportId/consume', async (req, res) => {
     const { roomId, clientId, transportId } = req.params; const { producerId, rtpCapabilities, appData } = req.body;
     console.log(`Node.js: POST /consume for ${clientId} (transport: ${transportId}) to consume producer ${producerId}`);
     try {
-        const room = rooms[roomId]; if (!room) return res.status(404).json({ error: `Room ${roomId} not found` });
-        const consumingClientData = room.clients.get(clientId); if (!consumingClientData) return res.status(404).json({ error: `Consuming client ${clientId} not found` });
-        const recvTransport = consumingClientData.transports.get(transportId); if (!recvTransport) return res.status(404).json({ error: `Receiving transport ${transportId} not found` });
-        if (!recvTransport.appData.dtlsConnected) { return res.status(400).json({ error: "Receiving transport not DTLS connected." }); }
-        let producerToConsume = null;
-        for (const [, rcd] of room.clients) { if (rcd.producers && rcd.producers.has(producerId)) { producerToConsume = rcd.producers.get(producerId); break; } }
-        if (!producerToConsume || producerToConsume.closed) { return res.status(404).json({ error: `Producer ${producerId} not found or closed` }); }
-        if (!room.router.canConsume({ producerId: producerToConsume.id, rtpCapabilities })) { return res.status(400).json({ error: 'Client cannot consume producer' }); }
-        const consumer = await recvTransport.consume({ producerId: producerToConsume.id, rtpCapabilities, paused: producerToConsume.kind === 'video', appData: { ...appData, roomId, consumingClientId: clientId, producerOwnerId: producerToConsume.appData.clientId }});
-        consumingClientData.consumers.set(consumer.id, consumer);
-        consumer.on('transportclose', () => { consumingClientData.consumers.delete(consumer.id); console.log(`Node.js: Consumer ${consumer.id} transport closed.`); });
-        consumer.on('producerclose', () => { consumingClientData.consumers.delete(consumer.id); console.log(`Node.js: Consumer ${consumer.id} producer closed.`); });
-        consumer.on('close', () => { consumingClientData.consumers.delete(consumer.id); console.log(`Node.js: Consumer ${consumer.id} explicitly closed.`); });
-        console.log(`Node.js: Consumer created for ${clientId} consuming ${producerId} [consumer_id:${consumer.id}]`);
-        res.json({ id: consumer.id, producerId: consumer.producerId, kind: consumer.kind, rtpParameters: consumer.rtpParameters, paused: consumer.appData.producerPaused || consumer.paused, appData: consumer.appData });
-    } catch (error) { console.error(`Node.js: Error POST /consume for ${clientId} [producerId:${producerId}]:`, error.message); res.status(500).json({ error: error.message }); }
+        const { room, consumingClientData, recvTransport } = getRecvTransport(roomId, clientId, transportId);
+        res.json(await createConsumer(room, consumingClientData, recvTransport, clientId, producerId, rtpCapabilities, appData));
+    } catch (error) { console.error(`Node.js: Error POST /consume for ${clientId} [producerId:${producerId}]:`, error.message); res.status(error.status || 500).json({ error: error.message }); }
+});
+
+// Batch variant: one consumer per producer in producerIds. Per-producer failures are
+// reported in `errors` instead of failing the whole request.
+app.post('/rooms/:roomId/clients/:clientId/transports/:transportId/consume-batch', async (req, res) => {
+    const { roomId, clientId, transportId } = req.params; const { producerIds = [], rtpCapabilities, appData } = req.body;
+    console.log(`Node.js: POST /consume-batch for ${clientId} (transport: ${transportId}), ${producerIds.length} producer(s)`);
+    try {
+        const { room, consumingClientData, recvTransport } = getRecvTransport(roomId, clientId, transportId);
+        const results = await Promise.allSettled(producerIds.map(producerId => createConsumer(room, consumingClientData, recvTransport, clientId, producerId, rtpCapabilities, appData)));
+        const consumers = [], errors = [];
+        results.forEach((result, i) => {
+            if (result.status === 'fulfilled') consumers.push(result.value);
+            else errors.push({ producerId: producerIds[i], error: result.reason.message });
+        });
+        res.json({ consumers, errors });
+    } catch (error) { console.error(`Node.js: Error POST /consume-batch for ${clientId}:`, error.message); res.status(error.status || 500).json({ error: error.message }); }
 });
 
 app.post('/rooms/:roomId/clients/:clientId/consumers/:consumerId/resume', async (req, res) => {
@@ -141,12 +253,23 @@ app.post('/rooms/:roomId/clients/:clientId/consumers/:consumerId/resume', async
     try {
         const room = rooms[roomId]; if (!room) return res.status(404).json({ error: `Room ${roomId} not found` });
         const clientData = room.clients.get(clientId); if (!clientData) return res.status(404).json({ error: `Client ${clientId} not found` });
-        const consumer = clientData.consumers.get(consumerId); if (!consumer) return res.status(404).json({ error: `Consumer ${consumerId} not found` });
-        if (consumer.closed) { return res.status(400).json({error: "Consumer is closed."}); }
-        if (!consumer.paused && !consumer.producerPaused) { console.warn(`Node.js: Consumer ${consumerId} already resumed.`); return res.sendStatus(200); }
-        await consumer.resume(); console.log(`Node.js: Consumer resumed [id:${consumerId}]`);
+        await resumeConsumer(clientData, consumerId);
         res.sendStatus(200); 
-    } catch (error) { console.error(`Node.js: Error POST /resume-consumer ${consumerId}:`, error.message); res.status(500).json({ error: error.message }); }
+    } catch (error) { console.error(`Node.js: Error POST /resume-consumer ${consumerId}:`, error.message); res.status(error.status || 500).json({ error: error.message }); }
+});
+
+app.post('/rooms/:roomId/clients/:clientId/consumers/resume-batch', async (req, res) => {
+    const { roomId, clientId } = req.params; const { consumerIds = [] } = req.body;
+    console.log(`Node.js: POST /resume-batch for ${consumerIds.length} consumer(s) of client ${clientId}`);
+    const room = rooms[roomId]; if (!room) return res.status(404).json({ error: `Room ${roomId} not found` });
+    const clientData = room.clients.get(clientId); if (!clientData) return res.status(404).json({ error: `Client ${clientId} not found` });
+    const results = await Promise.allSettled(consumerIds.map(consumerId => resumeConsumer(clientData, consumerId)));
+    const resumed = [], errors = [];
+    results.forEach((result, i) => {
+        if (result.status === 'fulfilled') resumed.push(consumerIds[i]);
+        else errors.push({ consumerId: consumerIds[i], error: result.reason.message });
+    });
+    res.json({ resumed, errors });
 });
 
 app.post('/rooms/:roomId/clients/:clientId/disconnected', (req, res) => {
@@ -170,6 +293,29 @@ app.post('/rooms/:roomId/clients/:clientId/disconnected', (req, res) => {
     res.send('OK'); // Explicit "OK" text response
 });
 
+// Ends a room regardless of connected clients (the interview is over): closing the router
+// closes every transport, producer and consumer in it, so no per-client cleanup calls are needed.
+app.post('/rooms/:roomId/close', (req, res) => {
+    const { roomId } = req.params;
+    const room = rooms[roomId];
+    if (!room) return res.json({ success: true, closed: false, clients: 0 });
+    const clients = room.clients.size;
+    console.log(`Node.js: POST /rooms/${roomId}/close, closing router [id:${room.router.id}] with ${clients} client(s).`);
+    room.router.close(); delete rooms[roomId];
+    res.json({ success: true, closed: true, clients });
+});
+
+app.delete('/rooms/:roomId', (req, res) => {
+    const { roomId } = req.params;
+    console.log(`Node.js: DELETE /rooms/${roomId}`);
+    const room = rooms[roomId];
+    if (!room) return res.json({ success: true, closed: false }); // Already gone (e.g. closed by the last disconnect)
+    if (room.clients.size > 0) return res.status(409).json({ error: `Room ${roomId} has ${room.clients.size} active client(s)` });
+    console.log(`Node.js: Closing unused room ${roomId} [router:${room.router.id}].`);
+    room.router.close(); delete rooms[roomId];
+    res.json({ success: true, closed: true });
+});
+
 (async () => {
     try {
         console.log('Node.js: Starting Mediasoup workers...');